@@ -14,20 +14,45 @@ import asyncio
 import json
 import signal
 import sys
+import time
 from contextlib import suppress
 from datetime import datetime
+from typing import List
 
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
-from apscheduler.triggers.cron import CronTrigger
-from browserforge.fingerprints import Screen
+from apscheduler.triggers.date import DateTrigger
 from camoufox import AsyncCamoufox
 from loguru import logger
-from playwright.async_api import ViewportSize
+from playwright.async_api import BrowserContext
 from pytz import timezone
 
+from schedule.promotion_scheduler import (
+    PromotionScheduler,
+    REASON_DAILY,
+    REASON_STARTUP,
+)
+from services.account_orchestrator import (
+    AccountResult,
+    EpicAccount,
+    configured_accounts,
+    format_result_table,
+    run_accounts,
+)
+from services.browser_pool import BrowserPool, browser_launch_options
+from services.diagnostics_store import diagnostics_store
 from services.epic_authorization_service import EpicAuthorization
-from services.epic_games_service import EpicAgent
-from settings import LOG_DIR, RECORD_DIR
+from services.epic_games_service import EpicAgent, GameCollectResult
+from services.epic_promotions_service import (
+    extract_promotion_boundaries,
+    parse_promotions,
+    promotions_client,
+    promotions_fingerprint,
+)
+from services.preflight import preflight_stats, run_preflight
+from services.profile_maintenance import profile_maintenance
+from services.request_policy import RequestPolicy
+from services.run_recorder import RunRecorder
+from settings import LOG_DIR, RECORD_DIR, EpicSettings
 from settings import settings
 from utils import init_log
 
@@ -42,56 +67,261 @@ init_log(
 TIMEZONE = timezone("Asia/Shanghai")
 
 
-@logger.catch
-async def execute_browser_tasks(headless: bool = True):
+async def collect_with_browser(
+    browser: BrowserContext, config: EpicSettings | None = None
+) -> GameCollectResult:
     """
-    Execute Epic Games free game collection tasks using browser automation.
-
-    This function handles the complete workflow of authenticating with Epic Games
-    and collecting available free games through browser automation.
+    Authenticate and collect the free games on an already launched browser context.
 
     Args:
-        headless: Whether to run browser in headless mode
+        browser: Persistent Camoufox context, freshly launched or taken from the pool
+        config: Per-account settings in multi-account mode, None for the global account
+
+    Returns:
+        The collection result
     """
-    logger.debug("Starting Epic Games collection task")
+    # Optionally block media, images, fonts and analytics the claim flow doesn't need
+    request_policy = RequestPolicy(settings.REQUEST_BLOCKING_RULES)
+    if settings.REQUEST_BLOCKING_ENABLED:
+        await request_policy.install(browser)
+
+    # Keep a trace of the last few phases, persisted only when the run fails
+    recorder = RunRecorder(root=RECORD_DIR.joinpath(config.EPIC_EMAIL)) if config else RunRecorder()
+    await recorder.start(browser)
 
-    # Configure browser with anti-detection features and video recording
-    async with AsyncCamoufox(
-        persistent_context=True,
-        user_data_dir=settings.user_data_dir,
-        screen=Screen(max_width=1920, max_height=1080, min_height=1080, min_width=1920),
-        record_video_dir=RECORD_DIR,
-        record_video_size=ViewportSize(width=1920, height=1080),
-        humanize=0.2,
-        headless=headless,
-    ) as browser:
+    result = None
+    try:
         # Initialize or reuse existing browser page
         page = browser.pages[0] if browser.pages else await browser.new_page()
         logger.debug("Browser initialized successfully")
 
         # Handle Epic Games authentication
         logger.debug("Initiating Epic Games authentication")
-        agent = EpicAuthorization(page)
-        await agent.invoke()
+        agent = EpicAuthorization(page, config)
+        session_verified = await agent.invoke()
         logger.debug("Authentication completed")
+        await recorder.checkpoint("auth")
 
         # Execute a free games collection on new page
         logger.debug("Starting free games collection process")
         game_page = await browser.new_page()
-        agent = EpicAgent(game_page)
-        await agent.collect_epic_games()
+        agent = EpicAgent(game_page, session_verified=bool(session_verified), config=config)
+        result = await agent.collect_epic_games()
         logger.debug("Free games collection completed")
+    finally:
+        await recorder.finish(
+            succeeded=result in (GameCollectResult.ALL_OWNED, GameCollectResult.SUCCESS),
+            outcome=result.value if result else "crashed",
+        )
+        request_policy.report()
+        # A pooled context outlives this run, so don't leave the route behind
+        await request_policy.uninstall(browser)
+
+    return result
+
+
+@logger.catch
+async def execute_browser_tasks(
+    headless: bool = True, pool: BrowserPool | None = None, config: EpicSettings | None = None
+) -> GameCollectResult | None:
+    """
+    Execute Epic Games free game collection tasks using browser automation.
+
+    This function handles the complete workflow of authenticating with Epic Games
+    and collecting available free games through browser automation.
+
+    Args:
+        headless: Whether to run browser in headless mode
+        pool: Warm browser pool to borrow the browser from; a fresh browser is launched when None
+        config: Per-account settings in multi-account mode; its profile is used and its
+            diagnostics and recordings are kept apart from the other accounts
+
+    Returns:
+        The collection result, or None if the run crashed
+    """
+    logger.debug("Starting Epic Games collection task")
+    user_data_dir = config.user_data_dir if config else None
+    run_id = datetime.now().strftime("%Y%m%d-%H%M%S")
+    diagnostics_store.begin_run(f"{run_id}-{config.EPIC_EMAIL}" if config else run_id)
+
+    if pool:
+        browser = await pool.acquire()
+        try:
+            result = await collect_with_browser(browser, config)
+        finally:
+            await pool.release()
+    else:
+        # Prune caches and crash dumps while the profile is closed
+        await asyncio.to_thread(profile_maintenance.compact, user_data_dir)
+
+        # Configure browser with anti-detection features
+        launch_start = time.perf_counter()
+        async with AsyncCamoufox(**browser_launch_options(headless, user_data_dir)) as browser:
+            profile_maintenance.record_launch(time.perf_counter() - launch_start, user_data_dir)
+            result = await collect_with_browser(browser, config)
+
+            # Cleanup browser resources
+            logger.debug("Cleaning up browser resources")
+            with suppress(Exception):
+                for p in browser.pages:
+                    await p.close()
+
+            with suppress(Exception):
+                await browser.close()
+
+    logger.debug("Browser tasks execution finished successfully")
+
+    # Failure dumps are compressed off the event loop; make sure they land before returning
+    await diagnostics_store.flush()
+
+    return result
+
+
+async def run_collection(
+    headless: bool = True,
+    data: dict | None = None,
+    pool: BrowserPool | None = None,
+    config: EpicSettings | None = None,
+) -> GameCollectResult | None:
+    """
+    Run the browserless preflight and launch the browser only when something is claimable.
+
+    Args:
+        headless: Whether to run browser in headless mode
+        data: Promotions payload already fetched by the caller, if any
+        pool: Optional warm browser pool
+        config: Per-account settings in multi-account mode
+
+    Returns:
+        ALL_OWNED when the preflight proves there is nothing to claim, otherwise the
+        browser run result
+    """
+    preflight = await run_preflight((config or settings).user_data_dir, data=data)
+    if not preflight.should_launch:
+        saved = preflight_stats.record_skip(preflight.elapsed)
+        logger.success(
+            f"Preflight: nothing to claim ({preflight.reason}), browser launch skipped "
+            f"in {preflight.elapsed:.1f}s - saved ~{saved:.0f}s "
+            f"({preflight_stats.saved_seconds / 60:.1f} min over {preflight_stats.skipped_runs} runs)"
+        )
+        return GameCollectResult.ALL_OWNED
 
-        # Cleanup browser resources
-        logger.debug("Cleaning up browser resources")
-        with suppress(Exception):
-            for p in browser.pages:
-                await p.close()
+    logger.debug(
+        f"Preflight: launching browser ({preflight.reason}, {len(preflight.unowned)} unowned offers)"
+    )
+    start = time.perf_counter()
+    result = await execute_browser_tasks(headless=headless, pool=pool, config=config)
+    preflight_stats.record_launch(time.perf_counter() - start)
+    return result
+
+
+async def run_multi_account(
+    headless: bool, accounts: List[EpicAccount], data: dict | None = None
+) -> List[AccountResult]:
+    """
+    Claim for every account in parallel, bounded by ACCOUNT_CONCURRENCY.
+
+    The promotions payload is fetched once and shared by every account's preflight;
+    the per-account browser runs then hit the fresh on-disk promotions cache.
+
+    Args:
+        headless: Whether to run browser in headless mode
+        accounts: Accounts to process
+        data: Promotions payload already fetched by the caller, if any
 
-        with suppress(Exception):
-            await browser.close()
+    Returns:
+        One result per account, in the order of ``accounts``
+    """
+    if data is None:
+        data = await promotions_client.fetch()
 
-        logger.debug("Browser tasks execution finished successfully")
+    async def run_account(config: EpicSettings) -> GameCollectResult | None:
+        return await run_collection(headless=headless, data=data, config=config)
+
+    logger.info(
+        f"Multi-account run: {len(accounts)} accounts, concurrency {settings.ACCOUNT_CONCURRENCY}"
+    )
+    results = await run_accounts(accounts, run_account)
+    logger.info(f"Multi-account results:\n{format_result_table(results)}")
+    return results
+
+
+async def run_scheduled_task(
+    scheduler: AsyncIOScheduler,
+    planner: PromotionScheduler,
+    headless: bool,
+    reason: str,
+    pool: BrowserPool | None = None,
+):
+    """
+    Run one scheduled collection round, then plan the next one from the promotion windows.
+
+    The browser is only launched when the free promotion set differs from the one
+    the last verified run found fully owned.
+
+    Args:
+        scheduler: Scheduler that receives the follow-up job
+        planner: Promotion window planner holding the persisted state
+        headless: Whether to run browser in headless mode
+        reason: Why this round was triggered (startup, catch_up, boundary, followup, daily)
+        pool: Optional warm browser pool kept alive between rounds
+    """
+    logger.debug(f"Scheduled round triggered (reason: {reason})")
+
+    data = None
+    try:
+        # Rounds tied to a promotion boundary must see fresh data, so force an ETag revalidation
+        max_age = None if reason in (REASON_STARTUP, REASON_DAILY) else 0
+        data = await promotions_client.fetch(max_age=max_age)
+        promotions = parse_promotions(data) if data else None
+        fingerprint = promotions_fingerprint(promotions) if promotions else None
+
+        if promotions is not None and not promotions:
+            logger.debug("No free promotions available, skipping browser launch")
+        elif planner.should_skip(fingerprint):
+            logger.debug("Promotions unchanged since last verified run, skipping browser launch")
+        elif accounts := configured_accounts():
+            results = await run_multi_account(headless, accounts, data)
+            # The set is settled only once every account owns it
+            if fingerprint and all(r.result == GameCollectResult.ALL_OWNED for r in results):
+                planner.mark_settled(fingerprint, datetime.now(TIMEZONE))
+        else:
+            result = await run_collection(headless=headless, data=data, pool=pool)
+            # Only a verified ALL_OWNED (browser or order history) settles the set;
+            # SUCCESS is re-checked by the next round
+            if fingerprint and result == GameCollectResult.ALL_OWNED:
+                planner.mark_settled(fingerprint, datetime.now(TIMEZONE))
+    finally:
+        # Always plan the next round, otherwise a single failure would stop the schedule
+        reschedule(scheduler, planner, headless, data, pool)
+
+
+def reschedule(
+    scheduler: AsyncIOScheduler,
+    planner: PromotionScheduler,
+    headless: bool,
+    data: dict | None,
+    pool: BrowserPool | None = None,
+):
+    """Plan the next round from the promotion boundaries and persist it for catch-up."""
+    boundaries = extract_promotion_boundaries(data) if data else []
+    run_at, next_reason = planner.plan(boundaries, datetime.now(TIMEZONE))
+    planner.persist_next(run_at, next_reason)
+
+    scheduler.add_job(
+        run_scheduled_task,
+        trigger=DateTrigger(run_date=run_at, timezone=TIMEZONE),
+        id="epic_games_task",
+        name="epic_games_task",
+        args=[scheduler, planner, headless, next_reason, pool],
+        replace_existing=True,
+        max_instances=1,
+        coalesce=True,
+        misfire_grace_time=None,
+    )
+    logger.debug(
+        f"Next execution scheduled: {run_at.strftime('%Y-%m-%d %H:%M:%S %Z')} (reason: {next_reason})"
+    )
 
 
 async def deploy():
@@ -110,40 +340,35 @@ async def deploy():
         f"Starting deployment with configuration: {json.dumps(sj, indent=2, ensure_ascii=False)}"
     )
 
-    # Execute an immediate collection task
-    await execute_browser_tasks(headless=headless)
-
-    # Skip scheduler setup if disabled in configuration
+    # Execute a single collection task when the scheduler is disabled
     if not settings.ENABLE_APSCHEDULER:
+        if accounts := configured_accounts():
+            await run_multi_account(headless, accounts)
+        else:
+            await run_collection(headless=headless)
         logger.debug("Scheduler is disabled, deployment completed")
         return
 
-    # Initialize and configure async scheduler
-    scheduler = AsyncIOScheduler()
-
-    # Strategy 1: Thursday 23:30 to Friday 03:30, every hour (Beijing Time)
-    scheduler.add_job(
-        execute_browser_tasks,
-        trigger=CronTrigger(
-            day_of_week="thu", hour="23,0,1,2,3", minute="30", timezone="Asia/Shanghai"
-        ),
-        id="weekly_epic_games_task",
-        name="weekly_epic_games_task",
-        args=[headless],
-        replace_existing=False,
-        max_instances=1,
+    # Initialize async scheduler and the promotion window planner
+    scheduler = AsyncIOScheduler(timezone=TIMEZONE)
+    planner = PromotionScheduler(
+        TIMEZONE,
+        daily_at=settings.SCHEDULER_DAILY_TIME,
+        jitter_seconds=settings.SCHEDULER_JITTER_SECONDS,
     )
 
-    # Strategy 2: Daily at 12:00 PM (Beijing Time)
-    scheduler.add_job(
-        execute_browser_tasks,
-        trigger=CronTrigger(hour="12", minute="0", timezone="Asia/Shanghai"),
-        id="daily_epic_games_task",
-        name="daily_epic_games_task",
-        args=[headless],
-        replace_existing=False,
-        max_instances=1,
-    )
+    # Keep one warm browser between rounds instead of a cold launch per job.
+    # The pool holds a single profile, so it is not used in multi-account mode.
+    pool = None
+    if settings.BROWSER_POOL_ENABLED:
+        if settings.EPIC_ACCOUNTS_FILE:
+            logger.warning("Browser pool is disabled in multi-account mode")
+        else:
+            pool = BrowserPool(headless)
+
+    # Execute an immediate round (catching up a missed run if any), which also plans the next one
+    startup_reason = planner.startup_reason(datetime.now(TIMEZONE))
+    await run_scheduled_task(scheduler, planner, headless, startup_reason, pool)
 
     # Set up graceful shutdown signal handlers
     shutdown_event = asyncio.Event()
@@ -176,6 +401,8 @@ async def deploy():
         pass
     finally:
         scheduler.shutdown(wait=True)
+        if pool:
+            await pool.close()
         logger.success("Scheduler stopped gracefully")
 
 
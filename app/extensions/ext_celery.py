@@ -4,36 +4,99 @@
 @Author  : QIN2DIM
 @GitHub  : https://github.com/QIN2DIM
 @Desc    : Celery application configuration
+
+Two queues on one direct exchange:
+- epic-promotions: the cheap promotions/ownership check fired by beat, no browser
+- epic-claim: one browser claim per account, fanned out by the check
+
+With PROFILE_AFFINITY_ENABLED every worker also consumes epic-claim.<node>, registers
+itself in the worker registry and keeps a heartbeat, so claims can be pinned to the
+node that holds the account's profile.
 """
+import threading
 
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import celeryd_after_setup, worker_ready, worker_shutdown
+from kombu import Exchange, Queue
+from loguru import logger
 
+from services.profile_affinity import WorkerRegistry, local_node
 from settings import settings
 
+EXCHANGE = Exchange("epic", type="direct")
+
+QUEUE_PROMOTIONS = "epic-promotions"
+QUEUE_CLAIM = "epic-claim"
+ROUTING_KEY_PROMOTIONS = "epic.promotions"
+ROUTING_KEY_CLAIM = "epic.claim"
+
+TASK_CHECK_PROMOTIONS = "epic.check_promotions"
+TASK_CLAIM_ACCOUNT = "epic.claim_account"
+TASK_EXPORT_PROFILE = "epic.export_profile"
+TASK_IMPORT_PROFILE = "epic.import_profile"
+
+
+def claim_queue(node: str) -> Queue:
+    """只由指定節點消費的領取佇列"""
+    return Queue(f"{QUEUE_CLAIM}.{node}", EXCHANGE, routing_key=f"{ROUTING_KEY_CLAIM}.{node}")
+
+
+def init_app(broker_url: str | None = None, result_backend: str | None = None):
+    broker_url = broker_url or settings.CELERY_BROKER_URL or settings.REDIS_URL
+    result_backend = result_backend or settings.CELERY_RESULT_BACKEND or settings.REDIS_URL
 
-def init_app():
     # Create Celery app instance
-    celery_app = Celery("epic-awesome-gamer", broker=settings.REDIS_URL, backend=settings.REDIS_URL)
+    celery_app = Celery("epic-awesome-gamer", broker=broker_url, backend=result_backend)
 
     # Configure Celery
     celery_app.conf.update(
         timezone="UTC",
         enable_utc=True,
         worker_prefetch_multiplier=1,
+        # A fresh process per browser run, Camoufox doesn't release everything on close
         worker_max_tasks_per_child=1,
         task_track_started=True,
         task_time_limit=settings.CELERY_TASK_TIME_LIMIT,
         task_soft_time_limit=settings.CELERY_TASK_SOFT_TIME_LIMIT,
         task_acks_late=True,
         worker_concurrency=settings.CELERY_WORKER_CONCURRENCY,
+        # Keep per-task results (args, worker, result) in the backend for inspection
+        task_ignore_result=False,
+        result_extended=True,
+        result_expires=settings.CELERY_RESULT_EXPIRES,
+        task_serializer="json",
+        result_serializer="json",
+        accept_content=["json"],
+    )
+
+    celery_app.conf.update(
+        task_queues=(
+            Queue(QUEUE_PROMOTIONS, EXCHANGE, routing_key=ROUTING_KEY_PROMOTIONS),
+            Queue(QUEUE_CLAIM, EXCHANGE, routing_key=ROUTING_KEY_CLAIM),
+        ),
+        task_default_exchange=EXCHANGE.name,
+        task_default_exchange_type=EXCHANGE.type,
+        task_routes={
+            TASK_CHECK_PROMOTIONS: {
+                "queue": QUEUE_PROMOTIONS,
+                "exchange": EXCHANGE.name,
+                "routing_key": ROUTING_KEY_PROMOTIONS,
+            },
+            TASK_CLAIM_ACCOUNT: {
+                "queue": QUEUE_CLAIM,
+                "exchange": EXCHANGE.name,
+                "routing_key": ROUTING_KEY_CLAIM,
+            },
+        },
     )
 
-    imports = ["schedule.epic_collect_games_task"]
+    imports = ["schedule.collect_epic_games_task"]
     beat_schedule = {
-        "epic_collect_games_task": {
-            "task": "schedule.epic_collect_games_task.epic_collect_games_task",
-            "schedule": crontab("1 */5 * * *"),
+        "epic_check_promotions": {
+            "task": TASK_CHECK_PROMOTIONS,
+            # Minute 1 of every 5th hour
+            "schedule": crontab(minute="1", hour="*/5"),
         }
     }
     celery_app.conf.update(beat_schedule=beat_schedule, imports=imports)
@@ -43,3 +106,45 @@ def init_app():
 
 
 ext_celery_app = init_app()
+
+
+_heartbeat_stop = threading.Event()
+
+
+@celeryd_after_setup.connect
+def _consume_node_queue(sender, instance, **kwargs):
+    if settings.PROFILE_AFFINITY_ENABLED:
+        queue = instance.app.amqp.queues.select_add(claim_queue(local_node()))
+        logger.info(f"Worker consumes node queue {queue.name}")
+
+
+@worker_ready.connect
+def _start_heartbeat(**kwargs):
+    if not settings.PROFILE_AFFINITY_ENABLED:
+        return
+    registry, node = WorkerRegistry(), local_node()
+    interval = max(1.0, registry.ttl / 3)
+
+    def _beat():
+        while not _heartbeat_stop.is_set():
+            try:
+                registry.heartbeat(node)
+            except Exception as err:
+                logger.warning(f"Worker heartbeat failed: {err!r}")
+            _heartbeat_stop.wait(interval)
+
+    _heartbeat_stop.clear()
+    threading.Thread(target=_beat, name="epic-heartbeat", daemon=True).start()
+    logger.info(f"Worker {node} registered, heartbeat every {interval:.0f}s")
+
+
+@worker_shutdown.connect
+def _leave_registry(**kwargs):
+    if not settings.PROFILE_AFFINITY_ENABLED:
+        return
+    _heartbeat_stop.set()
+    # Leave right away on a clean shutdown instead of waiting for the heartbeat to expire
+    try:
+        WorkerRegistry().leave(local_node())
+    except Exception as err:
+        logger.warning(f"Failed to leave worker registry: {err!r}")
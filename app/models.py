@@ -4,6 +4,7 @@
 # GitHub     : https://github.com/QIN2DIM
 # Description:
 
+from datetime import datetime
 from typing import List
 
 from pydantic import BaseModel, Field
@@ -33,3 +34,5 @@ class PromotionGame(BaseModel):
     description: str
     offerType: str
     url: str
+    startDate: datetime | None = None
+    endDate: datetime | None = None
@@ -3,23 +3,53 @@
 @Time    : 2025/7/16 21:57
 @Author  : QIN2DIM
 @GitHub  : https://github.com/QIN2DIM
-@Desc    :
+@Desc    : Celery 任務
+
+beat 觸發的 check_promotions_task 只取得一次促銷資料，並以已擁有遊戲索引逐一預檢帳號，
+不啟動瀏覽器；只有確實有遊戲可領取的帳號，才分派 claim_account_task 到 epic-claim 佇列。
+Celery 任務本身是同步函式，內部以 asyncio.run 執行非同步流程，結果存入結果後端。
+啟用 PROFILE_AFFINITY_ENABLED 時，領取任務送到持有該帳號設定檔的節點佇列，
+設定檔不在本機的帳號改由該節點先預檢再決定是否啟動瀏覽器；設定檔搬移以 relocate_profile 明確觸發。
 """
+
 import asyncio
 import sys
+import time
 from contextlib import suppress
-from typing import List
+from datetime import datetime
+from typing import Any, Dict, List, Tuple
 
-from browserforge.fingerprints import Screen
 from camoufox import AsyncCamoufox
+from loguru import logger
 from playwright.async_api import Page
-from playwright.async_api import ViewportSize
 
+from services.account_orchestrator import account_settings, all_accounts
+from services.browser_pool import browser_launch_options
+from services.diagnostics_store import diagnostics_store
 from services.epic_authorization_service import EpicAuthorization
-from services.epic_games_service import EpicAgent
+from services.epic_games_service import EpicAgent, GameCollectResult
+from services.epic_promotions_service import parse_promotions, promotions_client
+from services.preflight import SKIP_NO_PROMOTIONS, preflight_stats, run_preflight
+from services.profile_affinity import (
+    WorkerRegistry,
+    export_profile,
+    import_profile,
+    local_node,
+    log_plan,
+    plan_assignments,
+)
+from services.profile_maintenance import profile_maintenance
+from services.run_recorder import RunRecorder
 from settings import LOG_DIR, RECORD_DIR, settings
-from utils import init_log
-from extensions.ext_celery import ext_celery_app
+from utils import add_account_sink, init_log
+from extensions.ext_celery import (
+    TASK_CHECK_PROMOTIONS,
+    TASK_CLAIM_ACCOUNT,
+    TASK_EXPORT_PROFILE,
+    TASK_IMPORT_PROFILE,
+    claim_queue,
+    ext_celery_app,
+)
 
 init_log(
     runtime=LOG_DIR.joinpath("runtime.log"),
@@ -69,27 +99,158 @@ async def authorize(page: Page):
     await agent.invoke()
 
 
-@ext_celery_app.task(queue="epic-awesome-gamer")
-async def collect_epic_games_task():
+async def check_promotions(plan: Dict[str, Tuple[str, str]] | None = None) -> Dict[str, Any]:
+    """
+    取得一次促銷資料，逐一預檢所有帳號
+
+    Args:
+        plan: 設定檔親和路由的結果；設定檔在其它節點的帳號不在本機預檢
+
+    Returns:
+        dispatched 為需要啟動瀏覽器的帳號，skipped 為帳號 -> 略過原因，
+        deferred 為交給設定檔所在節點預檢的帳號
+    """
+    # 促銷邊界前後的排程必須看到最新資料，以 ETag 重新驗證，304 幾乎不耗流量
+    data = await promotions_client.fetch(max_age=0)
+
+    accounts = all_accounts()
+    if not accounts:
+        logger.warning("沒有可用的帳號，請設定 EPIC_EMAIL/EPIC_PASSWORD 或 EPIC_ACCOUNTS_FILE")
+
+    # 已擁有索引與 Cookie 只在持有設定檔的節點磁碟上，在這裡預檢只會得到 index_not_synced
+    plan, here = plan or {}, local_node()
+    remote = {a.email for a in accounts if a.email in plan and plan[a.email][0] != here}
+    local = [a for a in accounts if a.email not in remote]
+
+    configs = [settings.for_account(a.email, a.password.get_secret_value()) for a in local]
+    preflights = await asyncio.gather(*(run_preflight(c.user_data_dir, data=data) for c in configs))
+
+    summary: Dict[str, Any] = {
+        "accounts": len(accounts),
+        "dispatched": [],
+        "skipped": {},
+        "deferred": [],
+    }
+    for account, preflight in zip(local, preflights):
+        if preflight.should_launch:
+            summary["dispatched"].append(account.email)
+        else:
+            summary["skipped"][account.email] = preflight.reason
+            preflight_stats.record_skip(preflight.elapsed)
+
+    if remote:
+        # 本週沒有免費遊戲時不必再分派
+        if data and not parse_promotions(data):
+            summary["skipped"].update({email: SKIP_NO_PROMOTIONS for email in remote})
+        else:
+            summary["deferred"] = [a.email for a in accounts if a.email in remote]
+    return summary
+
+
+@ext_celery_app.task(
+    name=TASK_CHECK_PROMOTIONS,
+    time_limit=settings.CELERY_PROMOTIONS_TIME_LIMIT,
+    soft_time_limit=int(settings.CELERY_PROMOTIONS_TIME_LIMIT * 0.8),
+)
+def check_promotions_task() -> Dict[str, Any]:
+    plan = route_claims([a.email for a in all_accounts()])
+    summary = asyncio.run(check_promotions(plan))
+    summary.setdefault("deferred", [])
+    targets = summary["dispatched"] + summary["deferred"]
+    summary["assignments"] = {email: plan[email][0] for email in targets if email in plan}
+
+    # 任務訊息只帶 email，由 claim 任務從帳號設定取回密碼
+    for email in targets:
+        kwargs = {"preflight": True} if email in summary["deferred"] else {}
+        if email in plan:
+            # 節點在消費前離開時，訊息留在它的佇列裡沒人處理；設定到期時間，
+            # 讓下一次檢查把帳號重新指派給存活節點，而不是在節點回來時執行過期的任務
+            claim_account_task.apply_async(
+                args=[email],
+                kwargs=kwargs,
+                queue=claim_queue(plan[email][0]),
+                expires=settings.NODE_CLAIM_EXPIRES,
+            )
+        else:
+            claim_account_task.apply_async(args=[email])
+
+    logger.info(
+        f"🗓️ 促銷檢查: {summary['accounts']} 個帳號，分派 {len(summary['dispatched'])} 個領取任務，"
+        f"{len(summary['deferred'])} 個交給設定檔所在節點預檢，略過 {len(summary['skipped'])} 個"
+    )
+    return summary
+
+
+def route_claims(emails: List[str]) -> Dict[str, Tuple[str, str]]:
+    """
+    設定檔親和路由：email -> (node, reason)
+
+    未啟用、註冊表無法連線或沒有存活節點時回傳空 dict，改送共用的 epic-claim 佇列
+    """
+    if not settings.PROFILE_AFFINITY_ENABLED or not emails:
+        return {}
+    try:
+        registry = WorkerRegistry()
+        plan = plan_assignments(emails, registry.alive_nodes(), registry.owners())
+    except Exception as err:
+        logger.warning(f"Worker registry unavailable, using the shared claim queue: {err!r}")
+        return {}
+    if not plan:
+        logger.warning("No live worker registered, using the shared claim queue")
+        return {}
+    log_plan(plan)
+    return plan
+
+
+async def claim_account(email: str, preflight: bool = False) -> Dict[str, Any]:
+    """
+    以單一帳號啟動瀏覽器，登入並領取週免遊戲
+
+    Args:
+        email: 帳號
+        preflight: 先以本機的已擁有索引預檢，沒有可領取的遊戲就不啟動瀏覽器
+    """
+    config = account_settings(email)
+    if config is None:
+        raise ValueError(f"Unknown account: {email}")
+
+    if preflight:
+        checked = await run_preflight(config.user_data_dir, max_age=0)
+        if not checked.should_launch:
+            preflight_stats.record_skip(checked.elapsed)
+            logger.info(f"🗓️ 預檢略過 {email}: {checked.reason}")
+            return {"email": email, "result": None, "skipped": checked.reason, "elapsed": 0.0}
+
     headless = "virtual" if "linux" in sys.platform else False
+    user_data_dir = config.user_data_dir
+    diagnostics_store.begin_run(f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{email}")
 
-    async with AsyncCamoufox(
-        persistent_context=True,
-        user_data_dir=settings.user_data_dir,
-        screen=Screen(max_width=1920, max_height=1080, min_height=1080, min_width=1920),
-        record_video_dir=RECORD_DIR,
-        record_video_size=ViewportSize(width=1920, height=1080),
-        humanize=0.2,
-        headless=headless,
-    ) as browser:
+    # 設定檔未開啟時清除快取與崩潰報告
+    await asyncio.to_thread(profile_maintenance.compact, user_data_dir)
+
+    start = time.perf_counter()
+    result = None
+    async with AsyncCamoufox(**browser_launch_options(headless, user_data_dir)) as browser:
+        profile_maintenance.record_launch(time.perf_counter() - start, user_data_dir)
         page = browser.pages[0] if browser.pages else await browser.new_page()
 
-        agent = EpicAuthorization(page)
-        await agent.invoke()
+        # 僅在領取失敗時保存 trace
+        recorder = RunRecorder(root=RECORD_DIR.joinpath(email))
+        await recorder.start(browser)
+
+        try:
+            agent = EpicAuthorization(page, config)
+            session_verified = await agent.invoke()
+            await recorder.checkpoint("auth")
 
-        game_page = await browser.new_page()
-        agent = EpicAgent(game_page)
-        await agent.collect_epic_games()
+            game_page = await browser.new_page()
+            agent = EpicAgent(game_page, session_verified=bool(session_verified), config=config)
+            result = await agent.collect_epic_games()
+        finally:
+            await recorder.finish(
+                succeeded=result in (GameCollectResult.ALL_OWNED, GameCollectResult.SUCCESS),
+                outcome=result.value if result else "crashed",
+            )
 
         with suppress(Exception):
             for p in browser.pages:
@@ -98,6 +259,108 @@ async def collect_epic_games_task():
         with suppress(Exception):
             await browser.close()
 
+    await diagnostics_store.flush()
+
+    elapsed = time.perf_counter() - start
+    preflight_stats.record_launch(elapsed)
+
+    # 這個節點現在持有登入後的設定檔，之後的領取固定送到這裡
+    if settings.PROFILE_AFFINITY_ENABLED:
+        with suppress(Exception):
+            WorkerRegistry().set_owner(email, local_node())
+
+    return {
+        "email": email,
+        "result": result.value if result else None,
+        "elapsed": round(elapsed, 1),
+    }
+
+
+@ext_celery_app.task(
+    name=TASK_CLAIM_ACCOUNT,
+    time_limit=settings.CELERY_TASK_TIME_LIMIT,
+    soft_time_limit=settings.CELERY_TASK_SOFT_TIME_LIMIT,
+)
+def claim_account_task(email: str, preflight: bool = False) -> Dict[str, Any]:
+    sink = add_account_sink(email, LOG_DIR.joinpath("accounts", email))
+    try:
+        with logger.contextualize(account=email):
+            return asyncio.run(claim_account(email, preflight=preflight))
+    finally:
+        logger.remove(sink)
+
+
+@ext_celery_app.task(name=TASK_EXPORT_PROFILE, time_limit=settings.CELERY_PROMOTIONS_TIME_LIMIT)
+def export_profile_task(email: str) -> Dict[str, Any]:
+    """在持有設定檔的節點上匯出登入狀態，暫存到 Redis 交給目標節點"""
+    config = account_settings(email)
+    if config is None:
+        raise ValueError(f"Unknown account: {email}")
+
+    started_at = time.time()
+    blob, stats = export_profile(config.user_data_dir)
+    WorkerRegistry().put_transfer(email, blob)
+    logger.info(
+        f"📦 匯出設定檔 {email}: {stats.files} 個檔案，{stats.bytes / 1024:.0f}KB，耗時 {stats.elapsed:.2f}s"
+    )
+    return {"email": email, "source": local_node(), "started_at": started_at, **stats.as_dict()}
+
+
+@ext_celery_app.task(name=TASK_IMPORT_PROFILE, time_limit=settings.CELERY_PROMOTIONS_TIME_LIMIT)
+def import_profile_task(exported: Dict[str, Any], email: str) -> Dict[str, Any]:
+    """在目標節點匯入設定檔並接手該帳號"""
+    config = account_settings(email)
+    if config is None:
+        raise ValueError(f"Unknown account: {email}")
+
+    registry = WorkerRegistry()
+    blob = registry.pop_transfer(email)
+    if blob is None:
+        raise RuntimeError(f"No profile transfer pending for {email}")
+
+    stats = import_profile(config.user_data_dir, blob)
+    registry.set_owner(email, local_node())
+    total = time.time() - exported["started_at"]
+    logger.info(
+        f"📦 匯入設定檔 {email}: {exported['source']} → {local_node()}，"
+        f"{stats.bytes / 1024:.0f}KB，匯出 {exported['elapsed']:.2f}s / 匯入 {stats.elapsed:.2f}s / "
+        f"總計 {total:.1f}s"
+    )
+    return {
+        "email": email,
+        "source": exported["source"],
+        "target": local_node(),
+        "bytes": stats.bytes,
+        "files": stats.files,
+        "export_seconds": exported["elapsed"],
+        "import_seconds": round(stats.elapsed, 3),
+        "total_seconds": round(total, 3),
+    }
+
+
+def relocate_profile(email: str, target: str, source: str | None = None):
+    """
+    明確地將帳號的設定檔從目前的節點搬到 target
+
+    匯出在來源節點的佇列上執行，完成後鏈結到目標節點匯入；匯入成功才更新擁有者，
+    搬移期間的領取仍送往來源節點。
+
+    Returns:
+        匯出任務的 AsyncResult；匯入結果為其 children
+    """
+    source = source or WorkerRegistry().owners().get(email)
+    if not source:
+        raise ValueError(f"{email} has no profile owner to relocate from")
+    if source == target:
+        raise ValueError(f"{email} is already on {target}")
+
+    return export_profile_task.apply_async(
+        args=[email],
+        queue=claim_queue(source),
+        link=import_profile_task.s(email).set(queue=claim_queue(target)),
+    )
+
 
 if __name__ == '__main__':
-    asyncio.run(collect_epic_games_task())
+    for account in all_accounts():
+        asyncio.run(claim_account(account.email))
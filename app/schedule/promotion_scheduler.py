@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 13:40
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 依促銷時段自適應排程
+
+取代固定的 CronTrigger 輪詢：
+- 根據 promotionalOffers / upcomingPromotionalOffers 的起訖時間，排在下一個促銷邊界之後（加隨機抖動）
+- 邊界剛過的數小時內每小時重新驗證一次，涵蓋 Epic 資料延遲更新的情況
+- 每日保底檢查：促銷集合自上次成功執行後未變化時直接略過，不啟動瀏覽器
+- 下一次排程持久化到磁碟，重新啟動後補跑錯過的排程，不重複已完成的工作
+"""
+import json
+import random
+from contextlib import suppress
+from datetime import datetime, timedelta, tzinfo
+from json import JSONDecodeError
+from pathlib import Path
+from typing import List, Tuple
+
+from loguru import logger
+
+from settings import RUNTIME_DIR
+
+# 促銷邊界過後持續每小時重新驗證的時間
+BOUNDARY_FOLLOWUP_WINDOW = timedelta(hours=4)
+BOUNDARY_FOLLOWUP_INTERVAL = timedelta(hours=1)
+
+REASON_STARTUP = "startup"
+REASON_CATCH_UP = "catch_up"
+REASON_BOUNDARY = "boundary"
+REASON_FOLLOWUP = "followup"
+REASON_DAILY = "daily"
+
+
+class PromotionScheduler:
+
+    def __init__(
+        self,
+        tz: tzinfo,
+        state_path: Path = RUNTIME_DIR.joinpath("scheduler_state.json"),
+        daily_at: str = "12:00",
+        jitter_seconds: int = 600,
+        rng: random.Random | None = None,
+    ):
+        self.tz = tz
+        self.state_path = state_path
+        self.daily_hour, self.daily_minute = (int(i) for i in daily_at.split(":"))
+        self.jitter_seconds = max(0, jitter_seconds)
+
+        self._rng = rng or random.Random()
+        self._state = self._load()
+
+    def _load(self) -> dict:
+        with suppress(OSError, JSONDecodeError):
+            return json.loads(self.state_path.read_text(encoding="utf8"))
+        return {}
+
+    def _save(self):
+        with suppress(OSError):
+            self.state_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.state_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._state, indent=2), encoding="utf8")
+            tmp.replace(self.state_path)
+
+    @property
+    def settled_fingerprint(self) -> str | None:
+        return self._state.get("settled_fingerprint")
+
+    def _jitter(self) -> timedelta:
+        # 至少延後一分鐘，避免在邊界當下 Epic 資料尚未切換
+        return timedelta(seconds=60 + self._rng.uniform(0, self.jitter_seconds))
+
+    def _next_daily(self, now: datetime) -> datetime:
+        local = now.astimezone(self.tz)
+        target = local.replace(
+            hour=self.daily_hour, minute=self.daily_minute, second=0, microsecond=0
+        )
+        if target <= local:
+            target = (local + timedelta(days=1)).replace(
+                hour=self.daily_hour, minute=self.daily_minute, second=0, microsecond=0
+            )
+        return target
+
+    def plan(self, boundaries: List[datetime], now: datetime) -> Tuple[datetime, str]:
+        """計算下一次執行時間與原因"""
+        candidates = [(self._next_daily(now), REASON_DAILY)]
+
+        if upcoming := [b for b in boundaries if b > now]:
+            candidates.append((min(upcoming) + self._jitter(), REASON_BOUNDARY))
+
+        if passed := [b for b in boundaries if b <= now]:
+            if now - max(passed) < BOUNDARY_FOLLOWUP_WINDOW:
+                candidates.append((now + BOUNDARY_FOLLOWUP_INTERVAL, REASON_FOLLOWUP))
+
+        run_at, reason = min(candidates, key=lambda c: c[0])
+        return run_at.astimezone(self.tz), reason
+
+    def startup_reason(self, now: datetime) -> str:
+        """重新啟動時判斷是否有錯過的排程"""
+        with suppress(KeyError, TypeError, ValueError):
+            planned = datetime.fromisoformat(self._state["next_run_at"])
+            if planned <= now:
+                logger.info(
+                    f"⏰ 發現錯過的排程 {planned.isoformat()} ({self._state.get('next_run_reason')})，立即補跑"
+                )
+                return REASON_CATCH_UP
+        return REASON_STARTUP
+
+    def should_skip(self, fingerprint: str | None) -> bool:
+        """促銷集合與上次成功執行時相同（已全部入庫）則略過"""
+        return fingerprint is not None and fingerprint == self.settled_fingerprint
+
+    def mark_settled(self, fingerprint: str, now: datetime):
+        self._state["settled_fingerprint"] = fingerprint
+        self._state["settled_at"] = now.isoformat()
+        self._save()
+
+    def persist_next(self, run_at: datetime, reason: str):
+        self._state["next_run_at"] = run_at.isoformat()
+        self._state["next_run_reason"] = reason
+        self._save()
@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19 02:30
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 多帳號領取編排
+
+從 EPIC_ACCOUNTS_FILE 載入帳號清單，促銷資料只取得一次，
+再以 ACCOUNT_CONCURRENCY 為上限並行處理各帳號。每個帳號使用自己的設定檔目錄、
+紀錄檔與診斷資料目錄，全部結束後輸出一張彙整結果表。
+"""
+import asyncio
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Awaitable, Callable, List
+
+from loguru import logger
+from pydantic import SecretStr
+
+from services.epic_games_service import GameCollectResult
+from settings import LOG_DIR, EpicSettings, settings
+from utils import add_account_sink
+
+SUCCESS_RESULTS = (GameCollectResult.ALL_OWNED, GameCollectResult.SUCCESS)
+
+
+@dataclass
+class EpicAccount:
+    email: str
+    password: SecretStr = field(repr=False)
+
+
+@dataclass
+class AccountResult:
+    email: str
+    result: GameCollectResult | None = None
+    elapsed: float = 0.0
+    error: str | None = None
+
+    @property
+    def ok(self) -> bool:
+        return self.result in SUCCESS_RESULTS
+
+
+def load_accounts(path: Path) -> List[EpicAccount]:
+    """
+    讀取帳號清單：每行 email:password，忽略空行與 # 開頭的註解；重複的 email 只保留第一筆
+    """
+    accounts, seen = [], set()
+    for lineno, line in enumerate(path.read_text(encoding="utf8").splitlines(), start=1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        # email 不含冒號，密碼可以
+        email, sep, password = line.partition(":")
+        email = email.strip()
+        if not sep or not email or not password:
+            logger.warning(f"帳號清單第 {lineno} 行格式錯誤，已略過")
+            continue
+        if email in seen:
+            logger.warning(f"帳號清單第 {lineno} 行的帳號重複，已略過: {email}")
+            continue
+        seen.add(email)
+        accounts.append(EpicAccount(email=email, password=SecretStr(password)))
+    return accounts
+
+
+def configured_accounts() -> List[EpicAccount]:
+    """EPIC_ACCOUNTS_FILE 中的帳號；每次呼叫重新讀取，修改清單不必重新啟動"""
+    if not settings.EPIC_ACCOUNTS_FILE:
+        return []
+    try:
+        return load_accounts(settings.EPIC_ACCOUNTS_FILE)
+    except OSError as err:
+        logger.error(f"讀取帳號清單失敗 {settings.EPIC_ACCOUNTS_FILE}: {err!r}")
+        return []
+
+
+def all_accounts() -> List[EpicAccount]:
+    """多帳號清單；未設定時退回 EPIC_EMAIL/EPIC_PASSWORD 的單一帳號"""
+    if accounts := configured_accounts():
+        return accounts
+    if settings.EPIC_EMAIL and settings.EPIC_PASSWORD:
+        return [EpicAccount(email=settings.EPIC_EMAIL, password=settings.EPIC_PASSWORD)]
+    return []
+
+
+def account_settings(email: str) -> EpicSettings | None:
+    """依 email 取回帳號設定；任務訊息只帶 email，密碼不經過 broker"""
+    for account in all_accounts():
+        if account.email == email:
+            return settings.for_account(account.email, account.password.get_secret_value())
+    return None
+
+
+async def run_accounts(
+    accounts: List[EpicAccount],
+    runner: Callable[[EpicSettings], Awaitable[GameCollectResult | None]],
+    concurrency: int | None = None,
+    base: EpicSettings | None = None,
+) -> List[AccountResult]:
+    """
+    並行處理多個帳號，回傳順序與 accounts 相同
+
+    Args:
+        accounts: 帳號清單
+        runner: 以單一帳號的設定執行一次領取
+        concurrency: 同時處理的帳號數上限，預設 ACCOUNT_CONCURRENCY
+        base: 複製各帳號設定的來源，預設為全域設定
+    """
+    base = base or settings
+    semaphore = asyncio.Semaphore(max(1, concurrency or settings.ACCOUNT_CONCURRENCY))
+
+    async def _run(account: EpicAccount) -> AccountResult:
+        config = base.for_account(account.email, account.password.get_secret_value())
+        outcome = AccountResult(email=account.email)
+        async with semaphore:
+            sink = add_account_sink(account.email, LOG_DIR.joinpath("accounts", account.email))
+            start = time.perf_counter()
+            # contextualize 依 contextvars 運作，只標記這個帳號 task 內的紀錄
+            with logger.contextualize(account=account.email):
+                try:
+                    outcome.result = await runner(config)
+                except Exception as err:
+                    logger.exception(err)
+                    outcome.error = repr(err)
+                finally:
+                    outcome.elapsed = time.perf_counter() - start
+                    logger.remove(sink)
+        return outcome
+
+    return list(await asyncio.gather(*(_run(a) for a in accounts)))
+
+
+def format_result_table(results: List[AccountResult]) -> str:
+    rows = [("Account", "Result", "Time", "Error")]
+    for r in results:
+        result = r.result.value if r.result else "crashed"
+        rows.append((r.email, result, f"{r.elapsed:.1f}s", r.error or ""))
+
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    lines = [" | ".join(cell.ljust(w) for cell, w in zip(row, widths)).rstrip() for row in rows]
+    lines.insert(1, "-+-".join("-" * w for w in widths))
+
+    ok = sum(1 for r in results if r.ok)
+    lines.append(f"{ok}/{len(results)} accounts succeeded")
+    return "\n".join(lines)
@@ -0,0 +1,216 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19 00:20
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 瀏覽器啟動與常駐瀏覽器池
+
+每次排程都重新啟動 Camoufox 需要重新產生指紋、啟動 Firefox、載入設定檔與擴充套件。
+常駐程序（ENABLE_APSCHEDULER）可改用瀏覽器池：每個帳號保留一個已啟動、
+通過健康檢查的瀏覽器，執行 N 次或記憶體超過門檻後重新啟動，並統計冷/熱啟動延遲。
+"""
+
+import asyncio
+import os
+import time
+from contextlib import suppress
+from pathlib import Path
+from statistics import mean
+from typing import Any, Dict, List
+
+from browserforge.fingerprints import Screen
+from camoufox import AsyncCamoufox
+from loguru import logger
+from playwright.async_api import BrowserContext, ViewportSize
+
+from services.profile_maintenance import profile_maintenance
+from settings import RECORD_DIR, settings
+
+HEALTH_CHECK_TIMEOUT = 5.0
+
+
+def browser_launch_options(headless: Any, user_data_dir: Path | None = None) -> Dict[str, Any]:
+    """deploy、Celery 任務與瀏覽器池共用的 Camoufox 啟動參數"""
+    options = dict(
+        persistent_context=True,
+        user_data_dir=user_data_dir or settings.user_data_dir,
+        screen=Screen(max_width=1920, max_height=1080, min_height=1080, min_width=1920),
+        humanize=0.2,
+        headless=headless,
+    )
+    # 全程錄影會在解驗證碼時持續編碼畫面，只有 always 模式保留；on_failure 改由 RunRecorder 錄製 trace
+    if settings.RECORDING_MODE == "always":
+        options.update(
+            record_video_dir=RECORD_DIR,
+            record_video_size=ViewportSize(width=1920, height=1080),
+        )
+    return options
+
+
+def _process_tree(root_pid: int) -> List[Path] | None:
+    """列出 root_pid 所有子孫程序的 /proc 目錄（僅 Linux）"""
+    proc = Path("/proc")
+    if not proc.is_dir():
+        return None
+
+    children: Dict[int, List[int]] = {}
+    for entry in proc.iterdir():
+        if not entry.name.isdigit():
+            continue
+        with suppress(OSError, ValueError, IndexError):
+            stat = entry.joinpath("stat").read_text()
+            # comm 欄位可能含空白，從最後一個 ')' 之後開始切分
+            ppid = int(stat[stat.rindex(")") + 2 :].split()[1])
+            children.setdefault(ppid, []).append(int(entry.name))
+
+    found, stack = [], list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        found.append(proc.joinpath(str(pid)))
+        stack.extend(children.get(pid, []))
+    return found
+
+
+def _process_tree_rss_mb(root_pid: int) -> float | None:
+    """加總 root_pid 所有子孫程序的 RSS"""
+    tree = _process_tree(root_pid)
+    if tree is None:
+        return None
+
+    total_kb = 0
+    for entry in tree:
+        with suppress(OSError, ValueError, IndexError):
+            for line in entry.joinpath("status").read_text().splitlines():
+                if line.startswith("VmRSS:"):
+                    total_kb += int(line.split()[1])
+                    break
+    return total_kb / 1024
+
+
+def process_tree_cpu_seconds(root_pid: int) -> float | None:
+    """加總 root_pid 所有子孫程序（含已回收的子程序）耗用的 CPU 時間"""
+    tree = _process_tree(root_pid)
+    if tree is None:
+        return None
+
+    ticks = 0
+    for entry in tree:
+        with suppress(OSError, ValueError, IndexError):
+            stat = entry.joinpath("stat").read_text()
+            # utime, stime, cutime, cstime
+            fields = stat[stat.rindex(")") + 2 :].split()
+            ticks += sum(int(v) for v in fields[11:15])
+    return ticks / os.sysconf("SC_CLK_TCK")
+
+
+class BrowserPool:
+
+    def __init__(
+        self,
+        headless: Any,
+        user_data_dir: Path | None = None,
+        max_runs: int | None = None,
+        max_rss_mb: int | None = None,
+    ):
+        self.headless = headless
+        self.user_data_dir = user_data_dir
+        self.max_runs = max_runs or settings.BROWSER_POOL_MAX_RUNS
+        self.max_rss_mb = max_rss_mb or settings.BROWSER_POOL_MAX_RSS_MB
+
+        self._manager: AsyncCamoufox | None = None
+        self._browser: BrowserContext | None = None
+        self._runs = 0
+        self._lock = asyncio.Lock()
+
+        self.cold_starts: List[float] = []
+        self.warm_starts: List[float] = []
+
+    async def _launch(self) -> BrowserContext:
+        # 設定檔只有在瀏覽器關閉時才能整理，冷啟動前是唯一的時機
+        await asyncio.to_thread(profile_maintenance.compact, self.user_data_dir)
+
+        start = time.perf_counter()
+        self._manager = AsyncCamoufox(**browser_launch_options(self.headless, self.user_data_dir))
+        self._browser = await self._manager.__aenter__()
+        profile_maintenance.record_launch(time.perf_counter() - start, self.user_data_dir)
+        self._runs = 0
+        return self._browser
+
+    async def _shutdown(self):
+        browser, manager = self._browser, self._manager
+        self._browser = self._manager = None
+        if browser:
+            with suppress(Exception):
+                await browser.close()
+        if manager:
+            with suppress(Exception):
+                await manager.__aexit__(None, None, None)
+
+    async def _is_healthy(self) -> bool:
+        try:
+            page = await asyncio.wait_for(self._browser.new_page(), HEALTH_CHECK_TIMEOUT)
+            await asyncio.wait_for(page.evaluate("1 + 1"), HEALTH_CHECK_TIMEOUT)
+            await page.close()
+            return True
+        except Exception as err:
+            logger.warning(f"Pooled browser failed health check: {err!r}")
+            return False
+
+    def _recycle_reason(self) -> str | None:
+        if self._runs >= self.max_runs:
+            return f"reached {self._runs} runs"
+        rss = _process_tree_rss_mb(os.getpid())
+        if rss is not None and rss > self.max_rss_mb:
+            return f"RSS {rss:.0f}MB > {self.max_rss_mb}MB"
+        return None
+
+    async def acquire(self) -> BrowserContext:
+        """取得可用的瀏覽器；池中的瀏覽器不健康或需要回收時重新啟動"""
+        await self._lock.acquire()
+        start = time.perf_counter()
+        try:
+            if self._browser:
+                reason = self._recycle_reason()
+                if reason is None and await self._is_healthy():
+                    self.warm_starts.append(time.perf_counter() - start)
+                    logger.debug(f"Reusing pooled browser (run #{self._runs + 1})")
+                    return self._browser
+                logger.info(f"Recycling pooled browser: {reason or 'unhealthy'}")
+                await self._shutdown()
+
+            browser = await self._launch()
+            self.cold_starts.append(time.perf_counter() - start)
+            return browser
+        except BaseException:
+            self._lock.release()
+            raise
+
+    async def release(self):
+        """單次執行結束：關閉本次開啟的頁面，保留瀏覽器給下一次"""
+        try:
+            self._runs += 1
+            if self._browser:
+                pages = list(self._browser.pages)
+                # 持久化 context 至少保留一個分頁，避免關閉最後一頁時整個瀏覽器退出
+                for page in pages[1:]:
+                    with suppress(Exception):
+                        await page.close()
+                if pages:
+                    with suppress(Exception):
+                        await pages[0].goto("about:blank")
+        finally:
+            self._lock.release()
+        self.report()
+
+    async def close(self):
+        async with self._lock:
+            await self._shutdown()
+
+    def report(self):
+        cold = (
+            f"{mean(self.cold_starts):.2f}s x{len(self.cold_starts)}" if self.cold_starts else "-"
+        )
+        warm = (
+            f"{mean(self.warm_starts):.2f}s x{len(self.warm_starts)}" if self.warm_starts else "-"
+        )
+        logger.info(f"Browser pool latency - cold start: {cold} | warm start: {warm}")
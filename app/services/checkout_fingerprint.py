@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 18:25
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 結帳流程指紋快取
+
+記錄每種結帳流程（即時結帳 / 購物車）與結帳形態（purchase iframe / 主頁面彈層）下，
+上一次成功的容器 URL 模式、選擇器與確認按鈕處理方式，附帶命中次數與最後成功時間。
+下次執行先走學習到的路徑，未命中才退回完整掃描。
+"""
+import json
+import time
+from contextlib import suppress
+from contextvars import ContextVar
+from dataclasses import dataclass
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Dict
+from urllib.parse import urlsplit
+
+from loguru import logger
+from playwright.async_api import Page
+
+from services.locator_race import candidate_containers
+from settings import RUNTIME_DIR
+
+FLOW_INSTANT = "instant"
+FLOW_CART = "cart"
+
+VARIANT_PURCHASE_IFRAME = "purchase_iframe"
+VARIANT_PAGE_OVERLAY = "page_overlay"
+# 下單確認按鈕的處理方式（payment-confirm__btn / PLACE ORDER）
+VARIANT_CONFIRM = "confirm"
+
+PAGE_PATTERN = "page"
+
+
+def frame_pattern(url: str) -> str:
+    """去除查詢參數，只保留 host + path 作為容器 URL 模式"""
+    parts = urlsplit(url or "")
+    return f"{parts.netloc}{parts.path}".rstrip("/") or PAGE_PATTERN
+
+
+def classify_checkout_variant(page: Page) -> str:
+    """由 frame 樹判斷結帳形態"""
+    for _, container in candidate_containers(page):
+        if container is not page and "/purchase" in frame_pattern(container.url):
+            return VARIANT_PURCHASE_IFRAME
+    return VARIANT_PAGE_OVERLAY
+
+
+def find_container(page: Page, pattern: str) -> tuple[str, Any] | None:
+    """在目前的 frame 樹中找出符合 URL 模式的容器"""
+    for label, container in candidate_containers(page):
+        if container is page:
+            if pattern == PAGE_PATTERN:
+                return label, container
+        elif frame_pattern(container.url) == pattern:
+            return label, container
+    return None
+
+
+@dataclass
+class _RunStats:
+    hits: int = 0
+    lookups: int = 0
+
+
+class CheckoutFingerprintCache:
+
+    def __init__(self, path: Path = RUNTIME_DIR.joinpath("checkout_fingerprints.json")):
+        self.path = path
+
+        self._entries: Dict[str, dict] = {}
+        self._loaded = False
+
+        # 本次執行的命中統計跟著 asyncio task 走，多帳號並行時各自計算
+        self._run: ContextVar[_RunStats | None] = ContextVar(
+            f"checkout_fingerprint_run_{id(self)}", default=None
+        )
+
+    def _stats(self) -> _RunStats:
+        if (stats := self._run.get()) is None:
+            stats = _RunStats()
+            self._run.set(stats)
+        return stats
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+        with suppress(OSError, JSONDecodeError):
+            self._entries = json.loads(self.path.read_text(encoding="utf8"))
+
+    def _save(self):
+        with suppress(OSError):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self._entries, indent=2), encoding="utf8")
+            tmp.replace(self.path)
+
+    @staticmethod
+    def key(flow: str, variant: str) -> str:
+        return f"{flow}:{variant}"
+
+    def begin_run(self):
+        self._run.set(_RunStats())
+
+    def lookup(self, flow: str, variant: str) -> dict | None:
+        self._load()
+        entry = self._entries.get(self.key(flow, variant))
+        if entry:
+            self._stats().lookups += 1
+        return entry
+
+    def record_hit(self, flow: str, variant: str):
+        entry = self._entries[self.key(flow, variant)]
+        entry["hits"] = entry.get("hits", 0) + 1
+        entry["last_success"] = time.time()
+        self._stats().hits += 1
+        self._save()
+
+    def record_miss(self, flow: str, variant: str):
+        entry = self._entries[self.key(flow, variant)]
+        entry["misses"] = entry.get("misses", 0) + 1
+        self._save()
+
+    def learn(self, flow: str, variant: str, **fields):
+        """記錄完整掃描找到的新路徑；路徑相同時保留累計命中次數"""
+        self._load()
+        key = self.key(flow, variant)
+        entry = self._entries.get(key, {})
+        if any(entry.get(k) != v for k, v in fields.items()):
+            entry = {**entry, **fields, "hits": 0, "misses": 0}
+        entry["last_success"] = time.time()
+        self._entries[key] = entry
+        self._save()
+        logger.debug(f"學習結帳路徑: {key} -> {fields}")
+
+    def report(self):
+        stats = self._stats()
+        if not stats.lookups:
+            return
+        rate = stats.hits / stats.lookups
+        logger.info(f"📈 結帳學習路徑命中率: {stats.hits}/{stats.lookups} ({rate:.0%})")
+
+
+checkout_fingerprints = CheckoutFingerprintCache()
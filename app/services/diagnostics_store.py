@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 20:10
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 失敗診斷資料儲存
+
+失敗時擷取 HTML、frame 樹與截圖。事件迴圈上只做必要的 Playwright 呼叫，
+壓縮（zstd / WebP）與寫檔交給背景執行緒，依 run 與階段建立索引，
+並以總容量與保留天數限制磁碟用量。
+"""
+import asyncio
+import gzip
+import io
+import json
+import shutil
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import suppress
+from contextvars import ContextVar
+from dataclasses import dataclass
+from datetime import datetime
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Dict, List, Set
+
+from loguru import logger
+from playwright.async_api import Page
+
+from settings import DIAGNOSTICS_DIR, settings
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+try:
+    from PIL import Image
+except ImportError:  # pragma: no cover
+    Image = None
+
+INDEX_FILE = "index.jsonl"
+
+
+@dataclass
+class _Run:
+    run_id: str
+    seq: int = 0
+
+
+def compress_text(text: str) -> tuple[bytes, str]:
+    """以 zstd 壓縮文字，未安裝 zstandard 時退回 gzip；回傳 (資料, 副檔名)"""
+    raw = text.encode("utf8")
+    if zstandard is not None:
+        return zstandard.ZstdCompressor(level=10).compress(raw), ".zst"
+    return gzip.compress(raw, compresslevel=6), ".gz"
+
+
+def compress_screenshot(png: bytes, quality: int = 60) -> tuple[bytes, str]:
+    """PNG 轉 WebP，未安裝 Pillow 時保留原始 PNG"""
+    if Image is None:
+        return png, ".png"
+    with Image.open(io.BytesIO(png)) as im:
+        buf = io.BytesIO()
+        im.save(buf, format="WEBP", quality=quality, method=4)
+        return buf.getvalue(), ".webp"
+
+
+def frame_tree(page: Page) -> List[Dict[str, Any]]:
+    """frame 樹只讀取本地狀態，不產生 Playwright 往返"""
+    tree = []
+    for idx, frame in enumerate(page.frames):
+        parent = frame.parent_frame
+        tree.append(
+            {
+                "index": idx,
+                "name": frame.name,
+                "url": frame.url,
+                "parent": page.frames.index(parent) if parent in page.frames else None,
+                "detached": frame.is_detached(),
+            }
+        )
+    return tree
+
+
+class DiagnosticsStore:
+
+    def __init__(
+        self,
+        root: Path = DIAGNOSTICS_DIR,
+        max_bytes: int | None = None,
+        max_age_seconds: float | None = None,
+    ):
+        self.root = root
+        self.max_bytes = max_bytes or settings.DIAGNOSTICS_MAX_MB * 1024 * 1024
+        self.max_age_seconds = max_age_seconds or settings.DIAGNOSTICS_MAX_AGE_DAYS * 86400
+
+        # 單一背景執行緒：寫檔、索引與清理依提交順序執行，不需額外加鎖
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="diagnostics")
+        self._pending: Set[Future] = set()
+        # 目前的 run 跟著 asyncio task 走，多個帳號並行時各自編號、互不覆寫
+        self._run: ContextVar[_Run | None] = ContextVar(f"diagnostics_run_{id(self)}", default=None)
+
+    @property
+    def run_id(self) -> str | None:
+        run = self._run.get()
+        return run.run_id if run else None
+
+    def begin_run(self, run_id: str | None = None) -> str:
+        run = _Run(run_id or datetime.now().strftime("%Y%m%d-%H%M%S"))
+        self._run.set(run)
+        return run.run_id
+
+    async def capture(
+        self, page: Page, phase: str, *, html: bool = True, screenshot: bool = True
+    ) -> Path:
+        """
+        擷取目前頁面的診斷資料並交給背景執行緒寫入。
+
+        Returns:
+            Path: 本次擷取的輸出目錄（檔案可能尚未寫完，需要時呼叫 flush()）
+        """
+        if self._run.get() is None:
+            self.begin_run()
+        run = self._run.get()
+        run.seq += 1
+        prefix = f"{run.seq:02d}-{phase}"
+
+        payload: Dict[str, Any] = {"frames": frame_tree(page), "url": page.url}
+        if html:
+            with suppress(Exception):
+                payload["html"] = await page.content()
+        if screenshot:
+            with suppress(Exception):
+                payload["screenshot"] = await page.screenshot(type="png")
+
+        run_dir = self.root.joinpath(run.run_id)
+        future = self._executor.submit(self._write, run_dir, phase, prefix, payload)
+        self._pending.add(future)
+        future.add_done_callback(self._pending.discard)
+        return run_dir
+
+    async def flush(self):
+        """等待所有已提交的寫入完成"""
+        if pending := list(self._pending):
+            await asyncio.gather(*(asyncio.wrap_future(f) for f in pending), return_exceptions=True)
+
+    def _write(self, run_dir: Path, phase: str, prefix: str, payload: Dict[str, Any]):
+        try:
+            run_dir.mkdir(parents=True, exist_ok=True)
+            files: Dict[str, int] = {}
+
+            def _dump(name: str, data: bytes):
+                run_dir.joinpath(name).write_bytes(data)
+                files[name] = len(data)
+
+            if html := payload.get("html"):
+                data, ext = compress_text(html)
+                _dump(f"{prefix}.html{ext}", data)
+            data, ext = compress_text(json.dumps(payload["frames"], ensure_ascii=False))
+            _dump(f"{prefix}.frames.json{ext}", data)
+            if png := payload.get("screenshot"):
+                data, ext = compress_screenshot(png)
+                _dump(f"{prefix}{ext}", data)
+
+            entry = {
+                "run": run_dir.name,
+                "phase": phase,
+                "url": payload["url"],
+                "ts": time.time(),
+                "files": files,
+            }
+            with self.root.joinpath(INDEX_FILE).open("a", encoding="utf8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            logger.warning(
+                f"🧾 已儲存診斷資料: {run_dir.name}/{prefix} ({sum(files.values()) / 1024:.0f}KB)"
+            )
+            self._prune(keep=run_dir.name)
+        except OSError as err:
+            logger.warning(f"儲存診斷資料失敗: {err}")
+
+    def _prune(self, keep: str | None = None):
+        """刪除過期的 run，再由舊到新刪除直到總容量低於上限"""
+        runs = sorted((p for p in self.root.iterdir() if p.is_dir()), key=lambda p: p.name)
+        sizes = {p: sum(f.stat().st_size for f in p.iterdir()) for p in runs}
+        now = time.time()
+        total = sum(sizes.values())
+
+        removed = set()
+        for run in runs:
+            expired = now - run.stat().st_mtime > self.max_age_seconds
+            if not expired and total <= self.max_bytes:
+                continue
+            # 保留目前正在寫入的 run
+            if run.name == keep and not expired:
+                continue
+            shutil.rmtree(run, ignore_errors=True)
+            total -= sizes[run]
+            removed.add(run.name)
+
+        if removed:
+            self._rewrite_index(removed)
+            logger.debug(f"清理診斷資料: 移除 {len(removed)} 個 run，剩餘 {total / 1024 / 1024:.1f}MB")
+
+    def _rewrite_index(self, removed: Set[str]):
+        path = self.root.joinpath(INDEX_FILE)
+        kept = []
+        with suppress(OSError):
+            for line in path.read_text(encoding="utf8").splitlines():
+                with suppress(JSONDecodeError):
+                    if json.loads(line).get("run") not in removed:
+                        kept.append(line)
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text("".join(f"{line}\n" for line in kept), encoding="utf8")
+        tmp.replace(path)
+
+    def entries(self, run_id: str | None = None) -> List[dict]:
+        """讀取索引，可依 run 篩選"""
+        items = []
+        with suppress(OSError):
+            for line in self.root.joinpath(INDEX_FILE).read_text(encoding="utf8").splitlines():
+                with suppress(JSONDecodeError):
+                    entry = json.loads(line)
+                    if run_id is None or entry.get("run") == run_id:
+                        items.append(entry)
+        return items
+
+
+diagnostics_store = DiagnosticsStore()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 20:40
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 批次 DOM 檢查
+
+以單一 evaluate 取得選擇器命中的所有元素的文字、屬性與狀態，
+每個容器只需一次往返；多個容器同時檢查。
+"""
+import asyncio
+from typing import Any, Dict, List, Mapping, Sequence, Tuple
+
+from services.locator_race import Container
+
+DEFAULT_ATTRIBUTES = ("aria-label", "data-testid", "class", "type")
+
+INSPECT_SCRIPT = """
+(elements, { attributes, probes }) => elements.map((el) => {
+  const attrs = {};
+  for (const name of attributes) attrs[name] = el.getAttribute(name);
+  const matched = {};
+  for (const [name, xpath] of Object.entries(probes)) {
+    matched[name] = document.evaluate(xpath, el, null, XPathResult.BOOLEAN_TYPE, null).booleanValue;
+  }
+  return {
+    text: (el.textContent || "").trim(),
+    attrs,
+    probes: matched,
+    disabled: !!el.disabled || el.getAttribute("aria-disabled") === "true",
+    visible: !!(el.offsetWidth || el.offsetHeight || el.getClientRects().length),
+  };
+})
+"""
+
+
+async def inspect_elements(
+    container: Container,
+    selector: str,
+    attributes: Sequence[str] = DEFAULT_ATTRIBUTES,
+    probes: Mapping[str, str] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    回傳 selector 命中的所有元素摘要（依 DOM 順序）：
+    {"text": str, "attrs": {name: value | None}, "probes": {name: bool}, "disabled": bool, "visible": bool}
+
+    probes 為 {名稱: 相對於元素的 XPath}，例如 {"free": ".//span[text()='Free']"}。
+    """
+    arg = {"attributes": list(attributes), "probes": dict(probes or {})}
+    return await container.locator(selector).evaluate_all(INSPECT_SCRIPT, arg)
+
+
+async def inspect_containers(
+    containers: Sequence[Tuple[str, Container]],
+    selector: str,
+    attributes: Sequence[str] = DEFAULT_ATTRIBUTES,
+) -> List[Tuple[str, List[Dict[str, Any]] | BaseException]]:
+    """同時檢查多個容器；單一容器失敗（例如 frame 已卸載）時以例外物件代替結果"""
+    results = await asyncio.gather(
+        *(inspect_elements(container, selector, attributes) for _, container in containers),
+        return_exceptions=True,
+    )
+    return [(label, result) for (label, _), result in zip(containers, results)]
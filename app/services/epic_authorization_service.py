@@ -7,42 +7,63 @@
 """
 import asyncio
 import json
-import time
-from contextlib import suppress
+from typing import List
 
 from hcaptcha_challenger.agent import AgentV
 from loguru import logger
-from playwright.async_api import expect, Page, Response
+from playwright.async_api import Page, Response
 
-from settings import SCREENSHOTS_DIR, settings
+from services.diagnostics_store import diagnostics_store
+from services.response_bus import ResponseBus, Subscription
+from services.session_store import SessionStore
+from settings import EpicSettings, settings
 
 URL_CLAIM = "https://store.epicgames.com/en-US/free-games"
 
 
 class EpicAuthorization:
 
-    def __init__(self, page: Page):
+    def __init__(self, page: Page, config: EpicSettings | None = None):
         self.page = page
+        # 多帳號模式下傳入該帳號的設定，預設使用全域設定
+        self.config = config or settings
 
         self._is_login_success_signal = asyncio.Queue()
         self._is_refresh_csrf_signal = asyncio.Queue()
+        self._subscriptions: List[Subscription] = []
+        self.session = SessionStore.for_account(self.config.user_data_dir)
 
-    async def _on_response_anything(self, r: Response):
-        if r.request.method != "POST" or "talon" in r.url:
-            return
-
-        with suppress(Exception):
-            result = await r.json()
+    def _on_login_response(self, r: Response, result: dict):
+        if isinstance(result, dict) and result.get("errorCode"):
             result_json = json.dumps(result, indent=2, ensure_ascii=False)
+            logger.error(f"{r.request.method} {r.url} - {result_json}")
 
-            if "/id/api/login" in r.url and result.get("errorCode"):
-                logger.error(f"{r.request.method} {r.url} - {result_json}")
-            elif "/id/api/analytics" in r.url and result.get("accountId"):
-                self._is_login_success_signal.put_nowait(result)
-            elif "/account/v2/refresh-csrf" in r.url and result.get("success", False) is True:
-                self._is_refresh_csrf_signal.put_nowait(result)
-            # else:
-            #     logger.debug(f"{r.request.method} {r.url} - {result_json}")
+    def _on_login_success(self, r: Response, result: dict) -> bool:
+        if isinstance(result, dict) and result.get("accountId"):
+            self._is_login_success_signal.put_nowait(result)
+            return True
+        return False
+
+    def _on_refresh_csrf(self, r: Response, result: dict) -> bool:
+        if isinstance(result, dict) and result.get("success", False) is True:
+            self._is_refresh_csrf_signal.put_nowait(result)
+            return True
+        return False
+
+    def _subscribe_responses(self):
+        # 只讀取這三個端點的回應內容；登入成功與 CSRF 訊號到達後即取消訂閱
+        bus = ResponseBus.for_page(self.page)
+        self._subscriptions = [
+            bus.subscribe("/id/api/login", self._on_login_response, method="POST"),
+            bus.subscribe("/id/api/analytics", self._on_login_success, method="POST"),
+            bus.subscribe("/account/v2/refresh-csrf", self._on_refresh_csrf, method="POST"),
+        ]
+
+    def _unsubscribe_responses(self):
+        bus = ResponseBus.for_page(self.page)
+        for sub in self._subscriptions:
+            bus.unsubscribe(sub)
+        self._subscriptions = []
 
     async def _handle_right_account_validation(self):
         """
@@ -55,20 +76,44 @@ class EpicAuthorization:
         btn_ids = ["#link-success", "#login-reminder-prompt-setup-tfa-skip", "#yes"]
 
         # == 账号长期不登录需要做的额外验证 == #
+        # 所有提示同时监听，出现哪个点哪个；refresh-csrf 信号到达即结束
+        if not self._is_refresh_csrf_signal.empty():
+            return
+
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+
+        async def _watch_prompt(selector: str):
+            prompt_btn = self.page.locator(selector)
+            await prompt_btn.wait_for(state="visible", timeout=0)
+            await prompt_btn.click(timeout=5000)
+            logger.info(f"Account validation prompt handled: {selector} ({loop.time() - start:.1f}s)")
 
-        while self._is_refresh_csrf_signal.empty() and btn_ids:
-            await self.page.wait_for_timeout(500)
-            action_chains = btn_ids.copy()
-            for action in action_chains:
-                with suppress(Exception):
-                    reminder_btn = self.page.locator(action)
-                    await expect(reminder_btn).to_be_visible(timeout=1000)
-                    await reminder_btn.click(timeout=1000)
-                    btn_ids.remove(action)
+        async def _wait_csrf():
+            signal = await self._is_refresh_csrf_signal.get()
+            # 放回队列，保持信号对其它调用方可见
+            self._is_refresh_csrf_signal.put_nowait(signal)
+
+        csrf = asyncio.create_task(_wait_csrf())
+        watchers = [asyncio.create_task(_watch_prompt(selector)) for selector in btn_ids]
+        try:
+            pending = {csrf, *watchers}
+            while not csrf.done() and any(not w.done() for w in watchers):
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in (csrf, *watchers):
+                task.cancel()
+            await asyncio.gather(csrf, *watchers, return_exceptions=True)
+
+        handled = sum(1 for w in watchers if w.done() and not w.cancelled() and not w.exception())
+        logger.debug(
+            f"Account validation finished in {loop.time() - start:.1f}s "
+            f"(csrf={'yes' if csrf.done() and not csrf.cancelled() else 'no'}, prompts={handled})"
+        )
 
     async def _login(self) -> bool | None:
         # 尽可能早地初始化机器人
-        agent = AgentV(page=self.page, agent_config=settings)
+        agent = AgentV(page=self.page, agent_config=self.config)
 
         # {{< SIGN IN PAGE >}}
         logger.debug("Login with Email")
@@ -80,7 +125,7 @@ class EpicAuthorization:
             # 1. 使用电子邮件地址登录
             email_input = self.page.locator("#email")
             await email_input.clear()
-            await email_input.type(settings.EPIC_EMAIL)
+            await email_input.type(self.config.EPIC_EMAIL)
 
             # 2. 点击继续按钮
             await self.page.click("#continue")
@@ -88,7 +133,7 @@ class EpicAuthorization:
             # 3. 输入密码
             password_input = self.page.locator("#password")
             await password_input.clear()
-            await password_input.type(settings.EPIC_PASSWORD.get_secret_value())
+            await password_input.type(self.config.EPIC_PASSWORD.get_secret_value())
 
             # 4. 点击登录按钮，触发人机挑战值守监听器
             # Active hCaptcha checkbox
@@ -106,14 +151,32 @@ class EpicAuthorization:
             return True
         except Exception as err:
             logger.warning(f"{err}")
-            sr = SCREENSHOTS_DIR.joinpath("authorization")
-            sr.mkdir(parents=True, exist_ok=True)
-            await self.page.screenshot(path=sr.joinpath(f"login-{int(time.time())}.png"))
+            await diagnostics_store.capture(self.page, "login_failed")
             return None
 
-    async def invoke(self):
-        self.page.on("response", self._on_response_anything)
+    async def invoke(self) -> bool | None:
+        """
+        確保 context 處於登入狀態
+
+        Returns:
+            bool | None: True 表示已確認登入（可信任給後續頁面使用）
+        """
+        # 先以快照與一次 API 請求確認登入狀態，有效時不必載入商店頁
+        if await self.session.probe(self.page.context):
+            logger.success("Epic Games session is still valid")
+            return True
 
+        self._subscribe_responses()
+        try:
+            logged_in = await self._invoke()
+        finally:
+            self._unsubscribe_responses()
+
+        if logged_in:
+            await self.session.save(self.page.context)
+        return logged_in
+
+    async def _invoke(self):
         for _ in range(3):
             await self.page.goto(URL_CLAIM, wait_until="domcontentloaded")
 
@@ -122,4 +185,4 @@ class EpicAuthorization:
                 return True
 
             if await self._login():
-                return
+                return True
@@ -4,22 +4,53 @@
 # GitHub     : https://github.com/QIN2DIM
 # Description: 游戏商城控制句柄
 
+import asyncio
 import json
+import re
+import time
 from contextlib import suppress
 from enum import Enum
-from json import JSONDecodeError
 from typing import Any, List
+from urllib.parse import urlsplit
 
-import httpx
 from hcaptcha_challenger.agent import AgentV
 from loguru import logger
-from playwright.async_api import Page
+from playwright.async_api import Page, Response
 from playwright.async_api import expect, TimeoutError, FrameLocator
 from tenacity import retry, retry_if_exception_type, stop_after_attempt
 
-from models import OrderItem, Order
+from models import OrderItem
 from models import PromotionGame
-from settings import settings, RUNTIME_DIR
+from services.checkout_fingerprint import (
+    FLOW_CART,
+    FLOW_INSTANT,
+    PAGE_PATTERN,
+    VARIANT_CONFIRM,
+    checkout_fingerprints,
+    classify_checkout_variant,
+    find_container,
+    frame_pattern,
+)
+from services.diagnostics_store import diagnostics_store
+from services.dom_inspect import inspect_containers, inspect_elements
+from services.epic_order_history_service import (
+    URL_ORDER_HISTORY,
+    OrderHistoryClient,
+    parse_order_history,
+    purchased_items,
+)
+from services.epic_promotions_service import (
+    dump_promotions_debug,
+    parse_promotions,
+    promotions_client,
+)
+from services.idle_budget import idle_budget, start_idle_budget, wait_first
+from services.locator_race import candidate_containers, race_locators, text_selectors
+from services.owned_library_index import OwnedLibraryIndex
+from services.product_state_probe import ProductState, ProductStateProbe
+from services.product_url_index import product_url_index
+from services.run_recorder import recording_checkpoint
+from settings import EpicSettings, settings
 
 URL_CLAIM = "https://store.epicgames.com/en-US/free-games"
 URL_LOGIN = (
@@ -28,10 +59,62 @@ URL_LOGIN = (
 URL_CART = "https://store.epicgames.com/en-US/cart"
 URL_CART_SUCCESS = "https://store.epicgames.com/en-US/cart/success"
 
-
-URL_PROMOTIONS = "https://store-site-backend-static.ak.epicgames.com/freeGamesPromotions"
-URL_PRODUCT_PAGE = "https://store.epicgames.com/en-US/p/"
-URL_PRODUCT_BUNDLES = "https://store.epicgames.com/en-US/bundles/"
+# 結帳按鈕競速的總等待時間（毫秒）
+CHECKOUT_RACE_TIMEOUT = 15_000
+LEARNED_RACE_TIMEOUT = 5_000
+
+# 事件等待的上限：正常情況下事件會更早發生，逾時只會記入等待預算而不中斷流程
+# 商店頁很少真正網路閒置，上限不超過原本的 2 秒固定等待
+CLAIM_SETTLE_TIMEOUT = 2_000
+CHECKOUT_SURFACE_TIMEOUT = 10_000
+PAYMENT_SETTLE_TIMEOUT = 5_000
+PRODUCT_STATE_TIMEOUT = 3_000
+CART_RERENDER_TIMEOUT = 5_000
+
+CART_CARD_SELECTOR = "[data-testid='offer-card-layout-wrapper']"
+# 購物車更新的 GraphQL 操作名稱關鍵字，避免其它無關的 POST 提早結束等待
+CART_OPERATION_KEYWORDS = ("cart", "wishlist")
+# 依索引點擊卡片的 Move to wishlist 按鈕，回傳實際點擊數
+MOVE_TO_WISHLIST_SCRIPT = """
+(cards, indexes) => {
+  let clicked = 0;
+  for (const i of indexes) {
+    const label = [...(cards[i]?.querySelectorAll("button span") ?? [])]
+      .find((span) => span.textContent.trim() === "Move to wishlist");
+    if (label) {
+      label.closest("button").click();
+      clicked += 1;
+    }
+  }
+  return clicked;
+}
+"""
+
+URL_CORRECTION_PATTERN = re.compile(r"correction/eula|corrective=")
+PURCHASE_IFRAME_SELECTOR = "#webPurchaseContainer iframe, iframe[src*='/purchase']"
+HCAPTCHA_CHALLENGE_SELECTOR = "iframe[src*='hcaptcha'][src*='frame=challenge']"
+
+
+def _is_cart_update(response: Response) -> bool:
+    """移至願望清單後購物車的更新請求：購物車 API，或操作名稱與購物車/願望清單相關的 GraphQL"""
+    request = response.request
+    if request.method != "POST":
+        return False
+    path = urlsplit(response.url).path
+    if "/cart" in path:
+        return True
+    if not path.endswith("/graphql"):
+        return False
+    try:
+        payload = request.post_data_json
+    except Exception:
+        return False
+    operations = payload if isinstance(payload, list) else [payload]
+    for op in operations:
+        name = (op.get("operationName") or "").lower() if isinstance(op, dict) else ""
+        if any(keyword in name for keyword in CART_OPERATION_KEYWORDS):
+            return True
+    return False
 
 
 class GameCollectResult(Enum):
@@ -56,79 +139,33 @@ class GameCollectResult(Enum):
     UNKNOWN_ERROR = "unknown_error"
 
 
-def get_promotions() -> List[PromotionGame]:
+async def get_promotions(locale: str | None = None) -> List[PromotionGame]:
     """取得週免遊戲資料"""
-    def is_discount_game(prot: dict) -> bool | None:
-        with suppress(KeyError, IndexError, TypeError):
-            offers = prot["promotions"]["promotionalOffers"][0]["promotionalOffers"]
-            for i, offer in enumerate(offers):
-                if offer["discountSetting"]["discountPercentage"] == 0:
-                    return True
-
-    promotions: List[PromotionGame] = []
-
-    resp = httpx.get(URL_PROMOTIONS, params={"local": "zh-CN"})
-
-    try:
-        data = resp.json()
-    except JSONDecodeError as err:
-        logger.error(f"取得促銷資訊失敗: {err}")
+    data = await promotions_client.fetch(locale)
+    if not data:
         return []
 
-    with suppress(Exception):
-        cache_key = RUNTIME_DIR.joinpath("promotions.json")
-        cache_key.parent.mkdir(parents=True, exist_ok=True)
-        cache_key.write_text(json.dumps(data, indent=2, ensure_ascii=False))
-
-    # 取得商店促銷資料與 <本週免費> 遊戲
-    for e in data["data"]["Catalog"]["searchStore"]["elements"]:
-        if not is_discount_game(e):
-            continue
-
-        # -----------------------------------------------------------
-        # 🟢 智慧 URL 識別邏輯
-        # -----------------------------------------------------------
-        is_bundle = False
-        if e.get("offerType") == "BUNDLE":
-            is_bundle = True
-        
-        # 補充檢測：分類和標題
-        if not is_bundle:
-            for cat in e.get("categories", []):
-                if "bundle" in cat.get("path", "").lower():
-                    is_bundle = True
-                    break
-        if not is_bundle and "Collection" in e.get("title", ""):
-             is_bundle = True
-
-        base_url = URL_PRODUCT_BUNDLES if is_bundle else URL_PRODUCT_PAGE
-
-        try:
-            if e.get('offerMappings'):
-                slug = e['offerMappings'][0]['pageSlug']
-                e["url"] = f"{base_url.rstrip('/')}/{slug}"
-            elif e.get("productSlug"):
-                e["url"] = f"{base_url.rstrip('/')}/{e['productSlug']}"
-            else:
-                 e["url"] = f"{base_url.rstrip('/')}/{e.get('urlSlug', 'unknown')}"
-        except (KeyError, IndexError):
-            logger.debug(f"無法取得 URL: {e}")
-            continue
-
-        logger.debug(f"發現週免遊戲: {e['url']}")
-        promotions.append(PromotionGame(**e))
+    if settings.PROMOTIONS_DEBUG_DUMP:
+        dump_promotions_debug(data)
 
-    return promotions
+    return parse_promotions(data, url_index=product_url_index)
 
 
 class EpicAgent:
-    def __init__(self, page: Page):
+    def __init__(
+        self, page: Page, session_verified: bool = False, config: EpicSettings | None = None
+    ):
         self.page = page
-        self.epic_games = EpicGames(self.page)
+        # EpicAuthorization 已確認登入時為 True，可略過導覽列登入狀態的檢查
+        self._session_verified = session_verified
+        # 多帳號模式下傳入該帳號的設定，預設使用全域設定
+        self.config = config or settings
+        self.epic_games = EpicGames(self.page, self.config)
         self._promotions: List[PromotionGame] = []
         self._ctx_cookies_is_available: bool = False
         self._orders: List[OrderItem] = []
-        self._namespaces: List[str] = []
+        self._orders_synced: bool = False
+        self._owned = OwnedLibraryIndex.for_account(self.config.user_data_dir)
         self._cookies = None
 
     async def _handle_eula_correction(self) -> bool:
@@ -158,11 +195,8 @@ class EpicAgent:
         logger.warning("⚠️ 偵測到 EULA 修正頁面，嘗試自動接受協議...")
 
         try:
-            # SPA 頁面需要等待網路完全閒置
-            await self.page.wait_for_load_state("networkidle")
-
-            # 額外等待 React 渲染完成
-            await self.page.wait_for_timeout(2000)
+            # SPA 頁面需要等待網路完全閒置；React 渲染完成與否由下方的按鈕競速直接等待
+            await idle_budget().measure("eula_networkidle", self.page.wait_for_load_state("networkidle"))
 
             # ============================================================
             # EULA 接受按鈕選擇器（按優先順序排序）
@@ -184,29 +218,35 @@ class EpicAgent:
                 "//button[normalize-space(text())='Accepter']",
             ]
 
-            # 嘗試點擊接受按鈕
-            for selector in accept_selectors:
+            # 所有選擇器同時競速；點擊後仍停在 EULA 頁面時，排除該選擇器再賽一輪
+            remaining = accept_selectors.copy()
+            while remaining:
+                winner = await idle_budget().measure(
+                    "eula_accept_button",
+                    race_locators([("page", self.page)], remaining, timeout=5000),
+                )
+                if not winner:
+                    break
+                remaining.remove(winner.selector)
+
                 try:
-                    btn = self.page.locator(selector).first
-                    # 增加等待時間，因為 SPA 需要渲染
-                    if await btn.is_visible(timeout=5000):
-                        btn_text = await btn.text_content()
-                        logger.info(f"📋 點擊 EULA 接受按鈕: '{btn_text}' | 選擇器: {selector}")
-                        await btn.click()
-
-                        # 等待頁面跳轉
-                        await self.page.wait_for_load_state("networkidle", timeout=15000)
-
-                        # 驗證是否成功跳轉
-                        new_url = self.page.url
-                        if "correction/eula" not in new_url:
-                            logger.success("✅ EULA 協議已接受，頁面已跳轉")
-                            return True
-                        else:
-                            logger.warning("⚠️ 點擊後仍在 EULA 頁面，嘗試下一個選擇器")
+                    btn_text = await winner.locator.text_content()
+                    logger.info(f"📋 點擊 EULA 接受按鈕: '{btn_text}' | 選擇器: {winner.selector}")
+                    await winner.locator.click()
+
+                    # 等待頁面跳轉
+                    await idle_budget().measure(
+                        "eula_redirect",
+                        self.page.wait_for_load_state("networkidle", timeout=15000),
+                    )
+
+                    # 驗證是否成功跳轉
+                    if "correction/eula" not in self.page.url:
+                        logger.success("✅ EULA 協議已接受，頁面已跳轉")
+                        return True
+                    logger.warning("⚠️ 點擊後仍在 EULA 頁面，嘗試下一個選擇器")
                 except Exception as e:
-                    logger.debug(f"EULA 選擇器 '{selector}' 失敗: {e}")
-                    continue
+                    logger.debug(f"EULA 選擇器 '{winner.selector}' 失敗: {e}")
 
             logger.error("❌ 未能找到 EULA 接受按鈕")
             return False
@@ -215,30 +255,57 @@ class EpicAgent:
             logger.error(f"❌ 處理 EULA 頁面異常: {e}")
             return False
 
+    async def _wait_claim_page_settled(self):
+        """
+        等待免費遊戲頁面穩定
+
+        Epic Games 可能會透過 JS 非同步重新導向到 EULA 修正頁面，domcontentloaded 觸發時
+        重新導向可能還沒完成。以「URL 變成修正頁面」與「網路閒置（登入狀態檢查已完成）」
+        兩者先到者為準，取代固定等待。
+        """
+        await idle_budget().wait(
+            "claim_page_settled",
+            wait_first(
+                self.page.wait_for_url(URL_CORRECTION_PATTERN, timeout=CLAIM_SETTLE_TIMEOUT),
+                self.page.wait_for_load_state("networkidle", timeout=CLAIM_SETTLE_TIMEOUT),
+                timeout=CLAIM_SETTLE_TIMEOUT,
+            ),
+        )
+
     async def _sync_order_history(self):
-        if self._orders:
+        if self._orders_synced:
+            return
+
+        # 優先以 HTTP 增量讀取比索引更新的訂單，失敗時才退回瀏覽器導航
+        try:
+            client = await OrderHistoryClient.from_page(self.page)
+            self._orders = await client.fetch_purchased_items(self._owned.newest_order_id)
+            self._owned.update((item.namespace for item in self._orders), client.newest_order_id)
+            self._orders_synced = True
+            logger.debug(f"訂單紀錄同步完成（HTTP）: 新增 {len(self._orders)} 個項目")
             return
+        except Exception as err:
+            logger.warning(f"HTTP 同步訂單紀錄失敗，改用瀏覽器: {err!r}")
+
         completed_orders: List[OrderItem] = []
         try:
-            await self.page.goto("https://www.epicgames.com/account/v2/payment/ajaxGetOrderHistory")
+            await self.page.goto(URL_ORDER_HISTORY)
             text_content = await self.page.text_content("//pre")
-            data = json.loads(text_content)
-            for _order in data["orders"]:
-                order = Order(**_order)
-                if order.orderType != "PURCHASE":
-                    continue
-                for item in order.items:
-                    if not item.namespace or len(item.namespace) != 32:
-                        continue
-                    completed_orders.append(item)
+            data = parse_order_history(text_content)
+            completed_orders = purchased_items(data["orders"])
+            # 瀏覽器只讀得到第一頁，不推進最新 orderId，以免下次增量同步漏掉較舊的訂單
+            newest_order_id = self._owned.newest_order_id if self._owned.is_synced else None
+            self._owned.update(
+                (item.namespace for item in completed_orders), newest_order_id, complete=False
+            )
+            self._orders_synced = True
         except Exception as err:
             logger.warning(err)
         self._orders = completed_orders
 
     async def _check_orders(self):
         await self._sync_order_history()
-        self._namespaces = self._namespaces or [order.namespace for order in self._orders]
-        self._promotions = [p for p in get_promotions() if p.namespace not in self._namespaces]
+        self._promotions = [p for p in await get_promotions() if p.namespace not in self._owned]
 
     async def _should_ignore_task(self) -> tuple[bool, GameCollectResult]:
         """
@@ -257,10 +324,8 @@ class EpicAgent:
 
         # ============================================================
         # 🔥 關鍵修復：等待頁面穩定，防止 JS 重新導向導致偵測遺漏
-        # Epic Games 可能會透過 JS 非同步重新導向到 EULA 頁面
-        # domcontentloaded 觸發時重新導向可能還沒完成
         # ============================================================
-        await self.page.wait_for_timeout(2000)  # 等待 JS 執行完成
+        await self._wait_claim_page_settled()
 
         # ============================================================
         # 🔥 EULA 修正頁面檢測與處理
@@ -275,24 +340,26 @@ class EpicAgent:
                 if await self._handle_eula_correction():
                     # EULA 處理成功後，重新導航到目標頁面
                     await self.page.goto(URL_CLAIM, wait_until="domcontentloaded")
-                    await self.page.wait_for_timeout(2000)  # 再次等待穩定
+                    await self._wait_claim_page_settled()  # 再次等待穩定
                 else:
                     logger.error("❌ EULA 處理失敗，跳過此帳號")
                     return False, GameCollectResult.EULA_FAILED
             else:
                 break
 
-        # 嘗試取得登入狀態，增加逾時處理
-        try:
-            status = await self.page.locator("//egs-navigation").get_attribute("isloggedin", timeout=10000)
-        except Exception as e:
-            # 如果逾時，可能還在修正頁面或有其他問題
-            current_url = self.page.url
-            if "correction" in current_url or "eula" in current_url:
-                logger.error("❌ 仍在修正頁面，無法繼續")
-                return False, GameCollectResult.EULA_FAILED
-            logger.error(f"❌ 獲取登入狀態逾時: {e}")
-            return False, GameCollectResult.UNKNOWN_ERROR
+        # 嘗試取得登入狀態，增加逾時處理；登入狀態已驗證時不必等待導覽列渲染
+        status = "true" if self._session_verified else None
+        if status is None:
+            try:
+                status = await self.page.locator("//egs-navigation").get_attribute("isloggedin", timeout=10000)
+            except Exception as e:
+                # 如果逾時，可能還在修正頁面或有其他問題
+                current_url = self.page.url
+                if "correction" in current_url or "eula" in current_url:
+                    logger.error("❌ 仍在修正頁面，無法繼續")
+                    return False, GameCollectResult.EULA_FAILED
+                logger.error(f"❌ 獲取登入狀態逾時: {e}")
+                return False, GameCollectResult.UNKNOWN_ERROR
 
         if status == "false":
             logger.error("❌ Cookie 無效，帳號未登入")
@@ -310,6 +377,13 @@ class EpicAgent:
         Returns:
             GameCollectResult: 執行結果
         """
+        budget = start_idle_budget()
+        try:
+            return await self._collect_epic_games()
+        finally:
+            budget.report()
+
+    async def _collect_epic_games(self) -> GameCollectResult:
         should_ignore, result = await self._should_ignore_task()
 
         # 所有遊戲已在庫中
@@ -350,9 +424,11 @@ class EpicAgent:
 
 
 class EpicGames:
-    def __init__(self, page: Page):
+    def __init__(self, page: Page, config: EpicSettings | None = None):
         self.page = page
+        self.config = config or settings
         self._promotions: List[PromotionGame] = []
+        self._captcha_lock = asyncio.Lock()
 
     @staticmethod
     async def _agree_license(page: Page):
@@ -364,13 +440,31 @@ class EpicGames:
                 await accept.click()
 
     @staticmethod
-    async def _active_purchase_container(page: Page):
+    async def _wait_checkout_surface(page: Page):
+        """等待結帳 iframe 掛載並載入，或主頁面彈層出現"""
+        purchase_iframe = page.locator(PURCHASE_IFRAME_SELECTOR).first
+        surface = await wait_first(
+            purchase_iframe.wait_for(state="attached", timeout=CHECKOUT_SURFACE_TIMEOUT),
+            page.locator("[role='dialog']").first.wait_for(
+                state="visible", timeout=CHECKOUT_SURFACE_TIMEOUT
+            ),
+            timeout=CHECKOUT_SURFACE_TIMEOUT,
+        )
+        if surface == 0:
+            handle = await purchase_iframe.element_handle(timeout=CHECKOUT_SURFACE_TIMEOUT)
+            if frame := await handle.content_frame():
+                await frame.wait_for_load_state(
+                    "domcontentloaded", timeout=CHECKOUT_SURFACE_TIMEOUT
+                )
+
+    @staticmethod
+    async def _active_purchase_container(page: Page, flow: str = FLOW_INSTANT):
         logger.debug("正在掃描購買容器...")
 
         # Epic 的新結帳頁不穩定：確認按鈕可能在 webPurchase iframe、
         # 其它 purchase iframe、甚至主頁面彈層裡。這裡不再只選第一個 iframe，
         # 而是掃描主頁面和所有 frame，避免命中無關 iframe 後誤報。
-        await page.wait_for_timeout(3000)
+        await idle_budget().wait("checkout_surface", EpicGames._wait_checkout_surface(page))
 
         button_texts = [
             "PLACE ORDER",
@@ -401,74 +495,58 @@ class EpicGames:
             "button[type='submit']",
         ]
 
-        containers: list[tuple[str, Any]] = [("page", page)]
-        for idx, frame in enumerate(page.frames):
-            if frame == page.main_frame:
-                continue
-            containers.append((f"frame[{idx}] {frame.url[:180]}", frame))
-        
-        logger.info(f"🔎 掃描結帳容器: {len(containers)} 個候選")
-
-        async def _button_is_usable(btn) -> bool:
-            try:
-                await btn.wait_for(state="visible", timeout=2500)
-                if await btn.is_disabled(timeout=1000):
-                    return False
-                return True
-            except Exception:
-                return False
-
-        async def _describe_buttons(label: str, container: Any):
-            try:
-                buttons = await container.locator("button").all()
-                logger.warning(f"🔍 {label} 按鈕數量: {len(buttons)}")
-                for i, btn in enumerate(buttons[:12]):
-                    try:
-                        text = (await btn.text_content(timeout=1000) or "").strip()
-                        aria = await btn.get_attribute("aria-label", timeout=1000)
-                        testid = await btn.get_attribute("data-testid", timeout=1000)
-                        disabled = await btn.is_disabled(timeout=1000)
-                        logger.warning(
-                            f"🔍 {label} button[{i}]: text={text!r}, aria={aria!r}, "
-                            f"testid={testid!r}, disabled={disabled}"
-                        )
-                    except Exception as e:
-                        logger.warning(f"🔍 {label} button[{i}] 檢查失敗: {e}")
-            except Exception as e:
-                logger.warning(f"🔍 {label} 列出按鈕失敗: {e}")
-
-        for label, container in containers:
-            logger.info(f"🔎 檢查結帳容器: {label}")
+        # 先走上次成功的路徑：同一種結帳形態下直接探測學習到的容器與選擇器
+        variant = classify_checkout_variant(page)
+        if learned := checkout_fingerprints.lookup(flow, variant):
+            if found := find_container(page, learned.get("frame_pattern", "")):
+                winner = await race_locators(
+                    [found], [learned["selector"]], timeout=LEARNED_RACE_TIMEOUT
+                )
+                if winner:
+                    checkout_fingerprints.record_hit(flow, variant)
+                    logger.info(
+                        f"✅ 找到結帳按鈕（學習路徑）: {winner.selector} | 容器: {winner.container_label}"
+                    )
+                    return winner.container, winner.locator
+            checkout_fingerprints.record_miss(flow, variant)
+            logger.debug(f"學習路徑未命中 ({flow}:{variant})，退回完整掃描")
 
-            for text_value in button_texts:
-                try:
-                    btn = container.locator("button", has_text=text_value).first
-                    if await _button_is_usable(btn):
-                        btn_text = (await btn.text_content(timeout=1000) or "").strip()
-                        logger.info(f"✅ 找到結帳按鈕: {btn_text!r} | 容器: {label} | 文字: {text_value}")
-                        return container, btn
-                except Exception as e:
-                    logger.debug(f"按鈕文字 {text_value!r} 在 {label} 中失敗: {e}")
+        containers = candidate_containers(page)
+        logger.info(f"🔎 掃描結帳容器: {len(containers)} 個候選")
 
-            for selector in css_selectors:
-                try:
-                    btn = container.locator(selector).first
-                    if await _button_is_usable(btn):
-                        btn_text = (await btn.text_content(timeout=1000) or "").strip()
-                        logger.info(f"✅ 找到結帳按鈕: {btn_text!r} | 容器: {label} | 選擇器: {selector}")
-                        return container, btn
-                except Exception as e:
-                    logger.debug(f"按鈕選擇器 {selector!r} 在 {label} 中失敗: {e}")
+        # 所有容器 × 所有候選同時競速，總等待時間只受一個 timeout 限制
+        selectors = text_selectors(button_texts) + css_selectors
+        if winner := await race_locators(containers, selectors, timeout=CHECKOUT_RACE_TIMEOUT):
+            btn_text = ""
+            with suppress(Exception):
+                btn_text = (await winner.locator.text_content(timeout=1000) or "").strip()
+            logger.info(
+                f"✅ 找到結帳按鈕: {btn_text!r} | 容器: {winner.container_label} | 選擇器: {winner.selector}"
+            )
+            checkout_fingerprints.learn(
+                flow,
+                variant,
+                frame_pattern=(
+                    PAGE_PATTERN if winner.container is page else frame_pattern(winner.container.url)
+                ),
+                selector=winner.selector,
+            )
+            return winner.container, winner.locator
 
         logger.warning("找不到主要按鈕。正在偵錯結帳容器...")
-        for label, container in containers:
-            await _describe_buttons(label, container)
+        for label, buttons in await inspect_containers(containers, "button"):
+            if isinstance(buttons, BaseException):
+                logger.warning(f"🔍 {label} 列出按鈕失敗: {buttons}")
+                continue
+            logger.warning(f"🔍 {label} 按鈕數量: {len(buttons)}")
+            for i, btn in enumerate(buttons[:12]):
+                logger.warning(
+                    f"🔍 {label} button[{i}]: text={btn['text']!r}, "
+                    f"aria={btn['attrs']['aria-label']!r}, testid={btn['attrs']['data-testid']!r}, "
+                    f"disabled={btn['disabled']}"
+                )
 
-        with suppress(Exception):
-            debug_path = RUNTIME_DIR.joinpath("checkout_debug_last.html")
-            debug_path.parent.mkdir(parents=True, exist_ok=True)
-            debug_path.write_text(await page.content(), encoding="utf-8")
-            logger.warning(f"🧾 已儲存結帳頁偵錯 HTML: {debug_path}")
+        await diagnostics_store.capture(page, "checkout_no_button")
 
         raise AssertionError("無法在結帳容器中找到下單按鈕")
             
@@ -498,7 +576,9 @@ class EpicGames:
 
             logger.info("ℹ️ Epic 顯示裝置不支援提示，點擊 Continue 繼續領取流程")
             await continue_btn.click(force=True)
-            await page.wait_for_timeout(3000)
+            await idle_budget().wait(
+                "device_modal_hidden", dialog.wait_for(state="hidden", timeout=5000)
+            )
             return True
         except Exception as err:
             logger.warning(f"⚠️ 處理 Epic 裝置不支援彈窗失敗: {err}")
@@ -513,9 +593,39 @@ class EpicGames:
                 await accept.click()
                 return True
 
+    async def _confirm_order(self, wpc: Any, payment_btn: Any) -> bool:
+        """
+        購物車結帳的下單確認
+
+        不同地區的結帳頁分別使用 payment-confirm__btn 或掃描到的 PLACE ORDER 按鈕，
+        上次成功的方式優先嘗試。
+        """
+
+        async def _click_payment_btn():
+            await payment_btn.click()
+            return True
+
+        handlers = {
+            "payment_confirm": lambda: self._uk_confirm_order(wpc),
+            "payment_button": _click_payment_btn,
+        }
+        preferred = (checkout_fingerprints.lookup(FLOW_CART, VARIANT_CONFIRM) or {}).get("handler")
+
+        for name in sorted(handlers, key=lambda n: n != preferred):
+            with suppress(Exception):
+                if await handlers[name]():
+                    if name == preferred:
+                        checkout_fingerprints.record_hit(FLOW_CART, VARIANT_CONFIRM)
+                    else:
+                        checkout_fingerprints.learn(FLOW_CART, VARIANT_CONFIRM, handler=name)
+                    return True
+            if name == preferred:
+                checkout_fingerprints.record_miss(FLOW_CART, VARIANT_CONFIRM)
+        return False
+
     async def _handle_instant_checkout(self, page: Page):
         logger.info("🚀 開始即時結帳流程...")
-        agent = AgentV(page=page, agent_config=settings)
+        agent = AgentV(page=page, agent_config=self.config)
 
         try:
             await self._handle_device_not_supported_modal(page)
@@ -523,126 +633,258 @@ class EpicGames:
             if await self._handle_device_not_supported_modal(page):
                 wpc, payment_btn = await self._active_purchase_container(page)
 
-            logger.debug(f"點擊支付按鈕: {await payment_btn.text_content()}")
-            await payment_btn.click(force=True)
-            await page.wait_for_timeout(3000)
-            
-            try:
-                logger.debug("檢查驗證碼...")
-                await agent.wait_for_challenge()
-            except Exception as e:
-                logger.debug(f"驗證碼檢測跳過: {e}")
-
-            try:
-                if not await payment_btn.is_visible():
-                     logger.success("🎉 領取成功：支付按鈕已消失")
-                     return
-            except Exception:
-                logger.success("🎉 領取成功：iframe 已關閉")
-                return
+            # 多分頁並行時，下單與驗證碼依序處理，避免分頁互相搶用求解器與游標
+            async with self._captcha_lock:
+                if self.config.CLAIM_TAB_CONCURRENCY > 1:
+                    await page.bring_to_front()
 
-            with suppress(Exception):
+                logger.debug(f"點擊支付按鈕: {await payment_btn.text_content()}")
                 await payment_btn.click(force=True)
-                await page.wait_for_timeout(2000)
-            
-            logger.success("🎉 遊戲領取成功！")
+                # 下單送出後，支付按鈕消失（成功）或 hCaptcha 挑戰框出現，兩者先到者為準
+                await idle_budget().wait(
+                    "payment_submitted",
+                    wait_first(
+                        payment_btn.wait_for(state="hidden", timeout=PAYMENT_SETTLE_TIMEOUT),
+                        page.locator(HCAPTCHA_CHALLENGE_SELECTOR).first.wait_for(
+                            state="visible", timeout=PAYMENT_SETTLE_TIMEOUT
+                        ),
+                        page.frame_locator(PURCHASE_IFRAME_SELECTOR)
+                        .first.locator(HCAPTCHA_CHALLENGE_SELECTOR)
+                        .first.wait_for(state="visible", timeout=PAYMENT_SETTLE_TIMEOUT),
+                        timeout=PAYMENT_SETTLE_TIMEOUT,
+                    ),
+                )
+
+                try:
+                    logger.debug("檢查驗證碼...")
+                    await agent.wait_for_challenge()
+                except Exception as e:
+                    logger.debug(f"驗證碼檢測跳過: {e}")
+
+                try:
+                    if not await payment_btn.is_visible():
+                         logger.success("🎉 領取成功：支付按鈕已消失")
+                         return
+                except Exception:
+                    logger.success("🎉 領取成功：iframe 已關閉")
+                    return
+
+                with suppress(Exception):
+                    await payment_btn.click(force=True)
+                    await idle_budget().wait(
+                        "payment_retry", payment_btn.wait_for(state="hidden", timeout=3000)
+                    )
+
+                logger.success("🎉 遊戲領取成功！")
 
         except Exception as err:
             logger.warning(f"⚠️ 即時結帳警告（遊戲可能已領取）: {err}")
             await page.reload()
 
     async def add_promotion_to_cart(self, page: Page, urls: List[str]) -> bool:
-        has_pending_cart_items = False
-
-        for url in urls:
-            await page.goto(url, wait_until="load")
+        """
+        逐一開啟商品頁領取或加入購物車
 
-            # 404 檢測
-            title = await page.title()
-            if "404" in title or "Page Not Found" in title:
-                logger.error(f"❌ 無效的 URL (404 頁面): {url}")
-                continue
+        CLAIM_TAB_CONCURRENCY > 1 時，在同一個瀏覽器 context 內以多個分頁並行處理，
+        驗證碼仍依序解決；任一分頁加入了購物車即回傳 True。
+        """
+        concurrency = max(1, self.config.CLAIM_TAB_CONCURRENCY)
+        if concurrency == 1 or len(urls) < 2:
+            results = []
+            for url in urls:
+                results.append(await self._claim_product(page, url))
+                # 每個商品頁一段 trace，失敗時只保留最近幾個商品頁
+                await recording_checkpoint("product")
+            return any(results)
+
+        semaphore = asyncio.Semaphore(concurrency)
+        start = time.perf_counter()
+
+        async def _claim_in_tab(url: str) -> bool:
+            async with semaphore:
+                tab = await page.context.new_page()
+                try:
+                    return await self._claim_product(tab, url)
+                finally:
+                    with suppress(Exception):
+                        await tab.close()
+                    await recording_checkpoint("product")
+
+        results = await asyncio.gather(*(_claim_in_tab(url) for url in urls), return_exceptions=True)
+        logger.info(
+            f"🗂️ 分頁並行領取: {len(urls)} 個商品頁，並行上限 {concurrency}，"
+            f"耗時 {time.perf_counter() - start:.1f}s"
+        )
+
+        errors = [r for r in results if isinstance(r, BaseException)]
+        for url, result in zip(urls, results):
+            if isinstance(result, BaseException):
+                logger.warning(f"⚠️ 分頁領取失敗: {url} | {result!r}")
+        # 其餘分頁都處理完後，才把第一個錯誤交給上層（例如 TimeoutError 觸發重試）
+        if errors:
+            raise errors[0]
+        return any(results)
+
+    def _offer_key(self, url: str) -> tuple[str | None, str | None]:
+        for p in self._promotions:
+            if p.url == url:
+                return p.namespace, p.id
+        return None, None
 
-            # 處理年齡限制彈窗
-            try:
-                continue_btn = page.locator("//button//span[text()='Continue']")
-                if await continue_btn.is_visible(timeout=5000):
-                    await continue_btn.click()
-            except Exception:
-                pass 
-
-            # ------------------------------------------------------------
-            # 🔥 按鈕識別與狀態判斷
-            # ------------------------------------------------------------
-            
-            # 1. 嘗試找到主按鈕
-            purchase_btn = page.locator("//button[@data-testid='purchase-cta-button']").first
+    async def _claim_product(self, page: Page, url: str) -> bool:
+        """
+        處理單一商品頁
 
-            # 2. 檢查按鈕可見性
-            try:
-                if not await purchase_btn.is_visible(timeout=5000):
-                    all_text = await page.locator("body").text_content()
-                    if "In Library" in all_text or "Owned" in all_text:
-                         logger.success(f"✅ 遊戲已在庫中")
-                         continue
-                    logger.warning(f"⚠️ 找不到購買按鈕")
+        Returns:
+            bool: 是否將商品加入了購物車（需要稍後走購物車結帳）
+        """
+        # 在導航前掛上網路探測，商品頁載入期間的 GraphQL 回應就能判斷擁有狀態
+        probe = ProductStateProbe(*self._offer_key(url))
+        probe.attach(page)
+        try:
+            while url:
+                await page.goto(url, wait_until="load")
+
+                # 404 檢測：記入負向快取並改用同一促銷的下一個候選 URL
+                title = await page.title()
+                if "404" in title or "Page Not Found" in title:
+                    logger.error(f"❌ 無效的 URL (404 頁面): {url}")
+                    url = product_url_index.mark_not_found(url)
+                    if url:
+                        logger.info(f"🔁 改用候選商品頁: {url}")
                     continue
-            except Exception:
-                pass
-
-            # 3. 獲取按鈕資訊
-            btn_text = await purchase_btn.text_content()
-            if not btn_text: btn_text = ""
-            btn_text = btn_text.strip()
-            btn_text_upper = btn_text.upper()
-            is_disabled = await purchase_btn.is_disabled()
-            
-            # 4. 列印按鈕狀態（關鍵資訊）
-            logger.info(f"📋 按鈕狀態: '{btn_text}' | 禁用: {is_disabled}")
 
-            # 5. 根據狀態判斷
-            if is_disabled:
-                logger.success(f"✅ 遊戲已在庫中")
-                continue
+                product_url_index.mark_verified(url)
+                break
 
-            if any(s in btn_text_upper for s in ["IN LIBRARY", "OWNED", "UNAVAILABLE", "COMING SOON"]):
-                logger.success(f"✅ 遊戲已在庫中")
-                continue
+            if not url:
+                return False
 
-            if "CART" in btn_text_upper:
-                logger.info(f"🛒 加入購物車")
-                await purchase_btn.click()
-                has_pending_cart_items = True
-                continue
-            
-            # 6. 嘗試領取
-            # 只要不是黑名單，也不是購物車，統統當做 "Get/Purchase" 直接點擊！
-            logger.debug(f"⚡️ 嘗試點擊按鈕: {btn_text}")
+            state = None
+            # 不在促銷清單中的商品頁（例如手動指定的 URL）沒有目標 offer，直接走 DOM 流程
+            if probe.targeted:
+                state = await idle_budget().measure(
+                    "product_state", probe.wait(PRODUCT_STATE_TIMEOUT)
+                )
+        finally:
+            probe.detach()
+
+        if state == ProductState.OWNED:
+            logger.success("✅ 遊戲已在庫中（網路回應）")
+            return False
+        if state == ProductState.UNAVAILABLE:
+            logger.warning(f"⚠️ 商品目前不是免費（網路回應），略過: {url}")
+            return False
+
+        # 處理年齡限制彈窗
+        try:
+            continue_btn = page.locator("//button//span[text()='Continue']")
+            if await continue_btn.is_visible(timeout=5000):
+                await continue_btn.click()
+        except Exception:
+            pass 
+
+        # ------------------------------------------------------------
+        # 🔥 按鈕識別與狀態判斷
+        # ------------------------------------------------------------
+        
+        # 1. 嘗試找到主按鈕
+        purchase_btn = page.locator("//button[@data-testid='purchase-cta-button']").first
+
+        # 2. 檢查按鈕可見性
+        try:
+            if not await purchase_btn.is_visible(timeout=5000):
+                # 網路回應已確認未擁有時，不必再讀取整頁文字
+                all_text = "" if state else await page.locator("body").text_content()
+                if "In Library" in all_text or "Owned" in all_text:
+                     logger.success(f"✅ 遊戲已在庫中")
+                     return False
+                logger.warning(f"⚠️ 找不到購買按鈕")
+                return False
+        except Exception:
+            pass
+
+        # 3. 獲取按鈕資訊
+        btn_text = await purchase_btn.text_content()
+        if not btn_text: btn_text = ""
+        btn_text = btn_text.strip()
+        btn_text_upper = btn_text.upper()
+        is_disabled = await purchase_btn.is_disabled()
+        
+        # 4. 列印按鈕狀態（關鍵資訊）
+        logger.info(f"📋 按鈕狀態: '{btn_text}' | 禁用: {is_disabled}")
+
+        # 5. 根據狀態判斷
+        if is_disabled:
+            logger.success(f"✅ 遊戲已在庫中")
+            return False
+
+        if any(s in btn_text_upper for s in ["IN LIBRARY", "OWNED", "UNAVAILABLE", "COMING SOON"]):
+            logger.success(f"✅ 遊戲已在庫中")
+            return False
+
+        if "CART" in btn_text_upper:
+            logger.info(f"🛒 加入購物車")
             await purchase_btn.click()
-            
-            # 點擊後，轉入即時結帳流程
-            await self._handle_instant_checkout(page)
-            # ------------------------------------------------------------
+            return True
+        
+        # 6. 嘗試領取
+        # 只要不是黑名單，也不是購物車，統統當做 "Get/Purchase" 直接點擊！
+        logger.debug(f"⚡️ 嘗試點擊按鈕: {btn_text}")
+        await purchase_btn.click()
+        
+        # 點擊後，轉入即時結帳流程
+        await self._handle_instant_checkout(page)
+        # ------------------------------------------------------------
+        return False
 
-        return has_pending_cart_items
+    async def _empty_cart(self, page: Page, max_passes: int = 3) -> bool | None:
+        """
+        將購物車中的付費商品移至願望清單
 
-    async def _empty_cart(self, page: Page, wait_rerender: int = 30) -> bool | None:
-        has_paid_free = False
+        每一輪以一次 evaluate 分類所有卡片、一次送出全部移動，再等待購物車更新的回應；
+        重新渲染期間遺漏的卡片留給下一輪。
+        """
+        start = time.perf_counter()
+        moved = 0
         try:
-            cards = await page.query_selector_all("//div[@data-testid='offer-card-layout-wrapper']")
-            for card in cards:
-                is_free = await card.query_selector("//span[text()='Free']")
-                if not is_free:
-                    has_paid_free = True
-                    wishlist_btn = await card.query_selector(
-                        "//button//span[text()='Move to wishlist']"
-                    )
-                    await wishlist_btn.click()
+            for _ in range(max_passes):
+                cards = await inspect_elements(
+                    page, CART_CARD_SELECTOR, attributes=(), probes={"free": ".//span[text()='Free']"}
+                )
+                paid = [i for i, card in enumerate(cards) if not card["probes"]["free"]]
+                if not paid:
+                    break
 
-            if has_paid_free and wait_rerender:
-                wait_rerender -= 1
-                await page.wait_for_timeout(2000)
-                return await self._empty_cart(page, wait_rerender)
+                # 先註冊回應等待再點擊，避免錯過快速回來的更新
+                cart_updated = asyncio.ensure_future(
+                    page.wait_for_response(_is_cart_update, timeout=CART_RERENDER_TIMEOUT)
+                )
+                try:
+                    clicked = await page.locator(CART_CARD_SELECTOR).evaluate_all(
+                        MOVE_TO_WISHLIST_SCRIPT, paid
+                    )
+                    if not clicked:
+                        logger.warning(f"⚠️ {len(paid)} 個付費商品找不到 Move to wishlist 按鈕")
+                        break
+                    moved += clicked
+                    await idle_budget().wait("cart_update", cart_updated)
+                finally:
+                    # 點擊失敗或提前離開時不留下懸置的等待
+                    cart_updated.cancel()
+                    await asyncio.gather(cart_updated, return_exceptions=True)
+                await idle_budget().wait(
+                    "cart_rerender",
+                    page.wait_for_function(
+                        "([sel, n]) => document.querySelectorAll(sel).length <= n",
+                        arg=[CART_CARD_SELECTOR, len(cards) - clicked],
+                        timeout=CART_RERENDER_TIMEOUT,
+                    ),
+                )
+
+            logger.info(
+                f"🛒 已將 {moved} 個付費商品移至願望清單，耗時 {time.perf_counter() - start:.1f}s"
+            )
             return True
         except TimeoutError as err:
             logger.warning(f"清空購物車失敗: {err}")
@@ -653,15 +895,15 @@ class EpicGames:
         logger.debug("將購物車中所有付費遊戲移出")
         await self._empty_cart(self.page)
 
-        agent = AgentV(page=self.page, agent_config=settings)
+        agent = AgentV(page=self.page, agent_config=self.config)
         await self.page.click("//button//span[text()='Check Out']")
         await self._agree_license(self.page)
 
         try:
             logger.debug("移動至 webPurchaseContainer iframe")
-            wpc, payment_btn = await self._active_purchase_container(self.page)
+            wpc, payment_btn = await self._active_purchase_container(self.page, flow=FLOW_CART)
             logger.debug("點擊付款按鈕")
-            await self._uk_confirm_order(wpc)
+            await self._confirm_order(wpc, payment_btn)
             await agent.wait_for_challenge()
         except Exception as err:
             logger.warning(f"驗證碼解決失敗: {err}")
@@ -670,15 +912,21 @@ class EpicGames:
 
     @retry(retry=retry_if_exception_type(TimeoutError), stop=stop_after_attempt(2), reraise=True)
     async def collect_weekly_games(self, promotions: List[PromotionGame]):
-        urls = [p.url for p in promotions]
-        has_cart_items = await self.add_promotion_to_cart(self.page, urls)
+        checkout_fingerprints.begin_run()
+        self._promotions = promotions
+        try:
+            urls = [p.url for p in promotions]
+            has_cart_items = await self.add_promotion_to_cart(self.page, urls)
 
-        if has_cart_items:
-            await self._purchase_free_game()
-            try:
-                await self.page.wait_for_url(URL_CART_SUCCESS)
-                logger.success("🎉 購物車遊戲領取成功")
-            except TimeoutError:
-                logger.warning("購物車遊戲領取失敗")
-        else:
-            logger.success("🎉 任務完成（已領取或已在庫中）")
+            if has_cart_items:
+                await recording_checkpoint("cart")
+                await self._purchase_free_game()
+                try:
+                    await self.page.wait_for_url(URL_CART_SUCCESS)
+                    logger.success("🎉 購物車遊戲領取成功")
+                except TimeoutError:
+                    logger.warning("購物車遊戲領取失敗")
+            else:
+                logger.success("🎉 任務完成（已領取或已在庫中）")
+        finally:
+            checkout_fingerprints.report()
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 15:20
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 訂單紀錄同步客戶端
+
+直接以 HTTP 呼叫 ajaxGetOrderHistory，取代以瀏覽器導航讀取 <pre> 文字：
+- 沿用瀏覽器 context 的 Cookie 與 User-Agent，在同一個連線池中依 nextPageToken 翻頁
+- 解析時只保留 orderType / orderId / items[].namespace 等欄位，其餘物件在解析過程中即丟棄
+"""
+import json
+from typing import Any, AsyncIterator, Dict, List
+
+import httpx
+from loguru import logger
+from playwright.async_api import Page
+
+from models import OrderItem
+
+URL_ORDER_HISTORY = "https://www.epicgames.com/account/v2/payment/ajaxGetOrderHistory"
+
+# 解析時保留的欄位，涵蓋回應、訂單、訂單項目三層
+_KEEP_FIELDS = frozenset(
+    {
+        "orders",
+        "nextPageToken",
+        "orderType",
+        "orderId",
+        "createdAtMillis",
+        "items",
+        "namespace",
+        "offerId",
+        "description",
+    }
+)
+
+
+def _prune_pairs(pairs: List[tuple]) -> Dict[str, Any]:
+    return {k: v for k, v in pairs if k in _KEEP_FIELDS}
+
+
+def parse_order_history(body: bytes | str) -> Dict[str, Any]:
+    """解析單頁訂單紀錄，只保留用得到的欄位"""
+    return json.loads(body, object_pairs_hook=_prune_pairs)
+
+
+def purchased_items(orders: List[Dict[str, Any]]) -> List[OrderItem]:
+    """從訂單中取出有效的購買項目（PURCHASE 且 namespace 為 32 位）"""
+    items: List[OrderItem] = []
+    for order in orders:
+        if order.get("orderType") != "PURCHASE":
+            continue
+        for item in order.get("items") or []:
+            namespace = item.get("namespace")
+            if not namespace or len(namespace) != 32:
+                continue
+            items.append(
+                OrderItem.model_construct(
+                    description=item.get("description", ""),
+                    offerId=item.get("offerId", ""),
+                    namespace=namespace,
+                )
+            )
+    return items
+
+
+class OrderHistoryClient:
+
+    def __init__(
+        self,
+        cookies: List[Dict[str, Any]],
+        user_agent: str | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+        max_pages: int = 100,
+    ):
+        self.max_pages = max_pages
+        self.newest_order_id: str | None = None
+
+        self._cookies = httpx.Cookies()
+        for c in cookies:
+            self._cookies.set(
+                c["name"], c["value"], domain=c.get("domain", ""), path=c.get("path", "/")
+            )
+
+        self._headers = {"accept": "application/json", "x-requested-with": "XMLHttpRequest"}
+        if user_agent:
+            self._headers["user-agent"] = user_agent
+
+        self._transport = transport
+
+    @classmethod
+    async def from_page(cls, page: Page, **kwargs) -> "OrderHistoryClient":
+        cookies = await page.context.cookies("https://www.epicgames.com")
+        user_agent = await page.evaluate("navigator.userAgent")
+        return cls(cookies, user_agent=user_agent, **kwargs)
+
+    async def iter_orders(
+        self, stop_at_order_id: str | None = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        依 nextPageToken 逐頁取得訂單（新到舊），遇到 stop_at_order_id 即停止。
+        HTTP 或格式錯誤時拋出例外。
+        """
+        async with httpx.AsyncClient(
+            transport=self._transport,
+            cookies=self._cookies,
+            headers=self._headers,
+            timeout=httpx.Timeout(30, connect=10),
+            follow_redirects=False,
+        ) as client:
+            params = {"sortDir": "DESC", "sortBy": "DATE", "locale": "en-US"}
+            seen_tokens = set()
+
+            for page_number in range(1, self.max_pages + 1):
+                resp = await client.get(URL_ORDER_HISTORY, params=params)
+                resp.raise_for_status()
+
+                data = parse_order_history(resp.content)
+                orders = data["orders"]
+                logger.debug(f"訂單紀錄第 {page_number} 頁: {len(orders)} 筆")
+                for order in orders:
+                    if stop_at_order_id and order.get("orderId") == stop_at_order_id:
+                        return
+                    if self.newest_order_id is None:
+                        self.newest_order_id = order.get("orderId")
+                    yield order
+
+                token = data.get("nextPageToken")
+                if not orders or not token or token in seen_tokens:
+                    return
+                seen_tokens.add(token)
+                params["nextPageToken"] = token
+
+            logger.warning(f"⚠️ 訂單紀錄超過 {self.max_pages} 頁，停止翻頁")
+
+    async def fetch_purchased_items(self, stop_at_order_id: str | None = None) -> List[OrderItem]:
+        """取得購買項目；提供 stop_at_order_id 時只回傳比它更新的訂單"""
+        orders = [order async for order in self.iter_orders(stop_at_order_id)]
+        return purchased_items(orders)
@@ -0,0 +1,321 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 10:12
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 週免促銷資料客戶端
+
+- 共享 keep-alive 的 httpx.AsyncClient，不再阻塞事件迴圈
+- 以 ETag / Last-Modified 進行條件請求，未變更時伺服器回傳 304
+- 依 locale 區分的磁碟快取，TTL 內直接讀回，網路異常時退回舊快取
+- 精簡解析：只擷取用到的欄位，以 model_construct 建立 PromotionGame
+"""
+import asyncio
+import hashlib
+import json
+import time
+from contextlib import suppress
+from datetime import datetime
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+from loguru import logger
+
+from models import PromotionGame
+from services.product_url_index import ProductUrlIndex
+from settings import settings, RUNTIME_DIR
+
+URL_PROMOTIONS = "https://store-site-backend-static.ak.epicgames.com/freeGamesPromotions"
+URL_PRODUCT_PAGE = "https://store.epicgames.com/en-US/p/"
+URL_PRODUCT_BUNDLES = "https://store.epicgames.com/en-US/bundles/"
+
+PROMOTIONS_CACHE_DIR = RUNTIME_DIR.joinpath("promotions")
+
+
+class PromotionsClient:
+
+    def __init__(
+        self,
+        cache_dir: Path = PROMOTIONS_CACHE_DIR,
+        ttl: float | None = None,
+        transport: httpx.AsyncBaseTransport | None = None,
+    ):
+        self.cache_dir = cache_dir
+        self.ttl = settings.PROMOTIONS_CACHE_TTL_SECONDS if ttl is None else ttl
+
+        self._transport = transport
+        self._client: httpx.AsyncClient | None = None
+        self._client_loop: asyncio.AbstractEventLoop | None = None
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Celery 每個任務都會 asyncio.run 一個新迴圈，連線池不能跨迴圈重用
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client.is_closed or self._client_loop is not loop:
+            self._client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=httpx.Timeout(30, connect=10),
+                limits=httpx.Limits(max_keepalive_connections=4, keepalive_expiry=300),
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def aclose(self):
+        if self._client is not None and not self._client.is_closed:
+            with suppress(Exception):
+                await self._client.aclose()
+        self._client = None
+        self._client_loop = None
+
+    def _cache_paths(self, locale: str) -> Tuple[Path, Path]:
+        return (
+            self.cache_dir.joinpath(f"{locale}.json"),
+            self.cache_dir.joinpath(f"{locale}.meta.json"),
+        )
+
+    def _load_cache(self, locale: str) -> Tuple[bytes | None, Dict[str, Any]]:
+        body_path, meta_path = self._cache_paths(locale)
+        try:
+            return body_path.read_bytes(), json.loads(meta_path.read_text(encoding="utf8"))
+        except (OSError, JSONDecodeError):
+            return None, {}
+
+    def _save_meta(self, locale: str, meta: Dict[str, Any]):
+        _, meta_path = self._cache_paths(locale)
+        with suppress(OSError):
+            meta_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = meta_path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(meta), encoding="utf8")
+            tmp.replace(meta_path)
+
+    def _save_cache(self, locale: str, body: bytes, meta: Dict[str, Any]):
+        body_path, _ = self._cache_paths(locale)
+        with suppress(OSError):
+            body_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = body_path.with_suffix(".tmp")
+            tmp.write_bytes(body)
+            tmp.replace(body_path)
+            self._save_meta(locale, meta)
+
+    @staticmethod
+    def _decode(body: bytes | None) -> Dict[str, Any] | None:
+        if body is None:
+            return None
+        try:
+            return json.loads(body)
+        except (JSONDecodeError, UnicodeDecodeError) as err:
+            logger.error(f"取得促銷資訊失敗: {err}")
+            return None
+
+    async def fetch(
+        self, locale: str | None = None, max_age: float | None = None
+    ) -> Dict[str, Any] | None:
+        """
+        取得 freeGamesPromotions 原始資料
+
+        TTL（或 max_age）內直接讀回磁碟快取；過期後帶上 ETag / Last-Modified 重新驗證，
+        304 只更新快取時間。請求失敗時退回舊快取，兩者皆無則回傳 None。
+        """
+        locale = locale or settings.PROMOTIONS_LOCALE
+        max_age = self.ttl if max_age is None else max_age
+        body, meta = self._load_cache(locale)
+
+        if body is not None and time.time() - meta.get("fetched_at", 0) < max_age:
+            logger.debug(f"促銷資料命中快取 - locale={locale}")
+            return self._decode(body)
+
+        headers = {}
+        if body is not None:
+            if etag := meta.get("etag"):
+                headers["If-None-Match"] = etag
+            if last_modified := meta.get("last_modified"):
+                headers["If-Modified-Since"] = last_modified
+
+        try:
+            resp = await self._get_client().get(
+                URL_PROMOTIONS, params={"local": locale}, headers=headers
+            )
+        except httpx.HTTPError as err:
+            logger.warning(f"取得促銷資訊失敗，改用舊快取: {err!r}")
+            return self._decode(body)
+
+        if resp.status_code == 304 and body is not None:
+            logger.debug(f"促銷資料未變更 (304) - locale={locale}")
+            meta["fetched_at"] = time.time()
+            self._save_meta(locale, meta)
+            return self._decode(body)
+
+        if resp.status_code != 200:
+            logger.warning(f"取得促銷資訊失敗，改用舊快取: HTTP {resp.status_code}")
+            return self._decode(body)
+
+        data = self._decode(resp.content)
+        if data is None:
+            return self._decode(body)
+
+        self._save_cache(
+            locale,
+            resp.content,
+            {
+                "etag": resp.headers.get("etag"),
+                "last_modified": resp.headers.get("last-modified"),
+                "fetched_at": time.time(),
+            },
+        )
+        return data
+
+
+promotions_client = PromotionsClient()
+
+
+def _parse_datetime(value: Any) -> datetime | None:
+    if not isinstance(value, str):
+        return None
+    with suppress(ValueError):
+        return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+
+def _free_offer(e: dict) -> dict | None:
+    """回傳目前生效且折扣為 0（免費）的促銷時段，非週免遊戲回傳 None"""
+    with suppress(KeyError, IndexError, TypeError):
+        for offer in e["promotions"]["promotionalOffers"][0]["promotionalOffers"]:
+            if offer["discountSetting"]["discountPercentage"] == 0:
+                return offer
+    return None
+
+
+def _is_bundle(e: dict) -> bool:
+    if e.get("offerType") == "BUNDLE":
+        return True
+    # 補充檢測：分類和標題
+    for cat in e.get("categories") or []:
+        if "bundle" in (cat.get("path") or "").lower():
+            return True
+    return "Collection" in (e.get("title") or "")
+
+
+def _product_url(e: dict) -> str:
+    base_url = (URL_PRODUCT_BUNDLES if _is_bundle(e) else URL_PRODUCT_PAGE).rstrip("/")
+    if e.get("offerMappings"):
+        return f"{base_url}/{e['offerMappings'][0]['pageSlug']}"
+    if e.get("productSlug"):
+        return f"{base_url}/{e['productSlug']}"
+    return f"{base_url}/{e.get('urlSlug', 'unknown')}"
+
+
+def _product_url_candidates(e: dict) -> List[str]:
+    """
+    列出所有可能的商品頁 URL，啟發式判斷的結果排第一。
+
+    Bundle 判斷與 slug 欄位都可能猜錯，其餘組合留給 ProductUrlIndex 在 404 時依序嘗試。
+    """
+    candidates = [_product_url(e)]
+
+    slugs = [m.get("pageSlug") for m in e.get("offerMappings") or []]
+    slugs += [m.get("pageSlug") for m in (e.get("catalogNs") or {}).get("mappings") or []]
+    slugs += [e.get("productSlug"), e.get("urlSlug")]
+
+    bases = [URL_PRODUCT_BUNDLES, URL_PRODUCT_PAGE]
+    if not _is_bundle(e):
+        bases.reverse()
+
+    for base_url in bases:
+        for slug in slugs:
+            if slug and isinstance(slug, str):
+                candidates.append(f"{base_url.rstrip('/')}/{slug}")
+
+    return list(dict.fromkeys(candidates))
+
+
+def parse_promotions(
+    data: Dict[str, Any], *, validate: bool = False, url_index: ProductUrlIndex | None = None
+) -> List[PromotionGame]:
+    """
+    從 freeGamesPromotions 資料中擷取 <本週免費> 遊戲
+
+    只讀取 title/id/namespace/offerType/slug 與促銷時段，其餘欄位一律不碰。
+    預設以 model_construct 建立紀錄、略過 pydantic 驗證；validate=True 時走完整驗證。
+    提供 url_index 時，商品頁 URL 優先使用已驗證的結果並跳過近期 404 的候選。
+    """
+    promotions: List[PromotionGame] = []
+    build = PromotionGame if validate else PromotionGame.model_construct
+
+    try:
+        elements = data["data"]["Catalog"]["searchStore"]["elements"]
+    except (KeyError, TypeError) as err:
+        logger.error(f"促銷資料格式異常: {err!r}")
+        return promotions
+
+    for e in elements:
+        if not (offer := _free_offer(e)):
+            continue
+
+        try:
+            url = _product_url(e)
+        except (KeyError, IndexError, TypeError):
+            logger.debug(f"無法取得 URL: {e.get('title')} - {e.get('id')}")
+            continue
+
+        end_date = _parse_datetime(offer.get("endDate"))
+        if url_index is not None:
+            url = url_index.resolve(
+                e.get("id", ""),
+                e.get("namespace", ""),
+                _product_url_candidates(e),
+                expires_at=end_date.timestamp() if end_date else None,
+            )
+
+        logger.debug(f"發現週免遊戲: {url}")
+        promotions.append(
+            build(
+                title=e.get("title", ""),
+                id=e.get("id", ""),
+                namespace=e.get("namespace", ""),
+                description=e.get("description", ""),
+                offerType=e.get("offerType", ""),
+                url=url,
+                startDate=_parse_datetime(offer.get("startDate")),
+                endDate=end_date,
+            )
+        )
+
+    return promotions
+
+
+def extract_promotion_boundaries(data: Dict[str, Any]) -> List[datetime]:
+    """收集目前與即將到來的免費促銷的開始/結束時間，已排序且去重"""
+    boundaries = set()
+
+    try:
+        elements = data["data"]["Catalog"]["searchStore"]["elements"]
+    except (KeyError, TypeError):
+        return []
+
+    for e in elements:
+        promotions = e.get("promotions") or {}
+        for key in ("promotionalOffers", "upcomingPromotionalOffers"):
+            for group in promotions.get(key) or []:
+                for offer in (group or {}).get("promotionalOffers") or []:
+                    discount = (offer.get("discountSetting") or {}).get("discountPercentage")
+                    if discount != 0:
+                        continue
+                    for field in ("startDate", "endDate"):
+                        if moment := _parse_datetime(offer.get(field)):
+                            boundaries.add(moment)
+
+    return sorted(boundaries)
+
+
+def promotions_fingerprint(promotions: List[PromotionGame]) -> str:
+    """以 namespace:offerId 集合計算促銷指紋，用於判斷促銷內容是否變化"""
+    keys = sorted(f"{p.namespace}:{p.id}" for p in promotions)
+    return hashlib.sha1("\n".join(keys).encode()).hexdigest()
+
+
+def dump_promotions_debug(data: Dict[str, Any]):
+    """輸出格式化的原始促銷資料，僅供除錯（PROMOTIONS_DEBUG_DUMP）"""
+    with suppress(Exception):
+        debug_path = RUNTIME_DIR.joinpath("promotions.json")
+        debug_path.parent.mkdir(parents=True, exist_ok=True)
+        debug_path.write_text(json.dumps(data, indent=2, ensure_ascii=False), encoding="utf8")
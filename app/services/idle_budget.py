@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 19:30
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 等待時間預算
+
+統計每次執行中等待具體事件花了多少毫秒、逾時幾次，
+並提供等待多個事件中任一先到的工具，取代無條件的 wait_for_timeout。
+"""
+import asyncio
+import time
+from collections import defaultdict
+from contextvars import ContextVar
+from typing import Awaitable, Dict, TypeVar
+
+from loguru import logger
+from playwright.async_api import TimeoutError
+
+T = TypeVar("T")
+
+
+class IdleBudget:
+
+    def __init__(self):
+        self.event_ms: float = 0
+        self.timeouts: int = 0
+        self.breakdown: Dict[str, float] = defaultdict(float)
+
+    def _add(self, name: str, elapsed_ms: float):
+        self.event_ms += elapsed_ms
+        self.breakdown[name] += elapsed_ms
+
+    async def measure(self, name: str, aw: Awaitable[T]) -> T:
+        """等待一個具體事件（frame 掛載、網路回應、URL 變化、元素狀態），計入事件等待時間"""
+        start = time.perf_counter()
+        try:
+            return await aw
+        finally:
+            self._add(name, (time.perf_counter() - start) * 1000)
+
+    async def wait(self, name: str, aw: Awaitable, *, raise_on_timeout: bool = False) -> bool:
+        """
+        同 measure()，但逾時只記錄不拋出。
+
+        Returns:
+            bool: 事件是否在逾時前發生
+        """
+        try:
+            await self.measure(name, aw)
+            return True
+        except (TimeoutError, asyncio.TimeoutError):
+            self.timeouts += 1
+            if raise_on_timeout:
+                raise
+            return False
+
+    def report(self):
+        top = sorted(self.breakdown.items(), key=lambda kv: kv[1], reverse=True)[:5]
+        detail = ", ".join(f"{k}={v:.0f}ms" for k, v in top)
+        logger.info(
+            f"⏱️ 等待時間預算: 事件等待 {self.event_ms:.0f}ms（逾時 {self.timeouts} 次）| {detail}"
+        )
+
+
+_current_budget: ContextVar[IdleBudget | None] = ContextVar("idle_budget", default=None)
+
+
+def start_idle_budget() -> IdleBudget:
+    """為目前的執行（含其衍生的 task）建立新的等待預算"""
+    budget = IdleBudget()
+    _current_budget.set(budget)
+    return budget
+
+
+def idle_budget() -> IdleBudget:
+    if (budget := _current_budget.get()) is None:
+        budget = start_idle_budget()
+    return budget
+
+
+async def wait_first(*aws: Awaitable, timeout: float) -> int:
+    """
+    同時等待多個事件，回傳第一個成功完成者的索引，其餘取消。
+
+    全部失敗或 timeout（毫秒）內皆未完成時拋出 TimeoutError。
+    """
+    tasks = [asyncio.ensure_future(aw) for aw in aws]
+    pending = set(tasks)
+    try:
+        async with asyncio.timeout(timeout / 1000):
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for t in done:
+                    if not t.cancelled() and t.exception() is None:
+                        return tasks.index(t)
+    except asyncio.TimeoutError:
+        pass
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    raise TimeoutError(f"Timeout {timeout}ms exceeded while waiting for any of {len(tasks)} events")
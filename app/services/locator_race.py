@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 17:10
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 選擇器競速
+
+在所有相關容器（主頁面與 iframe）上同時探測全部候選選擇器，
+回傳第一個可用的按鈕。總等待時間只受一個 timeout 限制，而不是各候選 timeout 的總和。
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any, List, Sequence, Tuple
+
+from loguru import logger
+from playwright.async_api import Frame, Locator, Page, expect
+
+# 廣告、分析與驗證碼 iframe 不會有結帳按鈕，直接排除
+IGNORED_FRAME_KEYWORDS = (
+    "doubleclick.net",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "facebook.com",
+    "facebook.net",
+    "tiktok.com",
+    "twitter.com",
+    "reddit.com",
+    "bing.com",
+    "onetrust.com",
+    "cookielaw.org",
+    "hcaptcha.com",
+    "recaptcha",
+    "/analytics",
+    "/tracking",
+)
+
+Container = Page | Frame
+
+# 第一個命中後，等待優先序更高的候選的時間（毫秒）
+RACE_GRACE_MS = 300
+
+
+@dataclass
+class RaceWinner:
+    container: Container
+    locator: Locator
+    container_label: str
+    selector: str
+    priority: Tuple[int, int]
+
+
+def is_ignored_frame(url: str) -> bool:
+    url = (url or "").lower()
+    return any(keyword in url for keyword in IGNORED_FRAME_KEYWORDS)
+
+
+def candidate_containers(page: Page) -> List[Tuple[str, Container]]:
+    """列出主頁面與所有非廣告/分析 iframe，依頁面順序排列"""
+    containers: List[Tuple[str, Container]] = [("page", page)]
+    for idx, frame in enumerate(page.frames):
+        if frame == page.main_frame or frame.is_detached() or is_ignored_frame(frame.url):
+            continue
+        containers.append((f"frame[{idx}] {frame.url[:180]}", frame))
+    return containers
+
+
+def text_selectors(texts: Sequence[str], tag: str = "button") -> List[str]:
+    """將按鈕文字轉為 :has-text() 選擇器（不分大小寫，重複的文字只保留一個）"""
+    unique = dict.fromkeys(t.lower() for t in texts)
+    originals = {t.lower(): t for t in reversed(texts)}
+    return [f'{tag}:has-text("{originals[t]}")' for t in unique]
+
+
+async def race_locators(
+    containers: Sequence[Tuple[str, Container]],
+    selectors: Sequence[str],
+    *,
+    timeout: float = 10_000,
+    require_enabled: bool = True,
+    grace: float = RACE_GRACE_MS,
+) -> RaceWinner | None:
+    """
+    在所有容器上同時等待所有選擇器，回傳第一個可見（且可點擊）的元素。
+
+    優先序為 (選擇器順序, 容器順序)：明確的按鈕文字永遠先於泛用的 CSS。
+    第一個命中出現後，再給優先序更高、仍在等待的候選 grace（毫秒）的時間；
+    timeout（毫秒）內皆未命中則回傳 None。
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout / 1000
+
+    async def _probe(priority: Tuple[int, int], label: str, container: Any, selector: str):
+        locator = container.locator(selector).first
+        await locator.wait_for(state="visible", timeout=timeout)
+        if require_enabled:
+            remaining = max(1.0, (deadline - loop.time()) * 1000)
+            await expect(locator).to_be_enabled(timeout=remaining)
+        return RaceWinner(container, locator, label, selector, priority)
+
+    priorities = {}
+    for ci, (label, container) in enumerate(containers):
+        for si, selector in enumerate(selectors):
+            task = asyncio.create_task(_probe((si, ci), label, container, selector))
+            priorities[task] = (si, ci)
+    tasks = list(priorities)
+
+    winner: RaceWinner | None = None
+    grace_deadline = deadline
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if winner:
+                # 只等優先序更高的候選，且最多 grace
+                pending = {t for t in pending if priorities[t] < winner.priority}
+                remaining = min(remaining, grace_deadline - loop.time())
+            if not pending or remaining <= 0:
+                break
+            done, pending = await asyncio.wait(
+                pending, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+            )
+            hits = [t.result() for t in done if not t.cancelled() and t.exception() is None]
+            if winner:
+                hits.append(winner)
+            elif hits:
+                grace_deadline = loop.time() + grace / 1000
+            if hits:
+                winner = min(hits, key=lambda w: w.priority)
+    finally:
+        for t in tasks:
+            if not t.done():
+                t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if winner:
+        logger.debug(
+            f"選擇器競速命中: {winner.selector} | 容器: {winner.container_label} "
+            f"| 候選 {len(tasks)} 個，耗時 {(loop.time() - deadline) * 1000 + timeout:.0f}ms"
+        )
+    return winner
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 16:02
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 帳號已擁有遊戲索引
+
+與 Camoufox 持久化設定檔放在同一個 user_data_dir 下，每個帳號一份：
+- namespaces 以排序後的列表落盤，載入後以 set 提供 O(1) 成員查詢
+- 記錄最新的 orderId，之後的同步只需抓取比它更新的訂單
+"""
+import json
+import time
+from contextlib import suppress
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Iterable, Set
+
+from loguru import logger
+
+OWNED_LIBRARY_FILENAME = "owned_library.json"
+
+
+class OwnedLibraryIndex:
+
+    def __init__(self, path: Path):
+        self.path = path
+
+        self.namespaces: Set[str] = set()
+        self.newest_order_id: str | None = None
+        self.synced_at: float | None = None
+
+        self._load()
+
+    @classmethod
+    def for_account(cls, user_data_dir: Path) -> "OwnedLibraryIndex":
+        return cls(user_data_dir.joinpath(OWNED_LIBRARY_FILENAME))
+
+    def __contains__(self, namespace: str) -> bool:
+        return namespace in self.namespaces
+
+    def __len__(self) -> int:
+        return len(self.namespaces)
+
+    @property
+    def is_synced(self) -> bool:
+        """是否曾完整同步過訂單紀錄"""
+        return self.synced_at is not None
+
+    def _load(self):
+        with suppress(OSError, JSONDecodeError, TypeError):
+            data = json.loads(self.path.read_text(encoding="utf8"))
+            self.namespaces = set(data.get("namespaces") or [])
+            self.newest_order_id = data.get("newest_order_id")
+            self.synced_at = data.get("synced_at")
+
+    def _save(self):
+        with suppress(OSError):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(
+                json.dumps(
+                    {
+                        "newest_order_id": self.newest_order_id,
+                        "synced_at": self.synced_at,
+                        "namespaces": sorted(self.namespaces),
+                    },
+                    separators=(",", ":"),
+                ),
+                encoding="utf8",
+            )
+            tmp.replace(self.path)
+
+    def update(self, namespaces: Iterable[str], newest_order_id: str | None, complete: bool = True):
+        """
+        合併新同步到的 namespaces 並推進最新 orderId
+
+        complete=False 表示只讀到部分訂單（例如瀏覽器只看得到第一頁），
+        合併結果但不標記為已完整同步，預檢不會因此信任這份索引。
+        """
+        before = len(self.namespaces)
+        self.namespaces.update(namespaces)
+        if newest_order_id:
+            self.newest_order_id = newest_order_id
+        if complete:
+            self.synced_at = time.time()
+        self._save()
+        logger.debug(
+            f"已擁有遊戲索引更新: +{len(self.namespaces) - before}，共 {len(self.namespaces)} 個"
+        )
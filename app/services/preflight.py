@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 22:30
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 啟動瀏覽器前的預檢
+
+大多數排程執行的結果都是「全部已擁有」。預檢在啟動 Camoufox 之前，
+以促銷資料比對帳號的已擁有遊戲索引；索引顯示仍有未擁有的遊戲時，
+再以設定檔中保存的 Cookie 透過 HTTP 增量同步一次訂單確認。
+只有確實存在未擁有的免費遊戲才啟動瀏覽器，並記錄省下的時間。
+"""
+
+import json
+import shutil
+import sqlite3
+import tempfile
+import time
+from contextlib import suppress
+from dataclasses import dataclass, field
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from models import PromotionGame
+from services.epic_order_history_service import OrderHistoryClient
+from services.epic_promotions_service import parse_promotions, promotions_client
+from services.owned_library_index import OwnedLibraryIndex
+from services.session_store import SessionStore, auth_cookies_alive
+from settings import RUNTIME_DIR
+
+SKIP_NO_PROMOTIONS = "no_promotions"
+SKIP_ALL_OWNED = "all_owned"
+LAUNCH_NO_DATA = "promotions_unavailable"
+LAUNCH_INDEX_NOT_SYNCED = "index_not_synced"
+LAUNCH_UNOWNED = "unowned"
+
+# 尚未量測過瀏覽器執行時間時的預設值（冷啟動 + 登入檢查 + 頁面導航）
+DEFAULT_BROWSER_SECONDS = 90.0
+
+
+@dataclass
+class PreflightResult:
+    should_launch: bool
+    reason: str
+    unowned: List[PromotionGame] = field(default_factory=list)
+    elapsed: float = 0.0
+
+
+def _snapshot_cookies(user_data_dir: Path, host_suffix: str) -> List[dict]:
+    """登入後匯出的 storage_state.json 快照中未過期的 Cookie"""
+    snapshot = SessionStore.for_account(user_data_dir).load()
+    if not snapshot or not auth_cookies_alive(snapshot):
+        return []
+    now = time.time()
+    cookies = []
+    for c in snapshot.get("cookies", []):
+        if not c.get("domain", "").endswith(host_suffix):
+            continue
+        # expires == -1 為工作階段 Cookie
+        if 0 <= c.get("expires", -1) < now:
+            continue
+        cookies.append(
+            {
+                "name": c["name"],
+                "value": c["value"],
+                "domain": c["domain"],
+                "path": c.get("path", "/"),
+            }
+        )
+    return cookies
+
+
+def _sqlite_cookies(user_data_dir: Path, host_suffix: str) -> List[tuple]:
+    path = user_data_dir.joinpath("cookies.sqlite")
+    if not path.is_file():
+        return []
+
+    # 瀏覽器可能仍在寫入（暖瀏覽器池），最近的登入也可能只在 -wal 中；
+    # 複製資料庫與 -wal 到暫存目錄再讀取，不碰原檔也不會漏掉尚未 checkpoint 的資料
+    with tempfile.TemporaryDirectory() as tmp, suppress(OSError, sqlite3.Error):
+        copy = Path(tmp).joinpath(path.name)
+        shutil.copyfile(path, copy)
+        wal = path.with_name(f"{path.name}-wal")
+        if wal.is_file():
+            shutil.copyfile(wal, copy.with_name(f"{copy.name}-wal"))
+        conn = sqlite3.connect(copy)
+        try:
+            return conn.execute(
+                "SELECT name, value, host, path, expiry FROM moz_cookies WHERE host LIKE ?",
+                (f"%{host_suffix}",),
+            ).fetchall()
+        finally:
+            conn.close()
+    return []
+
+
+def load_profile_cookies(user_data_dir: Path, host_suffix: str = "epicgames.com") -> List[dict]:
+    """
+    讀取設定檔中保存的 Cookie，不需要啟動瀏覽器
+
+    優先使用登入後匯出的 storage_state.json 快照；沒有快照或登入 Cookie 已過期時，
+    才讀取 Firefox 的 cookies.sqlite。
+    """
+    if cookies := _snapshot_cookies(user_data_dir, host_suffix):
+        return cookies
+
+    cookies = []
+    now = time.time()
+    for name, value, host, cookie_path, expiry in _sqlite_cookies(user_data_dir, host_suffix):
+        # expiry 可能以秒或毫秒儲存，視 Firefox 版本而定
+        expires = expiry / 1000 if expiry and expiry > 1e11 else expiry
+        if expires and expires < now:
+            continue
+        cookies.append({"name": name, "value": value, "domain": host, "path": cookie_path})
+    return cookies
+
+
+class PreflightStats:
+    """記錄瀏覽器執行的平均耗時，用於估算預檢略過時省下的時間"""
+
+    def __init__(self, path: Path = RUNTIME_DIR.joinpath("preflight_stats.json")):
+        self.path = path
+        self.avg_browser_seconds = DEFAULT_BROWSER_SECONDS
+        self.skipped_runs = 0
+        self.saved_seconds = 0.0
+        with suppress(OSError, JSONDecodeError, TypeError):
+            data: Dict[str, Any] = json.loads(self.path.read_text(encoding="utf8"))
+            self.avg_browser_seconds = data.get("avg_browser_seconds", self.avg_browser_seconds)
+            self.skipped_runs = data.get("skipped_runs", 0)
+            self.saved_seconds = data.get("saved_seconds", 0.0)
+
+    def _save(self):
+        with suppress(OSError):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(
+                json.dumps(
+                    {
+                        "avg_browser_seconds": round(self.avg_browser_seconds, 2),
+                        "skipped_runs": self.skipped_runs,
+                        "saved_seconds": round(self.saved_seconds, 2),
+                    }
+                ),
+                encoding="utf8",
+            )
+            tmp.replace(self.path)
+
+    def record_launch(self, seconds: float):
+        # 指數移動平均，讓估算跟上近期的執行時間
+        self.avg_browser_seconds = 0.7 * self.avg_browser_seconds + 0.3 * seconds
+        self._save()
+
+    def record_skip(self, preflight_seconds: float) -> float:
+        saved = max(0.0, self.avg_browser_seconds - preflight_seconds)
+        self.skipped_runs += 1
+        self.saved_seconds += saved
+        self._save()
+        return saved
+
+
+preflight_stats = PreflightStats()
+
+
+async def _refresh_index(index: OwnedLibraryIndex, user_data_dir: Path) -> bool:
+    """以設定檔中的 Cookie 增量同步訂單；失敗時保持原索引"""
+    cookies = load_profile_cookies(user_data_dir)
+    if not cookies:
+        return False
+    try:
+        client = OrderHistoryClient(cookies)
+        items = await client.fetch_purchased_items(index.newest_order_id)
+        index.update((item.namespace for item in items), client.newest_order_id)
+        return True
+    except Exception as err:
+        logger.debug(f"預檢同步訂單失敗，改由瀏覽器確認: {err!r}")
+        return False
+
+
+async def run_preflight(
+    user_data_dir: Path, data: Dict[str, Any] | None = None, max_age: float | None = None
+) -> PreflightResult:
+    """
+    判斷本輪是否需要啟動瀏覽器。
+
+    Args:
+        user_data_dir: 帳號的設定檔目錄（已擁有遊戲索引與 Cookie 所在）
+        data: 已取得的促銷資料；未提供時由 promotions_client 取得
+        max_age: 傳給 promotions_client.fetch 的快取年齡上限
+    """
+    start = time.perf_counter()
+
+    def _result(should_launch: bool, reason: str, unowned=None) -> PreflightResult:
+        return PreflightResult(should_launch, reason, unowned or [], time.perf_counter() - start)
+
+    if data is None:
+        data = await promotions_client.fetch(max_age=max_age)
+    if not data:
+        return _result(True, LAUNCH_NO_DATA)
+
+    promotions = parse_promotions(data)
+    if not promotions:
+        return _result(False, SKIP_NO_PROMOTIONS)
+
+    index = OwnedLibraryIndex.for_account(user_data_dir)
+    if not index.is_synced:
+        return _result(True, LAUNCH_INDEX_NOT_SYNCED, promotions)
+
+    unowned = [p for p in promotions if p.namespace not in index]
+    # 索引可能落後於在其它裝置上的領取，啟動瀏覽器前先以 HTTP 確認一次
+    if unowned and await _refresh_index(index, user_data_dir):
+        unowned = [p for p in promotions if p.namespace not in index]
+
+    if unowned:
+        return _result(True, LAUNCH_UNOWNED, unowned)
+    return _result(False, SKIP_ALL_OWNED)
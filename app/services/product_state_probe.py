@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 21:20
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 商品狀態網路探測
+
+商品頁的 GraphQL 回應（entitledOfferItems、catalogOffer）在 DOM 渲染前就帶有
+擁有狀態與價格。攔截這些回應即可判斷商品是否已擁有、可免費領取或無法領取，
+已擁有的遊戲不必等待購買按鈕渲染。
+"""
+import asyncio
+from enum import Enum
+from typing import Any, Iterator
+
+from loguru import logger
+from playwright.async_api import Page, Response
+
+from services.response_bus import ResponseBus, Subscription
+
+GRAPHQL_PATH = "/graphql"
+
+
+class ProductState(str, Enum):
+    OWNED = "owned"
+    FREE = "free"
+    UNAVAILABLE = "unavailable"
+
+
+def _walk(node: Any) -> Iterator[dict]:
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+class ProductStateProbe:
+
+    def __init__(self, namespace: str | None = None, offer_id: str | None = None):
+        self.namespace = namespace
+        self.offer_id = offer_id
+
+        self.entitled: bool | None = None
+        self.discount_price: int | None = None
+
+        self._resolved = asyncio.Event()
+        self._bus: ResponseBus | None = None
+        self._subscription: Subscription | None = None
+
+    @property
+    def targeted(self) -> bool:
+        return bool(self.offer_id)
+
+    def _is_target(self, namespace: str | None, offer_id: str | None) -> bool:
+        # 商品頁同時會載入 DLC 等其它 offer，只採用目標 offer 的資料；
+        # 不知道目標 offer 時無法分辨，全部不採用，交給 DOM 流程判斷
+        if not self.targeted:
+            return False
+        if self.namespace and namespace and namespace != self.namespace:
+            return False
+        # DLC 與本體共用 namespace，沒有 offer id 的節點同樣無法分辨
+        return offer_id == self.offer_id
+
+    @property
+    def state(self) -> ProductState | None:
+        if self.entitled:
+            return ProductState.OWNED
+        if self.discount_price is not None and self.discount_price > 0:
+            return ProductState.UNAVAILABLE
+        if self.entitled is False and self.discount_price == 0:
+            return ProductState.FREE
+        return None
+
+    def feed(self, payload: Any) -> ProductState | None:
+        """解析一個 GraphQL 回應，回傳目前可確定的狀態"""
+        for node in _walk(payload):
+            if "entitledToAllItemsInOffer" in node:
+                if self._is_target(node.get("namespace"), node.get("offerId")):
+                    self.entitled = bool(node["entitledToAllItemsInOffer"])
+            elif isinstance(node.get("price"), dict) and "namespace" in node:
+                if not self._is_target(node.get("namespace"), node.get("id")):
+                    continue
+                total = node["price"].get("totalPrice") or {}
+                if isinstance(total.get("discountPrice"), int):
+                    self.discount_price = total["discountPrice"]
+
+        if self.state is not None:
+            self._resolved.set()
+        return self.state
+
+    def _on_payload(self, response: Response, payload: Any) -> bool:
+        if response.status != 200:
+            return False
+        # 狀態確定後即取消訂閱，之後的 GraphQL 回應不再讀取內容
+        return self.feed(payload) is not None
+
+    def attach(self, page: Page):
+        self._bus = ResponseBus.for_page(page)
+        self._subscription = self._bus.subscribe(GRAPHQL_PATH, self._on_payload)
+
+    def detach(self):
+        if self._bus and self._subscription:
+            self._bus.unsubscribe(self._subscription)
+        self._bus = self._subscription = None
+
+    async def wait(self, timeout: float = 5000) -> ProductState | None:
+        """
+        等待資料足以判斷狀態。
+
+        逾時（毫秒）時回傳已知的部分結論：只知道價格為 0 時視為 FREE，交給 DOM 流程確認。
+        """
+        with_timeout = False
+        try:
+            await asyncio.wait_for(self._resolved.wait(), timeout / 1000)
+        except asyncio.TimeoutError:
+            with_timeout = True
+
+        state = self.state
+        if state is None and self.discount_price == 0:
+            state = ProductState.FREE
+        logger.debug(
+            f"商品狀態探測: {state.value if state else 'unknown'} "
+            f"(entitled={self.entitled}, discountPrice={self.discount_price}, timeout={with_timeout})"
+        )
+        return state
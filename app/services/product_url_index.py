@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 11:05
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 商品頁 URL 解析快取
+
+以 namespace:offerId 為鍵，記錄每個促銷的候選 URL 與已驗證可開啟的 URL，
+並對 404 的 URL 做負向快取。同一個促銷在生效期間只需要付出一次探路的導航成本。
+"""
+import json
+import time
+from contextlib import suppress
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Dict, List
+
+from loguru import logger
+
+from settings import RUNTIME_DIR
+
+# 404 的 URL 在這段時間內不再嘗試；商店偶爾回傳短暫的 404，不能擋住整個促銷期
+NOT_FOUND_TTL_SECONDS = 6 * 3600
+
+# 促銷結束後保留紀錄的時間，避免時區誤差造成重複探路
+EXPIRED_GRACE_SECONDS = 24 * 3600
+
+
+class ProductUrlIndex:
+
+    def __init__(self, path: Path = RUNTIME_DIR.joinpath("product_urls.json")):
+        self.path = path
+
+        self._offers: Dict[str, dict] = {}
+        self._not_found: Dict[str, float] = {}
+        self._loaded = False
+
+    @staticmethod
+    def key(offer_id: str, namespace: str) -> str:
+        return f"{namespace}:{offer_id}"
+
+    def _load(self):
+        if self._loaded:
+            return
+        self._loaded = True
+
+        with suppress(OSError, JSONDecodeError, AttributeError):
+            data = json.loads(self.path.read_text(encoding="utf8"))
+            self._offers = data.get("offers", {})
+            self._not_found = data.get("not_found", {})
+
+        now = time.time()
+        self._offers = {
+            k: v
+            for k, v in self._offers.items()
+            if not v.get("expires_at") or v["expires_at"] + EXPIRED_GRACE_SECONDS > now
+        }
+        self._not_found = {
+            u: ts for u, ts in self._not_found.items() if ts + NOT_FOUND_TTL_SECONDS > now
+        }
+
+    def _save(self):
+        with suppress(OSError):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(
+                json.dumps({"offers": self._offers, "not_found": self._not_found}),
+                encoding="utf8",
+            )
+            tmp.replace(self.path)
+
+    def _next_candidate(self, entry: dict) -> str | None:
+        for url in entry.get("candidates", []):
+            if url not in self._not_found:
+                return url
+        return None
+
+    def resolve(
+        self, offer_id: str, namespace: str, candidates: List[str], expires_at: float | None = None
+    ) -> str | None:
+        """
+        回傳應導航的 URL：已驗證的 URL 優先，否則取第一個未被標記 404 的候選。
+        所有候選皆 404 時仍回傳第一個候選，不讓促銷因負向快取而消失。
+        """
+        self._load()
+
+        candidates = list(dict.fromkeys(candidates))
+        entry = self._offers.setdefault(self.key(offer_id, namespace), {})
+        # 促銷時段變了（新一輪上架）就不再沿用上一輪的 404 紀錄
+        if "expires_at" in entry and entry["expires_at"] != expires_at:
+            for url in candidates:
+                self._not_found.pop(url, None)
+        entry["candidates"] = candidates
+        entry["expires_at"] = expires_at
+
+        if verified := entry.get("verified"):
+            return verified
+        if url := self._next_candidate(entry):
+            return url
+        if candidates:
+            logger.warning(f"⚠️ 所有候選商品頁皆曾回傳 404，重新嘗試: {candidates[0]}")
+            return candidates[0]
+        return None
+
+    def is_verified(self, url: str) -> bool:
+        self._load()
+        return any(entry.get("verified") == url for entry in self._offers.values())
+
+    def mark_verified(self, url: str):
+        self._load()
+
+        changed = False
+        for entry in self._offers.values():
+            if url in entry.get("candidates", []) and entry.get("verified") != url:
+                entry["verified"] = url
+                entry["verified_at"] = time.time()
+                changed = True
+        if changed:
+            logger.debug(f"商品 URL 已驗證: {url}")
+            self._save()
+
+    def mark_not_found(self, url: str) -> str | None:
+        """標記 URL 為 404，回傳同一促銷的下一個候選 URL（若有）"""
+        self._load()
+
+        self._not_found[url] = time.time()
+        next_url = None
+        for entry in self._offers.values():
+            if url not in entry.get("candidates", []):
+                continue
+            if entry.get("verified") == url:
+                entry.pop("verified", None)
+                entry.pop("verified_at", None)
+            next_url = next_url or self._next_candidate(entry)
+        self._save()
+        return next_url
+
+
+product_url_index = ProductUrlIndex()
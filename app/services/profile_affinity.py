@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19 03:20
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 設定檔親和路由
+
+持久化設定檔只存在於某一台 worker 的磁碟上。任務若落到其它節點，
+就得從未登入的設定檔重新登入並解驗證碼。
+
+- worker 啟動時在 Redis 註冊並定期送出心跳，訂閱自己的 epic-claim.<node> 佇列
+- 帳號固定分派給持有設定檔的節點；只有該節點離開（逾時或正常關閉）時，
+  才以一致性雜湊在存活節點中重新指派，節點加入不會搬動既有帳號
+- 搬移設定檔必須明確呼叫：匯出登入所需的檔案、經 Redis 傳到目標節點再匯入，並記錄大小與耗時
+"""
+
+import bisect
+import hashlib
+import io
+import socket
+import tarfile
+import time
+from contextlib import suppress
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Tuple
+
+from loguru import logger
+
+from services.owned_library_index import OWNED_LIBRARY_FILENAME
+from services.profile_maintenance import profile_in_use
+from services.session_store import EPIC_DOMAIN_SUFFIX, STORAGE_STATE_FILENAME
+from settings import settings
+
+REGISTRY_KEY = "epic:workers"
+OWNER_KEY = "epic:profile_owner"
+TRANSFER_KEY = "epic:profile_transfer:{email}"
+
+# 每個節點在環上的虛擬節點數，讓帳號分布更平均
+DEFAULT_REPLICAS = 64
+# 傳輸中的設定檔在 Redis 保留的秒數
+TRANSFER_TTL_SECONDS = 3600
+
+ASSIGN_PINNED = "pinned"
+ASSIGN_NEW = "new"
+ASSIGN_OWNER_LEFT = "owner_left"
+
+# 搬移時只帶走登入狀態與索引，快取等資料由目標節點重新產生
+RELOCATE_FILES = (
+    "cookies.sqlite",
+    "cookies.sqlite-wal",
+    STORAGE_STATE_FILENAME,
+    OWNED_LIBRARY_FILENAME,
+)
+
+
+def _hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode("utf8")).digest()[:8], "big")
+
+
+def _text(value: Any) -> str:
+    return value.decode("utf8") if isinstance(value, bytes) else str(value)
+
+
+def local_node() -> str:
+    return settings.WORKER_NODE_NAME or socket.gethostname()
+
+
+class HashRing:
+
+    def __init__(self, nodes: Iterable[str] = (), replicas: int = DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, str] = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[str]:
+        return sorted(set(self._owners.values()))
+
+    def add(self, node: str):
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            if point not in self._owners:
+                bisect.insort(self._points, point)
+            self._owners[point] = node
+
+    def remove(self, node: str):
+        for i in range(self.replicas):
+            point = _hash(f"{node}#{i}")
+            if self._owners.get(point) == node:
+                del self._owners[point]
+                self._points.remove(point)
+
+    def node_for(self, key: str) -> str | None:
+        if not self._points:
+            return None
+        index = bisect.bisect(self._points, _hash(key)) % len(self._points)
+        return self._owners[self._points[index]]
+
+
+def plan_assignments(
+    emails: Iterable[str], alive: Iterable[str], owners: Dict[str, str]
+) -> Dict[str, Tuple[str, str]]:
+    """
+    決定每個帳號由哪個節點處理
+
+    Returns:
+        email -> (node, reason)；沒有存活節點時回傳空 dict
+    """
+    alive = set(alive)
+    if not alive:
+        return {}
+
+    ring = HashRing(alive)
+    plan = {}
+    for email in emails:
+        owner = owners.get(email)
+        if owner in alive:
+            plan[email] = (owner, ASSIGN_PINNED)
+        else:
+            plan[email] = (ring.node_for(email), ASSIGN_OWNER_LEFT if owner else ASSIGN_NEW)
+    return plan
+
+
+class WorkerRegistry:
+    """以 Redis hash 記錄存活的 worker 與各帳號設定檔所在的節點"""
+
+    def __init__(self, client: Any = None, ttl: int | None = None):
+        if client is None:
+            import redis
+
+            client = redis.Redis.from_url(settings.REDIS_URL)
+        self.client = client
+        self.ttl = ttl or settings.WORKER_HEARTBEAT_TTL
+
+    def heartbeat(self, node: str, now: float | None = None):
+        self.client.hset(REGISTRY_KEY, node, str(now or time.time()))
+
+    def leave(self, node: str):
+        self.client.hdel(REGISTRY_KEY, node)
+
+    def alive_nodes(self, now: float | None = None) -> List[str]:
+        now = now or time.time()
+        alive = []
+        for node, last_seen in self.client.hgetall(REGISTRY_KEY).items():
+            with suppress(ValueError):
+                if now - float(_text(last_seen)) <= self.ttl:
+                    alive.append(_text(node))
+        return sorted(alive)
+
+    def owners(self) -> Dict[str, str]:
+        return {_text(k): _text(v) for k, v in self.client.hgetall(OWNER_KEY).items()}
+
+    def set_owner(self, email: str, node: str):
+        self.client.hset(OWNER_KEY, email, node)
+
+    def put_transfer(self, email: str, blob: bytes):
+        self.client.set(TRANSFER_KEY.format(email=email), blob, ex=TRANSFER_TTL_SECONDS)
+
+    def pop_transfer(self, email: str) -> bytes | None:
+        key = TRANSFER_KEY.format(email=email)
+        blob = self.client.get(key)
+        if blob is not None:
+            self.client.delete(key)
+        return blob
+
+
+@dataclass
+class TransferStats:
+    files: int
+    bytes: int
+    elapsed: float
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"files": self.files, "bytes": self.bytes, "elapsed": round(self.elapsed, 3)}
+
+
+def _relocate_paths(user_data_dir: Path) -> List[Path]:
+    paths = [user_data_dir.joinpath(name) for name in RELOCATE_FILES]
+    # Epic 網域的 localStorage
+    with suppress(OSError):
+        for origin in user_data_dir.joinpath("storage", "default").iterdir():
+            if EPIC_DOMAIN_SUFFIX in origin.name:
+                paths.append(origin.joinpath("ls"))
+    return [p for p in paths if p.exists()]
+
+
+def export_profile(user_data_dir: Path) -> Tuple[bytes, TransferStats]:
+    """將登入狀態打包成 tar.gz；瀏覽器仍在使用設定檔時拒絕匯出，避免複製到寫到一半的 Cookie"""
+    if profile_in_use(user_data_dir):
+        raise RuntimeError(f"Profile is in use: {user_data_dir}")
+
+    start = time.perf_counter()
+    buffer, files = io.BytesIO(), 0
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for path in _relocate_paths(user_data_dir):
+            tar.add(path, arcname=str(path.relative_to(user_data_dir)))
+            files += 1 if path.is_file() else sum(1 for p in path.rglob("*") if p.is_file())
+    blob = buffer.getvalue()
+    return blob, TransferStats(files, len(blob), time.perf_counter() - start)
+
+
+def import_profile(user_data_dir: Path, blob: bytes) -> TransferStats:
+    start = time.perf_counter()
+    user_data_dir.mkdir(parents=True, exist_ok=True)
+    with tarfile.open(fileobj=io.BytesIO(blob), mode="r:gz") as tar:
+        members = [m for m in tar.getmembers() if m.isfile() or m.isdir()]
+        tar.extractall(user_data_dir, members=members, filter="data")
+    files = sum(1 for m in members if m.isfile())
+    return TransferStats(files, len(blob), time.perf_counter() - start)
+
+
+def log_plan(plan: Dict[str, Tuple[str, str]]):
+    moved = {e: node for e, (node, reason) in plan.items() if reason == ASSIGN_OWNER_LEFT}
+    logger.info(
+        f"🧭 設定檔親和路由: {len(plan)} 個帳號，"
+        f"{len(set(n for n, _ in plan.values()))} 個節點，{len(moved)} 個因節點離開而重新指派"
+    )
+    for email, node in moved.items():
+        # 原節點已離開，設定檔無法搬移，目標節點需要重新登入
+        logger.warning(f"Profile owner left, {email} reassigned to {node} (cold profile)")
@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19 01:50
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 持久化設定檔的壓縮與容量預算
+
+每個帳號的 Camoufox 設定檔會被永久重複使用，HTTP 快取、Service Worker 儲存、
+崩潰報告與瀏覽紀錄持續累積，拖慢每一次啟動。兩次執行之間（瀏覽器未開啟時）：
+
+1. 一律清除崩潰報告、遙測與工作階段備份
+2. 超出 PROFILE_SIZE_BUDGET_MB 時，依序清除快取、非 Epic 網域的網站資料、
+   Epic 網域的 CacheStorage、瀏覽紀錄，直到回到預算內
+
+Cookie、localStorage、登入狀態快照與已擁有遊戲索引不會被刪除。
+並記錄壓縮前後的平均啟動時間以觀察效果。
+"""
+import json
+import os
+import shutil
+import threading
+import time
+from contextlib import suppress
+from dataclasses import dataclass, field
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Dict, List
+
+from loguru import logger
+
+from services.owned_library_index import OWNED_LIBRARY_FILENAME
+from services.session_store import EPIC_DOMAIN_SUFFIX, STORAGE_STATE_FILENAME
+from settings import RUNTIME_DIR, settings
+
+# 不論容量一律清除：對下一次執行沒有任何用處
+TIER_JUNK = "junk"
+# 超出預算時依序清除，全部可由瀏覽器重新產生
+TIER_CACHE = "cache"
+TIER_SITE_DATA = "site_data"
+TIER_EPIC_CACHE = "epic_cache"
+TIER_HISTORY = "history"
+
+JUNK_ENTRIES = (
+    "crashes",
+    "minidumps",
+    "datareporting",
+    "saved-telemetry-pings",
+    "sessionstore-backups",
+    "storage/to-be-removed",
+)
+CACHE_ENTRIES = ("cache2", "startupCache", "thumbnails", "shader-cache", "OfflineCache")
+HISTORY_ENTRIES = (
+    "places.sqlite",
+    "places.sqlite-wal",
+    "favicons.sqlite",
+    "favicons.sqlite-wal",
+    "formhistory.sqlite",
+    "sessionstore.jsonlz4",
+)
+
+# 登入狀態與本專案自己的索引：任何階段都不刪除
+PROTECTED_NAMES = frozenset(
+    {
+        "cookies.sqlite",
+        "cookies.sqlite-wal",
+        "key4.db",
+        "logins.json",
+        "cert9.db",
+        "prefs.js",
+        "user.js",
+        STORAGE_STATE_FILENAME,
+        OWNED_LIBRARY_FILENAME,
+    }
+)
+
+
+def _size(path: Path) -> int:
+    if path.is_symlink():
+        return 0
+    if path.is_file():
+        with suppress(OSError):
+            return path.stat().st_size
+        return 0
+    total = 0
+    with suppress(OSError):
+        for child in path.rglob("*"):
+            with suppress(OSError):
+                if child.is_file() and not child.is_symlink():
+                    total += child.stat().st_size
+    return total
+
+
+def profile_size(user_data_dir: Path) -> int:
+    return _size(user_data_dir)
+
+
+def profile_in_use(user_data_dir: Path) -> bool:
+    """Firefox 執行中會建立指向 "IP:+PID" 的 lock 符號連結"""
+    lock = user_data_dir.joinpath("lock")
+    if not lock.is_symlink():
+        return False
+    with suppress(OSError, ValueError):
+        pid = int(os.readlink(lock).rsplit("+", 1)[-1])
+        os.kill(pid, 0)
+        return True
+    # 讀不到 PID 或程序已不存在：殘留的 lock
+    return False
+
+
+def _site_storage(user_data_dir: Path, epic: bool) -> List[Path]:
+    """storage/default 與 storage/temporary 之下依網域區分的網站資料目錄"""
+    found = []
+    for bucket in ("default", "temporary"):
+        with suppress(OSError):
+            for origin in user_data_dir.joinpath("storage", bucket).iterdir():
+                if (EPIC_DOMAIN_SUFFIX in origin.name) == epic:
+                    found.append(origin)
+    return found
+
+
+def prune_targets(user_data_dir: Path, tier: str) -> List[Path]:
+    if tier == TIER_JUNK:
+        paths = [user_data_dir.joinpath(e) for e in JUNK_ENTRIES]
+    elif tier == TIER_CACHE:
+        paths = [user_data_dir.joinpath(e) for e in CACHE_ENTRIES]
+    elif tier == TIER_SITE_DATA:
+        paths = _site_storage(user_data_dir, epic=False)
+    elif tier == TIER_EPIC_CACHE:
+        # 只清 CacheStorage，保留 Epic 網域的 localStorage 與 IndexedDB
+        paths = [origin.joinpath("cache") for origin in _site_storage(user_data_dir, epic=True)]
+    elif tier == TIER_HISTORY:
+        paths = [user_data_dir.joinpath(e) for e in HISTORY_ENTRIES]
+    else:
+        raise ValueError(f"Unknown prune tier: {tier}")
+    return [p for p in paths if p.exists() and p.name not in PROTECTED_NAMES]
+
+
+def _mb(size: int) -> float:
+    return size / 1024 / 1024
+
+
+def _remove(path: Path) -> int:
+    size = _size(path)
+    try:
+        if path.is_dir() and not path.is_symlink():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+    except OSError as err:
+        logger.debug(f"Failed to prune {path}: {err!r}")
+        return 0
+    return size
+
+
+@dataclass
+class CompactionResult:
+    size_before: int = 0
+    size_after: int = 0
+    elapsed: float = 0.0
+    removed: Dict[str, int] = field(default_factory=dict)
+    skipped: str | None = None
+
+    @property
+    def freed(self) -> int:
+        return sum(self.removed.values())
+
+
+def compact_profile(user_data_dir: Path, budget_bytes: int) -> CompactionResult:
+    """清除設定檔中可重新產生的資料，直到容量回到預算內"""
+    start = time.perf_counter()
+    result = CompactionResult()
+    if not user_data_dir.is_dir():
+        result.skipped = "missing"
+        return result
+    if profile_in_use(user_data_dir):
+        result.skipped = "in_use"
+        return result
+
+    size = result.size_before = profile_size(user_data_dir)
+    for tier in (TIER_JUNK, TIER_CACHE, TIER_SITE_DATA, TIER_EPIC_CACHE, TIER_HISTORY):
+        if tier != TIER_JUNK and size <= budget_bytes:
+            break
+        for path in prune_targets(user_data_dir, tier):
+            freed = _remove(path)
+            if freed:
+                result.removed[tier] = result.removed.get(tier, 0) + freed
+                size -= freed
+
+    result.size_after = profile_size(user_data_dir)
+    result.elapsed = time.perf_counter() - start
+    return result
+
+
+class ProfileMaintenance:
+    """執行設定檔壓縮，並記錄每個設定檔在最近一次壓縮前後的平均啟動時間"""
+
+    def __init__(self, path: Path = RUNTIME_DIR.joinpath("profile_stats.json")):
+        self.path = path
+        self.profiles: Dict[str, Dict[str, Any]] = {}
+        # 多帳號模式下各帳號在不同執行緒壓縮，同時事件迴圈上也會記錄啟動時間
+        self._lock = threading.Lock()
+        with suppress(OSError, JSONDecodeError, TypeError, ValueError):
+            self.profiles = dict(json.loads(self.path.read_text(encoding="utf8")))
+
+    def _save(self):
+        with suppress(OSError):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.profiles, indent=2), encoding="utf8")
+            tmp.replace(self.path)
+
+    def _entry(self, user_data_dir: Path) -> Dict[str, Any]:
+        return self.profiles.setdefault(user_data_dir.name, {})
+
+    def compact(self, user_data_dir: Path | None = None, budget_mb: int | None = None):
+        """兩次執行之間呼叫；瀏覽器仍開啟設定檔時不做任何事"""
+        if not settings.PROFILE_MAINTENANCE_ENABLED:
+            return None
+
+        user_data_dir = user_data_dir or settings.user_data_dir
+        budget_mb = budget_mb or settings.PROFILE_SIZE_BUDGET_MB
+        result = compact_profile(user_data_dir, budget_mb * 1024 * 1024)
+        if result.skipped:
+            logger.debug(f"Profile maintenance skipped ({result.skipped}): {user_data_dir.name}")
+            return result
+
+        detail = ", ".join(f"{k}={_mb(v):.1f}MB" for k, v in result.removed.items()) or "nothing"
+        logger.info(
+            f"🧹 設定檔整理: {_mb(result.size_before):.1f}MB → {_mb(result.size_after):.1f}MB"
+            f"（預算 {budget_mb}MB，耗時 {result.elapsed:.2f}s）| 清除 {detail}"
+        )
+        if result.size_after > budget_mb * 1024 * 1024:
+            logger.warning(
+                f"設定檔清除可重建資料後仍超出預算: {_mb(result.size_after):.1f}MB > {budget_mb}MB"
+            )
+
+        # 只有真正清除了快取等資料才算一次壓縮，之後的啟動時間與壓縮前比較
+        if set(result.removed) - {TIER_JUNK}:
+            with self._lock:
+                entry = self._entry(user_data_dir)
+                entry.update(
+                    compacted_at=int(time.time()),
+                    size_before_mb=round(_mb(result.size_before), 1),
+                    size_after_mb=round(_mb(result.size_after), 1),
+                    launch_before_seconds=entry.get("avg_launch_seconds"),
+                    launches_since=0,
+                )
+                self._save()
+        return result
+
+    def record_launch(self, seconds: float, user_data_dir: Path | None = None):
+        """記錄一次瀏覽器啟動耗時，並與最近一次壓縮前的平均值比較"""
+        user_data_dir = user_data_dir or settings.user_data_dir
+        with self._lock:
+            entry = self._entry(user_data_dir)
+            prev = entry.get("avg_launch_seconds")
+            # 壓縮後的第一次啟動重新起算，避免與壓縮前的數值混在一起
+            if prev is None or entry.get("launches_since") == 0:
+                avg = seconds
+            else:
+                avg = 0.7 * prev + 0.3 * seconds
+            entry["avg_launch_seconds"] = round(avg, 2)
+            if "launches_since" in entry:
+                entry["launches_since"] += 1
+            self._save()
+            entry = dict(entry)
+
+        line = f"Browser launch took {seconds:.2f}s (avg {avg:.2f}s)"
+        if (before := entry.get("launch_before_seconds")) is not None:
+            line += (
+                f" | before last compaction {before:.2f}s "
+                f"({entry['size_before_mb']}MB → {entry['size_after_mb']}MB)"
+            )
+        logger.debug(line)
+
+
+profile_maintenance = ProfileMaintenance()
+
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 21:50
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 請求攔截策略
+
+依發出請求的頁面類型（商店、商品、購物車、登入、結帳）套用資源類型攔截規則，
+減少影片、圖片、字型與分析腳本的下載。結帳 iframe 與 hCaptcha 一律放行。
+"""
+from collections import Counter
+from contextlib import suppress
+from typing import Dict, Iterable, Mapping
+from urllib.parse import urlsplit
+
+from loguru import logger
+from playwright.async_api import BrowserContext, Route
+
+PAGE_STORE = "store"
+PAGE_PRODUCT = "product"
+PAGE_CART = "cart"
+PAGE_AUTH = "auth"
+PAGE_CHECKOUT = "checkout"
+PAGE_OTHER = "other"
+
+# 永遠放行：驗證碼與結帳流程缺一不可
+ALWAYS_ALLOW_KEYWORDS = ("hcaptcha.com", "/purchase", "payment")
+
+ANALYTICS_KEYWORDS = (
+    "doubleclick.net",
+    "googletagmanager.com",
+    "google-analytics.com",
+    "googlesyndication.com",
+    "googleadservices.com",
+    "facebook.net",
+    "connect.facebook",
+    "analytics.tiktok.com",
+    "ads-twitter.com",
+    "redditstatic.com",
+    "bat.bing.com",
+    "cookielaw.org",
+    "tracking.epicgames.com",
+)
+
+# 頁面類型 -> 攔截的資源類型（Playwright request.resource_type）
+DEFAULT_RULES: Dict[str, frozenset] = {
+    PAGE_STORE: frozenset({"media", "image", "font"}),
+    PAGE_PRODUCT: frozenset({"media", "image", "font"}),
+    PAGE_CART: frozenset({"media", "font"}),
+    PAGE_AUTH: frozenset({"media"}),
+    PAGE_OTHER: frozenset({"media"}),
+    PAGE_CHECKOUT: frozenset(),
+}
+
+# 被攔截的請求無法得知實際大小，以各類型的典型大小估算
+ESTIMATED_BYTES = {"media": 1_500_000, "image": 60_000, "font": 40_000, "analytics": 30_000}
+
+
+def page_type(url: str) -> str:
+    parts = urlsplit(url or "")
+    path = parts.path
+    if "/purchase" in path:
+        return PAGE_CHECKOUT
+    if "/cart" in path:
+        return PAGE_CART
+    if "/id/" in path or path.startswith("/account") or "/login" in path:
+        return PAGE_AUTH
+    if "/p/" in path or "/bundles/" in path:
+        return PAGE_PRODUCT
+    if parts.netloc.startswith("store.epicgames.com"):
+        return PAGE_STORE
+    return PAGE_OTHER
+
+
+class RequestPolicy:
+
+    def __init__(self, rules: Mapping[str, Iterable[str]] | None = None):
+        self.rules: Dict[str, frozenset] = dict(DEFAULT_RULES)
+        for name, resource_types in (rules or {}).items():
+            self.rules[name] = frozenset(resource_types)
+
+        self.blocked: Counter = Counter()
+
+    def decide(self, url: str, resource_type: str, frame_url: str) -> str | None:
+        """回傳攔截類別（用於統計），None 表示放行"""
+        if resource_type == "document":
+            return None
+        if any(k in url for k in ALWAYS_ALLOW_KEYWORDS):
+            return None
+
+        kind = page_type(frame_url)
+        if kind == PAGE_CHECKOUT:
+            return None
+        if any(k in url for k in ANALYTICS_KEYWORDS):
+            return "analytics"
+        if resource_type in self.rules.get(kind, ()):
+            return resource_type
+        return None
+
+    async def _handle(self, route: Route):
+        request = route.request
+        frame_url = ""
+        try:
+            frame_url = request.frame.url
+        except Exception:
+            # Service worker 發出的請求沒有 frame
+            pass
+
+        if category := self.decide(request.url, request.resource_type, frame_url):
+            self.blocked[category] += 1
+            await route.abort("blockedbyclient")
+        else:
+            await route.fallback()
+
+    async def install(self, context: BrowserContext):
+        # 注意：context.route 會讓整個 context 略過 HTTP 快取
+        await context.route("**/*", self._handle)
+
+    async def uninstall(self, context: BrowserContext):
+        with suppress(Exception):
+            await context.unroute("**/*", self._handle)
+
+    @property
+    def bytes_saved(self) -> int:
+        return sum(ESTIMATED_BYTES.get(k, 0) * v for k, v in self.blocked.items())
+
+    def report(self):
+        total = sum(self.blocked.values())
+        if not total:
+            return
+        detail = ", ".join(f"{k}={v}" for k, v in self.blocked.most_common())
+        logger.info(
+            f"🚫 請求攔截: 共 {total} 個請求，估計節省 {self.bytes_saved / 1024 / 1024:.1f}MB | {detail}"
+        )
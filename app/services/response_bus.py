@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 23:05
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 回應事件匯流排
+
+以 URL 模式與 HTTP 方法訂閱頁面回應。只有命中訂閱的回應才讀取內容，
+同一回應的內容只讀一次並分給所有命中的處理器；處理器回傳 True 即取消訂閱，
+沒有訂閱時不掛 listener。登入、CSRF、訂單與結帳流程各自訂閱，互不為對方的流量付費。
+"""
+import asyncio
+import inspect
+import re
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, List, Literal
+from weakref import WeakKeyDictionary
+
+from loguru import logger
+from playwright.async_api import Page, Response
+
+BodyKind = Literal["json", "text"] | None
+Handler = Callable[[Response, Any], Awaitable[bool | None] | bool | None]
+
+
+@dataclass(eq=False)
+class Subscription:
+    pattern: str | re.Pattern
+    handler: Handler
+    method: str | None = None
+    body: BodyKind = "json"
+    fired: int = field(default=0, init=False)
+
+    def matches(self, url: str, method: str) -> bool:
+        if self.method and method != self.method:
+            return False
+        if isinstance(self.pattern, re.Pattern):
+            return self.pattern.search(url) is not None
+        return self.pattern in url
+
+
+class ResponseBus:
+
+    def __init__(self, page: Page):
+        self.page = page
+        self._subscriptions: List[Subscription] = []
+        self._attached = False
+
+        self.read_bodies = 0
+        self.skipped = 0
+
+    @classmethod
+    def for_page(cls, page: Page) -> "ResponseBus":
+        """每個頁面共用一個匯流排"""
+        if (bus := _buses.get(page)) is None:
+            bus = _buses[page] = cls(page)
+        return bus
+
+    def subscribe(
+        self,
+        pattern: str | re.Pattern,
+        handler: Handler,
+        *,
+        method: str | None = None,
+        body: BodyKind = "json",
+    ) -> Subscription:
+        """
+        Args:
+            pattern: URL 子字串或正規表示式
+            handler: handler(response, payload)，回傳 True 表示訊號已到、取消訂閱
+            method: 只接受指定的 HTTP 方法（例如 "POST"）
+            body: 讀取 "json" / "text" 內容後傳給處理器；None 則不讀取
+        """
+        sub = Subscription(pattern, handler, method.upper() if method else None, body)
+        self._subscriptions.append(sub)
+        if not self._attached:
+            self.page.on("response", self._on_response)
+            self._attached = True
+        return sub
+
+    def unsubscribe(self, sub: Subscription):
+        if sub in self._subscriptions:
+            self._subscriptions.remove(sub)
+        if not self._subscriptions and self._attached:
+            self.page.remove_listener("response", self._on_response)
+            self._attached = False
+
+    async def wait_for(
+        self,
+        pattern: str | re.Pattern,
+        predicate: Callable[[Any], bool] = bool,
+        *,
+        method: str | None = None,
+        body: BodyKind = "json",
+        timeout: float = 30_000,
+    ) -> Any:
+        """等待第一個符合 predicate 的回應內容，逾時拋出 asyncio.TimeoutError"""
+        future = asyncio.get_running_loop().create_future()
+
+        def _handler(response: Response, payload: Any) -> bool:
+            if future.done() or not predicate(payload):
+                return False
+            future.set_result(payload)
+            return True
+
+        sub = self.subscribe(pattern, _handler, method=method, body=body)
+        try:
+            return await asyncio.wait_for(future, timeout / 1000)
+        finally:
+            self.unsubscribe(sub)
+
+    async def _read(self, response: Response, kind: BodyKind, cache: Dict[str, Any]) -> Any:
+        if kind is None:
+            return None
+        if kind not in cache:
+            self.read_bodies += 1
+            cache[kind] = await (response.json() if kind == "json" else response.text())
+        return cache[kind]
+
+    async def _on_response(self, response: Response):
+        method = response.request.method
+        matched = [s for s in self._subscriptions if s.matches(response.url, method)]
+        if not matched:
+            self.skipped += 1
+            return
+
+        cache: Dict[str, Any] = {}
+        for sub in matched:
+            try:
+                payload = await self._read(response, sub.body, cache)
+                done = sub.handler(response, payload)
+                if inspect.isawaitable(done):
+                    done = await done
+            except Exception as err:
+                logger.debug(f"回應處理失敗: {method} {response.url} - {err!r}")
+                continue
+            sub.fired += 1
+            if done is True:
+                self.unsubscribe(sub)
+
+
+_buses: "WeakKeyDictionary[Page, ResponseBus]" = WeakKeyDictionary()
@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/19 01:10
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 失敗時才保存的執行錄製
+
+全程 1920x1080 錄影會在解驗證碼時持續編碼畫面，每次執行都寫滿磁碟。
+on_failure 模式改以 Playwright trace（截圖 + DOM 快照）分段錄製到暫存目錄，
+只保留最近 N 段；執行結果不是成功時才搬到 RECORD_DIR，否則整個丟棄。
+每次執行記錄瀏覽器程序樹的 CPU 時間與寫入量，與 always 模式的平均值比較省下多少。
+"""
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import time
+import uuid
+from collections import deque
+from contextlib import suppress
+from contextvars import ContextVar
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Deque, Dict, Set
+
+from loguru import logger
+from playwright.async_api import BrowserContext
+
+from services.browser_pool import process_tree_cpu_seconds
+from settings import RECORD_DIR, RUNTIME_DIR, settings
+
+RECORDING_OFF = "off"
+RECORDING_ON_FAILURE = "on_failure"
+RECORDING_ALWAYS = "always"
+
+
+def _tree_size(root: Path) -> int:
+    total = 0
+    with suppress(OSError):
+        for path in root.rglob("*"):
+            with suppress(OSError):
+                if path.is_file():
+                    total += path.stat().st_size
+    return total
+
+
+class RecordingStats:
+    """各錄製模式每次執行的平均 CPU 時間與磁碟寫入量"""
+
+    def __init__(self, path: Path = RUNTIME_DIR.joinpath("recording_stats.json")):
+        self.path = path
+        self.modes: Dict[str, Dict[str, Any]] = {}
+        with suppress(OSError, JSONDecodeError, TypeError, AttributeError):
+            self.modes = dict(json.loads(self.path.read_text(encoding="utf8")))
+
+    def _save(self):
+        with suppress(OSError):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(self.modes), encoding="utf8")
+            tmp.replace(self.path)
+
+    def record(self, mode: str, cpu_seconds: float | None, disk_bytes: int):
+        entry = self.modes.setdefault(mode, {"runs": 0, "avg_cpu_seconds": None, "avg_bytes": 0})
+        entry["runs"] += 1
+        # 指數移動平均，與預檢的耗時統計一致
+        if cpu_seconds is not None:
+            prev = entry["avg_cpu_seconds"]
+            entry["avg_cpu_seconds"] = round(
+                cpu_seconds if prev is None else 0.7 * prev + 0.3 * cpu_seconds, 2
+            )
+        entry["avg_bytes"] = int(0.7 * entry["avg_bytes"] + 0.3 * disk_bytes)
+        self._save()
+
+    def baseline(self) -> Dict[str, Any] | None:
+        return self.modes.get(RECORDING_ALWAYS)
+
+
+recording_stats = RecordingStats()
+
+
+class RunRecorder:
+
+    def __init__(
+        self,
+        mode: str | None = None,
+        root: Path = RECORD_DIR,
+        ring_size: int | None = None,
+        stats: RecordingStats | None = None,
+    ):
+        self.mode = mode or settings.RECORDING_MODE
+        self.root = root
+        self.ring_size = max(1, ring_size or settings.RECORDING_RING_CHUNKS)
+        self.stats = stats or recording_stats
+
+        self.run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        self._context: BrowserContext | None = None
+        self._tmp: Path | None = None
+        self._chunks: Deque[Path] = deque()
+        self._seq = 0
+        self._lock = asyncio.Lock()
+        self._discarded_bytes = 0
+        self._cpu_start: float | None = None
+        self._cpu_shared = False
+        self._record_size_start = 0
+
+    async def start(self, context: BrowserContext):
+        _current_recorder.set(self)
+        # CPU 只能按整個程序樹計算；與其他帳號的執行重疊時無法歸屬到單一帳號
+        _active_recorders.add(self)
+        if len(_active_recorders) > 1:
+            for recorder in _active_recorders:
+                recorder._cpu_shared = True
+        self._cpu_start = process_tree_cpu_seconds(os.getpid())
+        if self.mode == RECORDING_ALWAYS:
+            self._record_size_start = _tree_size(self.root)
+            return
+        if self.mode != RECORDING_ON_FAILURE:
+            return
+
+        try:
+            await context.tracing.start(screenshots=True, snapshots=True)
+        except Exception as err:
+            logger.warning(f"Failed to start trace recording: {err!r}")
+            return
+        self._context = context
+        self._tmp = Path(tempfile.mkdtemp(prefix="epic-trace-"))
+
+    async def checkpoint(self, label: str):
+        """結束目前的 trace 分段並開始新的一段，超出 ring_size 的舊分段直接刪除"""
+        # 並行分頁可能同時呼叫，分段的結束與開始必須成對
+        async with self._lock:
+            if not self._context:
+                return
+            await self._stop_chunk(label)
+            with suppress(Exception):
+                await self._context.tracing.start_chunk()
+
+    async def _stop_chunk(self, label: str):
+        self._seq += 1
+        path = self._tmp.joinpath(f"{self._seq:02d}-{label}.zip")
+        try:
+            await self._context.tracing.stop_chunk(path=path)
+        except Exception as err:
+            logger.debug(f"Failed to save trace chunk: {err!r}")
+            return
+
+        if path.exists():
+            self._chunks.append(path)
+        while len(self._chunks) > self.ring_size:
+            oldest = self._chunks.popleft()
+            with suppress(OSError):
+                self._discarded_bytes += oldest.stat().st_size
+                oldest.unlink()
+
+    async def finish(self, succeeded: bool, outcome: str) -> Path | None:
+        """
+        結束錄製；執行未成功時保存最近的 trace 分段
+
+        Args:
+            succeeded: 領取結果是否為成功（ALL_OWNED 或 SUCCESS）
+            outcome: 寫入紀錄檔的結果名稱
+
+        Returns:
+            保存 trace 的目錄，未保存時為 None
+        """
+        saved_dir, written = None, 0
+        _current_recorder.set(None)
+        _active_recorders.discard(self)
+
+        if self._context:
+            async with self._lock:
+                await self._stop_chunk("end")
+                with suppress(Exception):
+                    await self._context.tracing.stop()
+
+            if not succeeded and self._chunks:
+                saved_dir = self.root.joinpath(self.run_id)
+                with suppress(OSError):
+                    saved_dir.mkdir(parents=True, exist_ok=True)
+                    for chunk in self._chunks:
+                        written += chunk.stat().st_size
+                        shutil.move(chunk, saved_dir.joinpath(chunk.name))
+            else:
+                self._discarded_bytes += sum(c.stat().st_size for c in self._chunks if c.exists())
+            shutil.rmtree(self._tmp, ignore_errors=True)
+            self._context, self._chunks = None, deque()
+        elif self.mode == RECORDING_ALWAYS:
+            written = max(0, _tree_size(self.root) - self._record_size_start)
+
+        cpu = None
+        if self._cpu_start is not None and not self._cpu_shared:
+            cpu_end = process_tree_cpu_seconds(os.getpid())
+            cpu = max(0.0, cpu_end - self._cpu_start) if cpu_end is not None else None
+        self.stats.record(self.mode, cpu, written)
+        self.report(outcome, cpu, written, saved_dir)
+        return saved_dir
+
+    def report(self, outcome: str, cpu: float | None, written: int, saved_dir: Path | None):
+        cpu_text = f"{cpu:.1f}s" if cpu is not None else "-"
+        line = (
+            f"🎥 錄製 [{self.mode}] 結果={outcome} | 瀏覽器 CPU {cpu_text}"
+            f" | 寫入 {written / 1024 / 1024:.1f}MB | 丟棄暫存 {self._discarded_bytes / 1024 / 1024:.1f}MB"
+        )
+        baseline = self.stats.baseline()
+        if self.mode != RECORDING_ALWAYS and baseline:
+            # 與 always 模式的平均值比較
+            saved_bytes = max(0, baseline["avg_bytes"] - written)
+            line += f" | 相較全程錄影省下磁碟 {saved_bytes / 1024 / 1024:.1f}MB"
+            if cpu is not None and baseline.get("avg_cpu_seconds") is not None:
+                line += f"、CPU {baseline['avg_cpu_seconds'] - cpu:.1f}s"
+        if saved_dir:
+            line += f" | trace 已保存: {saved_dir}"
+        logger.info(line)
+
+
+_active_recorders: Set[RunRecorder] = set()
+_current_recorder: ContextVar[RunRecorder | None] = ContextVar("run_recorder", default=None)
+
+
+async def recording_checkpoint(label: str):
+    """在領取流程的階段邊界切分 trace；未在錄製時不做任何事"""
+    if recorder := _current_recorder.get():
+        await recorder.checkpoint(label)
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""
+@Time    : 2026/10/18 23:40
+@Author  : QIN2DIM
+@GitHub  : https://github.com/QIN2DIM
+@Desc    : 登入狀態快照與輕量驗證
+
+登入成功後將 Epic 網域的 Cookie 與 localStorage 匯出為每個帳號一份的 storage_state.json。
+之後的執行先以 Cookie 到期時間、再以一次已驗證的 API 請求確認登入狀態，
+不必為了讀取 egs-navigation[isloggedin] 整頁載入商店頁。
+"""
+import json
+import time
+from contextlib import suppress
+from json import JSONDecodeError
+from pathlib import Path
+from typing import Any, Dict
+
+from loguru import logger
+from playwright.async_api import BrowserContext
+
+STORAGE_STATE_FILENAME = "storage_state.json"
+
+# 以 sid 判斷是否登入：未登入時 sid 為 null
+URL_SESSION_PROBE = "https://www.epicgames.com/id/api/redirect"
+
+EPIC_DOMAIN_SUFFIX = "epicgames.com"
+AUTH_COOKIE_NAMES = ("EPIC_EG1", "EPIC_SSO", "EPIC_SSO_RM", "EPIC_SESSION_AP")
+
+
+def _is_epic(host_or_origin: str) -> bool:
+    return EPIC_DOMAIN_SUFFIX in (host_or_origin or "")
+
+
+def compact_storage_state(state: Dict[str, Any]) -> Dict[str, Any]:
+    """只保留 Epic 網域的 Cookie 與 localStorage"""
+    return {
+        "cookies": [c for c in state.get("cookies", []) if _is_epic(c.get("domain", ""))],
+        "origins": [o for o in state.get("origins", []) if _is_epic(o.get("origin", ""))],
+    }
+
+
+def auth_cookies_alive(state: Dict[str, Any], now: float | None = None) -> bool:
+    """任一登入 Cookie 尚未過期（expires == -1 為工作階段 Cookie，視為有效）"""
+    now = now or time.time()
+    for cookie in state.get("cookies", []):
+        if cookie.get("name") not in AUTH_COOKIE_NAMES:
+            continue
+        expires = cookie.get("expires", -1)
+        if expires == -1 or expires > now:
+            return True
+    return False
+
+
+class SessionStore:
+
+    def __init__(self, path: Path):
+        self.path = path
+
+    @classmethod
+    def for_account(cls, user_data_dir: Path) -> "SessionStore":
+        return cls(user_data_dir.joinpath(STORAGE_STATE_FILENAME))
+
+    def load(self) -> Dict[str, Any] | None:
+        with suppress(OSError, JSONDecodeError):
+            return json.loads(self.path.read_text(encoding="utf8"))
+        return None
+
+    async def save(self, context: BrowserContext):
+        state = compact_storage_state(await context.storage_state())
+        with suppress(OSError):
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(state, separators=(",", ":")), encoding="utf8")
+            tmp.replace(self.path)
+        logger.debug(f"Session snapshot saved: {len(state['cookies'])} cookies")
+
+    async def probe(self, context: BrowserContext) -> bool:
+        """
+        確認 context 目前的登入狀態是否有效
+
+        1. 快照中沒有未過期的登入 Cookie：直接判定無效，不發出請求
+        2. 以 context 的 Cookie 發出一次 API 請求，依回應的 sid 判定
+        """
+        snapshot = self.load()
+        if snapshot is not None and not auth_cookies_alive(snapshot):
+            logger.debug("Session snapshot expired")
+            return False
+
+        try:
+            response = await context.request.get(URL_SESSION_PROBE, timeout=10_000)
+            if not response.ok:
+                return False
+            return bool((await response.json()).get("sid"))
+        except Exception as err:
+            logger.debug(f"Session probe failed: {err!r}")
+            return False
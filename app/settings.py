@@ -3,10 +3,11 @@ import os
 import sys
 import asyncio
 from pathlib import Path
+from typing import Dict, List, Literal
 
 # === 引入所需库 ===
 from hcaptcha_challenger.agent import AgentConfig
-from pydantic import Field, SecretStr
+from pydantic import Field, SecretStr, model_validator
 from pydantic_settings import SettingsConfigDict
 from loguru import logger
 
@@ -19,6 +20,7 @@ RUNTIME_DIR = VOLUMES_DIR.joinpath("runtime")
 SCREENSHOTS_DIR = VOLUMES_DIR.joinpath("screenshots")
 RECORD_DIR = VOLUMES_DIR.joinpath("record")
 HCAPTCHA_DIR = VOLUMES_DIR.joinpath("hcaptcha")
+DIAGNOSTICS_DIR = VOLUMES_DIR.joinpath("diagnostics")
 
 # === 配置类定义 ===
 class EpicSettings(AgentConfig):
@@ -46,8 +48,13 @@ class EpicSettings(AgentConfig):
     SPATIAL_POINT_REASONER_MODEL: str = Field(default=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
     SPATIAL_PATH_REASONER_MODEL: str = Field(default=os.getenv("GEMINI_MODEL", "gemini-2.5-flash"))
 
-    EPIC_EMAIL: str = Field(default_factory=lambda: os.getenv("EPIC_EMAIL"))
-    EPIC_PASSWORD: SecretStr = Field(default_factory=lambda: os.getenv("EPIC_PASSWORD"))
+    EPIC_EMAIL: str | None = Field(default_factory=lambda: os.getenv("EPIC_EMAIL"))
+    EPIC_PASSWORD: SecretStr | None = Field(default_factory=lambda: os.getenv("EPIC_PASSWORD"))
+    EPIC_ACCOUNTS_FILE: Path | None = Field(
+        default=None,
+        description="多帳號模式：每行一組 email:password 的帳號清單，設定後取代 EPIC_EMAIL/EPIC_PASSWORD",
+    )
+    ACCOUNT_CONCURRENCY: int = Field(default=2, description="多帳號模式下同時領取的帳號數上限")
     DISABLE_BEZIER_TRAJECTORY: bool = Field(default=True)
 
     cache_dir: Path = HCAPTCHA_DIR.joinpath(".cache")
@@ -55,15 +62,106 @@ class EpicSettings(AgentConfig):
     captcha_response_dir: Path = HCAPTCHA_DIR.joinpath(".captcha")
 
     ENABLE_APSCHEDULER: bool = Field(default=True)
+    SCHEDULER_DAILY_TIME: str = Field(
+        default="12:00", description="每日保底檢查時間（Asia/Shanghai），促銷未變化時不啟動瀏覽器"
+    )
+    SCHEDULER_JITTER_SECONDS: int = Field(
+        default=600, description="促銷邊界後延遲執行的隨機抖動上限（秒）"
+    )
+    BROWSER_POOL_ENABLED: bool = Field(
+        default=False, description="排程常駐時保留一個已啟動的瀏覽器，在多次執行之間重複使用"
+    )
+    BROWSER_POOL_MAX_RUNS: int = Field(default=20, description="常駐瀏覽器執行幾次後重新啟動")
+    BROWSER_POOL_MAX_RSS_MB: int = Field(
+        default=1500,
+        description="本程序（os.getpid()）整個子程序樹的 RSS 超過此值（MB）時重新啟動瀏覽器；"
+        "同一程序內其他瀏覽器與子程序的記憶體也會計入",
+    )
+    PROFILE_MAINTENANCE_ENABLED: bool = Field(
+        default=True, description="每次啟動瀏覽器前整理持久化設定檔，清除快取與崩潰報告等可重建資料"
+    )
+    PROFILE_SIZE_BUDGET_MB: int = Field(
+        default=300, description="設定檔容量預算（MB），超出時依序清除快取、網站資料與瀏覽紀錄；Cookie 與登入狀態一律保留"
+    )
     TASK_TIMEOUT_SECONDS: int = Field(default=900)
     # 调高超时限制，防止下单重载导致 Timeout
     EXECUTION_TIMEOUT: float = Field(default=240.0) 
     RESPONSE_TIMEOUT: float = Field(default=60.0)
 
+    PROMOTIONS_LOCALE: str = Field(default="zh-CN", description="週免促銷資料的語系，同時作為磁碟快取的鍵")
+    PROMOTIONS_CACHE_TTL_SECONDS: int = Field(
+        default=600, description="促銷資料磁碟快取的有效秒數，過期後以 ETag/Last-Modified 重新驗證"
+    )
+    PROMOTIONS_DEBUG_DUMP: bool = Field(
+        default=False, description="是否將原始促銷資料格式化輸出到 runtime/promotions.json"
+    )
+
+    CLAIM_TAB_CONCURRENCY: int = Field(
+        default=1, description="同時開啟的商品頁分頁數；大於 1 時並行領取，驗證碼仍依序解決"
+    )
+
+    REQUEST_BLOCKING_ENABLED: bool = Field(
+        default=False,
+        description="依頁面類型攔截影片、圖片、字型與分析腳本；結帳 iframe 與 hCaptcha 一律放行。"
+        "攔截所有請求會停用 context 的 HTTP 快取，已快取的 JS/CSS 會重新下載，預設關閉",
+    )
+    REQUEST_BLOCKING_RULES: Dict[str, List[str]] = Field(
+        default_factory=dict,
+        description='覆寫各頁面類型要攔截的資源類型，例如 {"product": ["media", "image"], "cart": []}',
+    )
+
+    DIAGNOSTICS_MAX_MB: int = Field(
+        default=200, description="失敗診斷資料（HTML、frame 樹、截圖）的磁碟總量上限（MB）"
+    )
+    DIAGNOSTICS_MAX_AGE_DAYS: int = Field(default=7, description="失敗診斷資料保留天數")
+
+    RECORDING_MODE: Literal["off", "on_failure", "always"] = Field(
+        default="on_failure",
+        description="off：不錄製；on_failure：暫存 Playwright trace，僅在領取失敗時保存；always：全程 1920x1080 錄影",
+    )
+    RECORDING_RING_CHUNKS: int = Field(
+        default=3, description="on_failure 模式下暫存的 trace 分段數，只保留失敗前最近的幾個階段"
+    )
+
     REDIS_URL: str = Field(default="redis://redis:6379/0")
+    CELERY_BROKER_URL: str | None = Field(
+        default=None, description="Celery broker，未設定時使用 REDIS_URL；測試可用 memory://"
+    )
+    CELERY_RESULT_BACKEND: str | None = Field(
+        default=None, description="Celery 結果後端，未設定時使用 REDIS_URL；測試可用 cache+memory://"
+    )
     CELERY_WORKER_CONCURRENCY: int = Field(default=1)
     CELERY_TASK_TIME_LIMIT: int = Field(default=1200)
     CELERY_TASK_SOFT_TIME_LIMIT: int = Field(default=900)
+    CELERY_PROMOTIONS_TIME_LIMIT: int = Field(
+        default=180, description="促銷與擁有狀態檢查任務的時間上限（秒），不啟動瀏覽器"
+    )
+    CELERY_RESULT_EXPIRES: int = Field(default=86400, description="任務結果在後端保留的秒數")
+    PROFILE_AFFINITY_ENABLED: bool = Field(
+        default=False, description="多節點部署：帳號的領取任務固定送到持有其設定檔的 worker"
+    )
+    WORKER_NODE_NAME: str | None = Field(
+        default=None, description="worker 在節點註冊表中的名稱，預設為主機名稱；需在重新部署後保持不變"
+    )
+    WORKER_HEARTBEAT_TTL: int = Field(
+        default=90, description="超過此秒數未送出心跳的 worker 視為已離開，其帳號重新指派"
+    )
+    NODE_CLAIM_EXPIRES: int = Field(
+        default=4 * 3600,
+        description="送到節點專屬佇列的領取任務在此秒數內未被消費即作廢；需短於排程間隔（5 小時），"
+        "並留足同一節點排隊領取的時間。節點離開後由下一次檢查重新指派",
+    )
+
+    @model_validator(mode="after")
+    def _require_account(self):
+        # 多帳號模式只需要帳號清單，不必再設一組 EPIC_EMAIL/EPIC_PASSWORD
+        if not self.EPIC_ACCOUNTS_FILE and not (self.EPIC_EMAIL and self.EPIC_PASSWORD):
+            raise ValueError("EPIC_EMAIL and EPIC_PASSWORD are required unless EPIC_ACCOUNTS_FILE is set")
+        return self
+
+    def for_account(self, email: str, password: str) -> "EpicSettings":
+        """複製目前的設定並替換帳號；user_data_dir 依 email 隨之切換"""
+        return self.model_copy(update={"EPIC_EMAIL": email, "EPIC_PASSWORD": SecretStr(password)})
 
     @property
     def user_data_dir(self) -> Path:
@@ -166,3 +166,24 @@ def init_log(**sink_channel):
         )
 
     return logger
+
+
+def add_account_sink(account: str, log_dir: Path) -> int:
+    """
+    多帳號模式：為單一帳號新增獨立的執行時紀錄檔
+
+    只接收以 logger.contextualize(account=...) 標記的紀錄，回傳 sink id 供結束時移除
+    """
+    log_dir.mkdir(parents=True, exist_ok=True)
+    date_str = datetime.now(ZoneInfo("Asia/Taipei")).strftime("%Y-%m-%d")
+
+    return logger.add(
+        sink=str(log_dir / f"runtime-{date_str}.log"),
+        level="DEBUG",
+        rotation="00:00",
+        filter=lambda record: record["extra"].get("account") == account
+        and timezone_filter(record),
+        retention="7 days",
+        format="{time:YYYY-MM-DD HH:mm:ss} | {level: <8} | {name}:{function}:{line} | {message}",
+        encoding="utf-8",
+    )
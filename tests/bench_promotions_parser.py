@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+# Description: Micro-benchmark for the promotions parser on synthetic catalogs
+#
+#   PYTHONPATH=app python tests/bench_promotions_parser.py --elements 10000 50000 --accounts 30
+
+import argparse
+import json
+import random
+import time
+from contextlib import suppress
+from typing import Any, Callable, Dict, List
+
+from models import PromotionGame
+from services.epic_promotions_service import parse_promotions, URL_PRODUCT_PAGE
+
+
+def make_catalog(n_elements: int, free_ratio: float = 0.001, seed: int = 42) -> Dict[str, Any]:
+    """Build a freeGamesPromotions-shaped payload with `n_elements` offers."""
+    rnd = random.Random(seed)
+    elements = []
+    for i in range(n_elements):
+        is_free = rnd.random() < free_ratio or i == 0
+        discount = 0 if is_free else rnd.choice([10, 25, 50, 75])
+        elements.append(
+            {
+                "title": f"Synthetic Game {i}",
+                "id": f"{i:032x}",
+                "namespace": f"{i * 7919:032x}",
+                "description": "Lorem ipsum dolor sit amet " * 8,
+                "effectiveDate": "2026-10-15T15:00:00.000Z",
+                "offerType": rnd.choice(["BASE_GAME", "BUNDLE", "ADD_ON"]),
+                "expiryDate": None,
+                "status": "ACTIVE",
+                "isCodeRedemptionOnly": False,
+                "keyImages": [
+                    {"type": t, "url": f"https://cdn1.epicgames.com/{i}/{t}.jpg"}
+                    for t in ("OfferImageWide", "OfferImageTall", "Thumbnail", "DieselStoreFrontWide")
+                ],
+                "seller": {"id": f"o-{i}", "name": "Synthetic Seller"},
+                "productSlug": None,
+                "urlSlug": f"synthetic-game-{i}",
+                "url": None,
+                "items": [{"id": f"{i:032x}", "namespace": f"{i * 7919:032x}"}],
+                "customAttributes": [{"key": "com.epicgames.app.blacklist", "value": "[]"}],
+                "categories": [{"path": "freegames"}, {"path": "games"}, {"path": "applications"}],
+                "tags": [{"id": str(t)} for t in range(6)],
+                "catalogNs": {"mappings": [{"pageSlug": f"synthetic-game-{i}", "pageType": "productHome"}]},
+                "offerMappings": [{"pageSlug": f"synthetic-game-{i}", "pageType": "productHome"}],
+                "price": {
+                    "totalPrice": {
+                        "discountPrice": 0 if is_free else 1999,
+                        "originalPrice": 1999,
+                        "currencyCode": "USD",
+                    }
+                },
+                "promotions": {
+                    "promotionalOffers": [
+                        {
+                            "promotionalOffers": [
+                                {
+                                    "startDate": "2026-10-15T15:00:00.000Z",
+                                    "endDate": "2026-10-22T15:00:00.000Z",
+                                    "discountSetting": {
+                                        "discountType": "PERCENTAGE",
+                                        "discountPercentage": discount,
+                                    },
+                                }
+                            ]
+                        }
+                    ],
+                    "upcomingPromotionalOffers": [],
+                },
+            }
+        )
+    return {"data": {"Catalog": {"searchStore": {"elements": elements}}}}
+
+
+def legacy_parse(raw: bytes) -> List[PromotionGame]:
+    """The previous get_promotions() body: full decode, pretty dump, full validation."""
+    data = json.loads(raw)
+    json.dumps(data, indent=2, ensure_ascii=False)
+
+    promotions = []
+    for e in data["data"]["Catalog"]["searchStore"]["elements"]:
+        is_free = False
+        with suppress(KeyError, IndexError, TypeError):
+            offers = e["promotions"]["promotionalOffers"][0]["promotionalOffers"]
+            is_free = any(o["discountSetting"]["discountPercentage"] == 0 for o in offers)
+        if not is_free:
+            continue
+        e["url"] = f"{URL_PRODUCT_PAGE.rstrip('/')}/{e['offerMappings'][0]['pageSlug']}"
+        e["description"] = e.get("description", "")
+        promotions.append(PromotionGame(**e))
+    return promotions
+
+
+def lean_parse(raw: bytes) -> List[PromotionGame]:
+    return parse_promotions(json.loads(raw))
+
+
+def _timeit(fn: Callable[[bytes], Any], raw: bytes, rounds: int) -> float:
+    best = float("inf")
+    for _ in range(rounds):
+        start = time.perf_counter()
+        fn(raw)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--elements", type=int, nargs="+", default=[10_000, 50_000])
+    parser.add_argument("--accounts", type=int, default=1)
+    parser.add_argument("--rounds", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'elements':>10} {'payload':>10} {'legacy':>10} {'lean':>10} {'speedup':>8} {'saved/run':>12}")
+    for n in args.elements:
+        raw = json.dumps(make_catalog(n)).encode()
+        legacy = _timeit(legacy_parse, raw, args.rounds)
+        lean = _timeit(lean_parse, raw, args.rounds)
+        saved = (legacy - lean) * args.accounts
+        print(
+            f"{n:>10} {len(raw) / 1024 / 1024:>8.1f}MB {legacy * 1000:>8.1f}ms {lean * 1000:>8.1f}ms "
+            f"{legacy / lean:>7.1f}x {saved * 1000:>10.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
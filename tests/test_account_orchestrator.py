@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+from loguru import logger
+from pydantic import ValidationError
+
+from services import account_orchestrator
+from services.account_orchestrator import (
+    AccountResult,
+    format_result_table,
+    load_accounts,
+    run_accounts,
+)
+from services.epic_games_service import GameCollectResult
+from settings import EpicSettings, settings
+
+
+def load_accounts_from(tmp_path, emails):
+    path = tmp_path / "accounts.txt"
+    path.write_text("".join(f"{e}:pw\n" for e in emails), encoding="utf8")
+    return load_accounts(path)
+
+
+def test_load_accounts_skips_comments_malformed_and_duplicates(tmp_path):
+    path = tmp_path / "accounts.txt"
+    path.write_text(
+        "# team accounts\n"
+        "a@example.com:pa:ss\n"
+        "\n"
+        "broken-line\n"
+        "b@example.com:secret\n"
+        "a@example.com:other\n",
+        encoding="utf8",
+    )
+
+    accounts = load_accounts(path)
+
+    assert [a.email for a in accounts] == ["a@example.com", "b@example.com"]
+    assert accounts[0].password.get_secret_value() == "pa:ss"
+    assert "pa:ss" not in repr(accounts[0])
+
+
+def test_run_accounts_is_bounded_isolated_and_ordered(tmp_path, monkeypatch):
+    monkeypatch.setattr(account_orchestrator, "LOG_DIR", tmp_path)
+    accounts = load_accounts_from(tmp_path, ["a@x.com", "b@x.com", "c@x.com"])
+    active, peak = 0, 0
+
+    async def runner(config):
+        nonlocal active, peak
+        active += 1
+        peak = max(peak, active)
+        logger.info(f"claiming for {config.EPIC_EMAIL}")
+        await asyncio.sleep(0.01)
+        active -= 1
+        if config.EPIC_EMAIL == "b@x.com":
+            raise RuntimeError("boom")
+        assert config.EPIC_PASSWORD.get_secret_value() == "pw"
+        return GameCollectResult.SUCCESS
+
+    results = asyncio.run(run_accounts(accounts, runner, concurrency=2))
+
+    assert peak == 2
+    assert [r.email for r in results] == ["a@x.com", "b@x.com", "c@x.com"]
+    assert [r.ok for r in results] == [True, False, True]
+    assert "boom" in results[1].error
+    # 全域設定不受影響
+    assert settings.EPIC_EMAIL not in {"a@x.com", "b@x.com", "c@x.com"}
+
+    # 每個帳號的紀錄檔只包含自己的紀錄
+    log = next((tmp_path / "accounts" / "a@x.com").glob("runtime-*.log")).read_text()
+    assert "claiming for a@x.com" in log
+    assert "b@x.com" not in log
+
+
+def test_format_result_table():
+    table = format_result_table(
+        [
+            AccountResult("a@x.com", GameCollectResult.ALL_OWNED, 1.25),
+            AccountResult("long-name@x.com", None, 3.0, error="RuntimeError('boom')"),
+        ]
+    )
+    lines = table.splitlines()
+
+    assert lines[0].split(" | ")[:2] == ["Account        ", "Result   "]
+    assert "all_owned" in lines[2] and "1.2s" in lines[2]
+    assert "crashed" in lines[3] and "boom" in lines[3]
+    assert lines[-1] == "1/2 accounts succeeded"
+
+
+def test_accounts_file_replaces_single_account(tmp_path, monkeypatch):
+    monkeypatch.delenv("EPIC_EMAIL", raising=False)
+    monkeypatch.delenv("EPIC_PASSWORD", raising=False)
+
+    with pytest.raises(ValidationError):
+        EpicSettings(_env_file=None)
+
+    config = EpicSettings(_env_file=None, EPIC_ACCOUNTS_FILE=tmp_path / "accounts.txt")
+    assert config.EPIC_EMAIL is None
@@ -0,0 +1,48 @@
+import asyncio
+
+from services.epic_authorization_service import EpicAuthorization
+
+
+class FakeLocator:
+    def __init__(self, page, selector):
+        self.page = page
+        self.selector = selector
+
+    async def wait_for(self, state="visible", timeout=None):
+        delay = self.page.appear_after.get(self.selector)
+        if delay is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(delay)
+
+    async def click(self, timeout=None):
+        self.page.clicked.append(self.selector)
+
+
+class FakePage:
+    def __init__(self, appear_after):
+        self.appear_after = appear_after
+        self.clicked = []
+
+    async def goto(self, url, wait_until=None):
+        return None
+
+    def locator(self, selector):
+        return FakeLocator(self, selector)
+
+
+def test_prompts_are_watched_concurrently_until_csrf():
+    page = FakePage({"#yes": 0.01, "#link-success": 0.02})
+    auth = EpicAuthorization(page)
+
+    async def main():
+        async def csrf_later():
+            await asyncio.sleep(0.05)
+            auth._is_refresh_csrf_signal.put_nowait({"success": True})
+
+        asyncio.get_running_loop().create_task(csrf_later())
+        await asyncio.wait_for(auth._handle_right_account_validation(), timeout=1)
+
+    asyncio.run(main())
+
+    assert page.clicked == ["#yes", "#link-success"]
+    assert not auth._is_refresh_csrf_signal.empty()
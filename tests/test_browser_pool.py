@@ -0,0 +1,100 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+from services.browser_pool import BrowserPool, _process_tree, _process_tree_rss_mb
+
+
+class FakePage:
+    def __init__(self, context):
+        self.context = context
+        self.closed = False
+
+    async def evaluate(self, expression):
+        if self.context.broken:
+            raise RuntimeError("Target closed")
+        return 2
+
+    async def close(self):
+        self.closed = True
+        if self in self.context.pages:
+            self.context.pages.remove(self)
+
+    async def goto(self, url):
+        self.url = url
+
+
+class FakeContext:
+    def __init__(self):
+        self.pages = []
+        self.broken = False
+
+    async def new_page(self):
+        page = FakePage(self)
+        self.pages.append(page)
+        return page
+
+    async def close(self):
+        pass
+
+
+def _pool(max_runs=3):
+    pool = BrowserPool(headless=True, max_runs=max_runs, max_rss_mb=10**6)
+    launches = []
+
+    async def fake_launch():
+        pool._browser = FakeContext()
+        pool._runs = 0
+        launches.append(pool._browser)
+        return pool._browser
+
+    pool._launch = fake_launch
+    return pool, launches
+
+
+def test_pool_reuses_healthy_browser_and_recycles_after_max_runs():
+    pool, launches = _pool(max_runs=2)
+
+    async def main():
+        for _ in range(3):
+            browser = await pool.acquire()
+            await browser.new_page()
+            await pool.release()
+
+    asyncio.run(main())
+
+    assert len(launches) == 2
+    assert len(pool.cold_starts) == 2 and len(pool.warm_starts) == 1
+
+
+def test_pool_relaunches_unhealthy_browser():
+    pool, launches = _pool()
+
+    async def main():
+        await pool.acquire()
+        await pool.release()
+        launches[0].broken = True
+        await pool.acquire()
+        await pool.release()
+
+    asyncio.run(main())
+    assert len(launches) == 2 and not pool.warm_starts
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="requires /proc")
+def test_process_tree_rss_is_measured_for_children():
+    before = _process_tree_rss_mb(os.getpid())
+
+    child = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(5)"])
+    try:
+        time.sleep(0.3)
+        assert Path(f"/proc/{child.pid}") in _process_tree(os.getpid())
+        assert _process_tree_rss_mb(os.getpid()) - before > 1
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,120 @@
+import pytest
+from pydantic import SecretStr
+
+from extensions.ext_celery import (
+    QUEUE_CLAIM,
+    QUEUE_PROMOTIONS,
+    ROUTING_KEY_CLAIM,
+    TASK_CHECK_PROMOTIONS,
+    TASK_CLAIM_ACCOUNT,
+    ext_celery_app,
+    init_app,
+)
+from schedule import collect_epic_games_task as tasks
+from services.account_orchestrator import EpicAccount
+from services.preflight import PreflightResult
+
+
+@pytest.fixture
+def memory_app(monkeypatch):
+    """在記憶體 broker 與結果後端上同步執行任務"""
+    overrides = {
+        "broker_url": "memory://",
+        "result_backend": "cache+memory://",
+        "task_always_eager": True,
+        "task_store_eager_result": True,
+    }
+    conf = ext_celery_app.conf
+    saved = {key: conf[key] for key in overrides}
+    conf.update(overrides)
+    # 結果後端在第一次使用時依設定建立並快取在 thread local，前後都要重建
+    vars(ext_celery_app._local).pop("backend", None)
+    # 已綁定的任務在綁定時就讀取了 store_eager_result
+    for task in (tasks.check_promotions_task, tasks.claim_account_task):
+        monkeypatch.setattr(task, "store_eager_result", True)
+    yield ext_celery_app
+    conf.update(saved)
+    vars(ext_celery_app._local).pop("backend", None)
+
+
+def _accounts(monkeypatch, tmp_path, preflights):
+    accounts = [EpicAccount(email, SecretStr("pw")) for email in preflights]
+    # user_data_dir 會建立設定檔目錄，不要寫進專案的 volumes
+    monkeypatch.setattr("settings.USER_DATA_DIR", tmp_path)
+    monkeypatch.setattr(tasks, "all_accounts", lambda: accounts)
+
+    async def fake_fetch(max_age=None):
+        return {"data": "promotions"}
+
+    async def fake_preflight(user_data_dir, data=None, max_age=None):
+        assert data == {"data": "promotions"}
+        should_launch, reason = preflights[user_data_dir.name]
+        return PreflightResult(should_launch, reason, [], 0.01)
+
+    monkeypatch.setattr(tasks.promotions_client, "fetch", fake_fetch)
+    monkeypatch.setattr(tasks, "run_preflight", fake_preflight)
+    monkeypatch.setattr(tasks.preflight_stats, "_save", lambda: None)
+
+
+def test_init_app_uses_explicit_urls_and_fixed_crontab():
+    app = init_app("memory://", "cache+memory://")
+
+    assert app.conf.broker_url == "memory://"
+    assert app.conf.result_backend == "cache+memory://"
+    schedule = app.conf.beat_schedule["epic_check_promotions"]
+    assert schedule["task"] == TASK_CHECK_PROMOTIONS
+    assert schedule["schedule"].hour == set(range(0, 24, 5))
+    assert schedule["schedule"].minute == {1}
+
+
+def test_tasks_are_registered_and_routed():
+    assert {TASK_CHECK_PROMOTIONS, TASK_CLAIM_ACCOUNT} <= set(ext_celery_app.tasks.keys())
+
+    router = ext_celery_app.amqp.router
+    assert router.route({}, TASK_CHECK_PROMOTIONS)["queue"].name == QUEUE_PROMOTIONS
+    route = router.route({}, TASK_CLAIM_ACCOUNT)
+    assert route["queue"].name == QUEUE_CLAIM
+    assert route["routing_key"] == ROUTING_KEY_CLAIM
+
+    claim = ext_celery_app.tasks[TASK_CLAIM_ACCOUNT]
+    assert claim.time_limit > ext_celery_app.tasks[TASK_CHECK_PROMOTIONS].time_limit
+
+
+def test_check_promotions_fans_out_only_claimable_accounts(memory_app, monkeypatch, tmp_path):
+    _accounts(
+        monkeypatch,
+        tmp_path,
+        {
+            "owned@x.com": (False, "all_owned"),
+            "new@x.com": (True, "unowned"),
+            "fresh@x.com": (True, "index_not_synced"),
+        },
+    )
+    claimed = []
+
+    async def fake_claim(email, preflight=False):
+        claimed.append(email)
+        return {"email": email, "result": "success", "elapsed": 1.0}
+
+    monkeypatch.setattr(tasks, "claim_account", fake_claim)
+    monkeypatch.setattr(tasks, "add_account_sink", lambda *args: tasks.logger.add(lambda m: None))
+
+    result = tasks.check_promotions_task.delay()
+
+    summary = result.get(timeout=5)
+    assert summary["dispatched"] == ["new@x.com", "fresh@x.com"]
+    assert summary["skipped"] == {"owned@x.com": "all_owned"}
+    assert claimed == ["new@x.com", "fresh@x.com"]
+    # 結果存入後端，可用 task id 取回
+    assert memory_app.AsyncResult(result.id).get(timeout=5) == summary
+
+
+def test_claim_account_rejects_unknown_account(memory_app, monkeypatch):
+    monkeypatch.setattr(tasks, "account_settings", lambda email: None)
+    monkeypatch.setattr(tasks, "add_account_sink", lambda *args: tasks.logger.add(lambda m: None))
+
+    result = tasks.claim_account_task.delay("ghost@x.com")
+
+    assert result.failed()
+    with pytest.raises(ValueError):
+        result.get(timeout=5)
@@ -0,0 +1,159 @@
+import asyncio
+
+from loguru import logger
+from playwright.async_api import TimeoutError
+
+from services import epic_games_service
+from services.checkout_fingerprint import (
+    FLOW_CART,
+    PAGE_PATTERN,
+    VARIANT_CONFIRM,
+    VARIANT_PAGE_OVERLAY,
+    VARIANT_PURCHASE_IFRAME,
+    CheckoutFingerprintCache,
+    classify_checkout_variant,
+    find_container,
+)
+from services.epic_games_service import EpicGames
+
+PURCHASE = "https://www.epicgames.com/store/purchase?offers=1-abc"
+
+
+class FakeFrame:
+    def __init__(self, url):
+        self.url = url
+
+    def is_detached(self):
+        return False
+
+
+class FakePage:
+    def __init__(self, *urls):
+        self.main_frame = FakeFrame("https://store.epicgames.com/en-US/cart")
+        self.frames = [self.main_frame, *(FakeFrame(u) for u in urls)]
+
+
+def test_variant_and_container_follow_the_frame_tree():
+    page = FakePage("https://www.googletagmanager.com/ns.html", PURCHASE)
+
+    assert classify_checkout_variant(page) == VARIANT_PURCHASE_IFRAME
+    assert classify_checkout_variant(FakePage()) == VARIANT_PAGE_OVERLAY
+
+    label, container = find_container(page, "www.epicgames.com/store/purchase")
+    assert container is page.frames[2] and label.startswith("frame[2]")
+    assert find_container(page, PAGE_PATTERN) == ("page", page)
+    assert find_container(page, "www.epicgames.com/other") is None
+
+
+def test_learn_keeps_counters_for_the_same_path(tmp_path):
+    cache = CheckoutFingerprintCache(tmp_path / "fp.json")
+    cache.learn(FLOW_CART, VARIANT_CONFIRM, handler="payment_confirm")
+    cache.record_hit(FLOW_CART, VARIANT_CONFIRM)
+    cache.record_miss(FLOW_CART, VARIANT_CONFIRM)
+
+    cache.learn(FLOW_CART, VARIANT_CONFIRM, handler="payment_confirm")
+    entry = CheckoutFingerprintCache(tmp_path / "fp.json").lookup(FLOW_CART, VARIANT_CONFIRM)
+    assert (entry["hits"], entry["misses"]) == (1, 1)
+
+    cache.learn(FLOW_CART, VARIANT_CONFIRM, handler="payment_button")
+    entry = cache.lookup(FLOW_CART, VARIANT_CONFIRM)
+    assert (entry["handler"], entry["hits"], entry["misses"]) == ("payment_button", 0, 0)
+
+
+def test_report_shows_the_run_hit_rate(tmp_path):
+    cache = CheckoutFingerprintCache(tmp_path / "fp.json")
+    messages = []
+    sink = logger.add(messages.append, format="{message}")
+    try:
+        cache.begin_run()
+        cache.report()
+        cache.learn(FLOW_CART, VARIANT_CONFIRM, handler="payment_confirm")
+        cache.lookup(FLOW_CART, VARIANT_CONFIRM)
+        cache.record_hit(FLOW_CART, VARIANT_CONFIRM)
+        cache.lookup(FLOW_CART, VARIANT_CONFIRM)
+        cache.report()
+    finally:
+        logger.remove(sink)
+
+    reports = [m for m in messages if "命中率" in m]
+    assert len(reports) == 1 and "1/2 (50%)" in reports[0]
+
+
+def test_run_hit_rate_is_kept_per_task(tmp_path):
+    cache = CheckoutFingerprintCache(tmp_path / "fp.json")
+    cache.learn(FLOW_CART, VARIANT_CONFIRM, handler="payment_confirm")
+
+    async def run(hit):
+        cache.begin_run()
+        cache.lookup(FLOW_CART, VARIANT_CONFIRM)
+        await asyncio.sleep(0)
+        if hit:
+            cache.record_hit(FLOW_CART, VARIANT_CONFIRM)
+        await asyncio.sleep(0)
+        return cache._run.get()
+
+    async def main():
+        return await asyncio.gather(run(True), run(False))
+
+    hit, miss = asyncio.run(main())
+    assert (hit.hits, hit.lookups) == (1, 1)
+    assert (miss.hits, miss.lookups) == (0, 1)
+
+
+class FakeButton:
+    def __init__(self, present=True):
+        self.present = present
+        self.clicks = 0
+
+    async def is_enabled(self, timeout=None):
+        if not self.present:
+            raise TimeoutError("not found")
+        return True
+
+    async def click(self):
+        self.clicks += 1
+
+
+class FakeWpc:
+    def __init__(self, accept):
+        self.accept = accept
+
+    def locator(self, selector):
+        assert "payment-confirm__btn" in selector
+        return self.accept
+
+
+def _confirm(monkeypatch, tmp_path, accept, handler=None):
+    cache = CheckoutFingerprintCache(tmp_path / "fp.json")
+    if handler:
+        cache.learn(FLOW_CART, VARIANT_CONFIRM, handler=handler)
+    monkeypatch.setattr(epic_games_service, "checkout_fingerprints", cache)
+    payment_btn = FakeButton()
+    ok = asyncio.run(EpicGames(None)._confirm_order(FakeWpc(accept), payment_btn))
+    return ok, payment_btn, cache.lookup(FLOW_CART, VARIANT_CONFIRM)
+
+
+def test_confirm_order_uses_payment_confirm_button_first(monkeypatch, tmp_path):
+    accept = FakeButton()
+    ok, payment_btn, entry = _confirm(monkeypatch, tmp_path, accept)
+
+    assert ok and accept.clicks == 1 and payment_btn.clicks == 0
+    assert entry["handler"] == "payment_confirm"
+
+
+def test_confirm_order_falls_back_to_payment_button_and_relearns(monkeypatch, tmp_path):
+    # 沒有 payment-confirm__btn 的地區改點掃描到的 PLACE ORDER 按鈕
+    ok, payment_btn, entry = _confirm(
+        monkeypatch, tmp_path, FakeButton(present=False), handler="payment_confirm"
+    )
+
+    assert ok and payment_btn.clicks == 1
+    assert (entry["handler"], entry["hits"], entry["misses"]) == ("payment_button", 0, 0)
+
+
+def test_confirm_order_tries_the_learned_handler_first(monkeypatch, tmp_path):
+    accept = FakeButton()
+    ok, payment_btn, entry = _confirm(monkeypatch, tmp_path, accept, handler="payment_button")
+
+    assert ok and payment_btn.clicks == 1 and accept.clicks == 0
+    assert entry["hits"] == 1
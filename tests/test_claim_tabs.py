@@ -0,0 +1,130 @@
+import asyncio
+
+from services import epic_games_service
+from services.epic_games_service import EpicGames
+from settings import settings
+
+
+class FakeTab:
+    def __init__(self, context):
+        self.context = context
+
+    async def close(self):
+        self.context.closed += 1
+
+
+class FakeContext:
+    def __init__(self):
+        self.closed = 0
+
+    async def new_page(self):
+        return FakeTab(self)
+
+
+class FakePage:
+    def __init__(self):
+        self.context = FakeContext()
+
+
+def test_parallel_tabs_are_bounded_and_results_merged(monkeypatch):
+    monkeypatch.setattr(settings, "CLAIM_TAB_CONCURRENCY", 2)
+    page = FakePage()
+    games = EpicGames(page)
+    active, peak = 0, 0
+
+    async def fake_claim(tab, url):
+        nonlocal active, peak
+        assert tab is not page
+        active += 1
+        peak = max(peak, active)
+        await asyncio.sleep(0.01)
+        active -= 1
+        return url == "cart"
+
+    monkeypatch.setattr(games, "_claim_product", fake_claim)
+    urls = ["a", "cart", "b", "c"]
+
+    assert asyncio.run(games.add_promotion_to_cart(page, urls)) is True
+    assert peak == 2
+    assert page.context.closed == len(urls)
+
+
+def test_single_tab_reuses_page(monkeypatch):
+    monkeypatch.setattr(settings, "CLAIM_TAB_CONCURRENCY", 1)
+    page = FakePage()
+    games = EpicGames(page)
+    seen = []
+
+    async def fake_claim(tab, url):
+        seen.append(tab)
+        return False
+
+    monkeypatch.setattr(games, "_claim_product", fake_claim)
+
+    assert asyncio.run(games.add_promotion_to_cart(page, ["a", "b"])) is False
+    assert seen == [page, page]
+
+
+class FakeButton:
+    def __init__(self, text):
+        self.text = text
+        self.clicked = 0
+
+    @property
+    def first(self):
+        return self
+
+    async def is_visible(self, timeout=None):
+        return self.text is not None
+
+    async def text_content(self):
+        return self.text
+
+    async def is_disabled(self):
+        return False
+
+    async def click(self):
+        self.clicked += 1
+
+
+class FakeProductPage:
+    def __init__(self, button_text):
+        self.button = FakeButton(button_text)
+        self.context = FakeContext()
+
+    async def goto(self, url, wait_until=None):
+        pass
+
+    async def title(self):
+        return "Free Game | Epic Games Store"
+
+    def locator(self, selector):
+        if "purchase-cta-button" in selector:
+            return self.button
+        return FakeButton(None)
+
+
+class SilentProbe:
+    targeted = True
+
+    def __init__(self, *args):
+        pass
+
+    def attach(self, page):
+        pass
+
+    def detach(self):
+        pass
+
+    async def wait(self, timeout):
+        return None
+
+
+def test_add_to_cart_button_marks_pending_cart(monkeypatch):
+    monkeypatch.setattr(epic_games_service, "ProductStateProbe", SilentProbe)
+    monkeypatch.setattr(epic_games_service.product_url_index, "mark_verified", lambda url: None)
+    page = FakeProductPage("Add To Cart")
+    games = EpicGames(page)
+
+    assert asyncio.run(games._claim_product(page, "https://store.epicgames.com/p/game")) is True
+    assert page.button.clicked == 1
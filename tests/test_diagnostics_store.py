@@ -0,0 +1,99 @@
+import asyncio
+import io
+import os
+import time
+
+from PIL import Image
+
+from services.diagnostics_store import DiagnosticsStore, compress_text
+
+# zstandard 不是必要依賴，未安裝時退回 gzip
+EXT = compress_text("")[1]
+
+
+class FakeFrame:
+    def __init__(self, url, parent=None):
+        self.url = url
+        self.name = ""
+        self.parent_frame = parent
+
+    def is_detached(self):
+        return False
+
+
+class FakePage:
+    def __init__(self):
+        main = FakeFrame("https://store.epicgames.com/en-US/cart")
+        self.frames = [main, FakeFrame("https://www.epicgames.com/store/purchase", main)]
+        self.url = main.url
+
+    async def content(self):
+        return "<html>" + "<div>checkout</div>" * 2000 + "</html>"
+
+    async def screenshot(self, type="png"):
+        buf = io.BytesIO()
+        Image.new("RGB", (320, 200), "white").save(buf, format="PNG")
+        return buf.getvalue()
+
+
+def test_capture_writes_compressed_artifacts_and_index(tmp_path):
+    store = DiagnosticsStore(tmp_path, max_bytes=10 * 1024 * 1024, max_age_seconds=3600)
+    store.begin_run("run-1")
+
+    async def main():
+        await store.capture(FakePage(), "checkout_no_button")
+        await store.flush()
+
+    asyncio.run(main())
+
+    (entry,) = store.entries("run-1")
+    assert entry["phase"] == "checkout_no_button"
+    names = set(entry["files"])
+    assert f"01-checkout_no_button.html{EXT}" in names
+    assert "01-checkout_no_button.webp" in names
+    assert entry["files"][f"01-checkout_no_button.html{EXT}"] < 2000
+
+
+def test_prune_enforces_size_and_age_budget(tmp_path):
+    old = tmp_path.joinpath("run-0")
+    old.mkdir()
+    old.joinpath("blob").write_bytes(b"x" * 1024)
+    past = time.time() - 7200
+    os.utime(old, (past, past))
+
+    big = tmp_path.joinpath("run-1")
+    big.mkdir()
+    big.joinpath("blob").write_bytes(b"x" * 200_000)
+
+    store = DiagnosticsStore(tmp_path, max_bytes=100_000, max_age_seconds=3600)
+    store.begin_run("run-2")
+
+    async def main():
+        await store.capture(FakePage(), "login_failed", screenshot=False)
+        await store.flush()
+
+    asyncio.run(main())
+
+    assert not old.exists() and not big.exists()
+    assert tmp_path.joinpath("run-2").exists()
+    assert [e["run"] for e in store.entries()] == ["run-2"]
+
+
+def test_concurrent_runs_keep_their_own_sequence(tmp_path):
+    store = DiagnosticsStore(tmp_path, max_bytes=10**9, max_age_seconds=3600)
+
+    async def account(run_id):
+        store.begin_run(run_id)
+        for _ in range(2):
+            await store.capture(FakePage(), "step", html=False, screenshot=False)
+            await asyncio.sleep(0)
+
+    async def main():
+        await asyncio.gather(account("run-a"), account("run-b"))
+        await store.flush()
+
+    asyncio.run(main())
+
+    for run_id in ("run-a", "run-b"):
+        names = sorted(p.name for p in tmp_path.joinpath(run_id).iterdir())
+        assert names == [f"01-step.frames.json{EXT}", f"02-step.frames.json{EXT}"]
@@ -0,0 +1,35 @@
+import asyncio
+
+from services.dom_inspect import inspect_containers
+
+
+class FakeLocator:
+    def __init__(self, container):
+        self.container = container
+
+    async def evaluate_all(self, script, arg):
+        self.container.calls += 1
+        if self.container.detached:
+            raise RuntimeError("Frame was detached")
+        attrs = {a: None for a in arg["attributes"]}
+        return [{"text": "GET", "attrs": attrs, "probes": {}, "disabled": False}]
+
+
+class FakeContainer:
+    def __init__(self, detached=False):
+        self.detached = detached
+        self.calls = 0
+
+    def locator(self, selector):
+        return FakeLocator(self)
+
+
+def test_inspect_containers_one_round_trip_per_container():
+    page, frame = FakeContainer(), FakeContainer(detached=True)
+
+    results = asyncio.run(inspect_containers([("page", page), ("frame[1]", frame)], "button"))
+
+    assert page.calls == frame.calls == 1
+    assert results[0][0] == "page" and results[0][1][0]["text"] == "GET"
+    assert "aria-label" in results[0][1][0]["attrs"]
+    assert isinstance(results[1][1], RuntimeError)
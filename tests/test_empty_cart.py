@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from services.dom_inspect import INSPECT_SCRIPT
+from services.epic_games_service import MOVE_TO_WISHLIST_SCRIPT, EpicGames, _is_cart_update
+
+
+class FakeCards:
+    def __init__(self, page):
+        self.page = page
+
+    async def evaluate_all(self, script, arg):
+        if script == INSPECT_SCRIPT:
+            return [{"probes": {"free": free}} for free in self.page.cards]
+        assert script == MOVE_TO_WISHLIST_SCRIPT
+        if self.page.click_error:
+            raise self.page.click_error
+        self.page.cards = [free for i, free in enumerate(self.page.cards) if i not in arg]
+        return len(arg)
+
+
+class FakeCartPage:
+    def __init__(self, cards, click_error=None):
+        self.cards = cards
+        self.click_error = click_error
+        self.waiters = []
+
+    def locator(self, selector):
+        return FakeCards(self)
+
+    def wait_for_response(self, predicate, timeout=None):
+        waiter = asyncio.get_running_loop().create_future()
+        waiter.get_loop().call_later(0.01, lambda: waiter.done() or waiter.set_result(None))
+        self.waiters.append(waiter)
+        return waiter
+
+    async def wait_for_function(self, expression, arg=None, timeout=None):
+        return True
+
+
+def test_paid_cards_are_moved_in_one_batch():
+    page = FakeCartPage([True, False, True, False])
+
+    assert asyncio.run(EpicGames(page)._empty_cart(page)) is True
+    assert page.cards == [True, True]
+    assert len(page.waiters) == 1
+
+
+def test_all_free_cart_does_not_wait_for_updates():
+    page = FakeCartPage([True, True])
+
+    assert asyncio.run(EpicGames(page)._empty_cart(page)) is True
+    assert page.waiters == []
+
+
+def test_failed_click_cancels_the_response_waiter():
+    page = FakeCartPage([False], click_error=RuntimeError("detached"))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(EpicGames(page)._empty_cart(page))
+    (waiter,) = page.waiters
+    assert waiter.cancelled()
+
+
+def _response(url, method="POST", payload=None):
+    request = SimpleNamespace(method=method, post_data_json=payload)
+    return SimpleNamespace(url=url, request=request)
+
+
+def test_only_cart_mutations_end_the_wait():
+    graphql = "https://store.epicgames.com/graphql"
+
+    assert _is_cart_update(_response(graphql, payload={"operationName": "addToWishlist"}))
+    assert _is_cart_update(_response("https://store.epicgames.com/en-US/cart/api/remove"))
+    assert not _is_cart_update(_response(graphql, payload={"operationName": "getCatalogOffer"}))
+    assert not _is_cart_update(_response(graphql, method="GET"))
+    assert not _is_cart_update(_response(graphql, payload=None))
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from playwright.async_api import TimeoutError
+
+from services.idle_budget import IdleBudget, wait_first
+
+
+async def _fail(delay: float):
+    await asyncio.sleep(delay)
+    raise TimeoutError("boom")
+
+
+async def _ok(delay: float, value=None):
+    await asyncio.sleep(delay)
+    return value
+
+
+def test_wait_first_returns_first_successful_event():
+    async def main():
+        return await wait_first(_fail(0.01), _ok(0.05), _ok(1), timeout=2000)
+
+    assert asyncio.run(main()) == 1
+
+
+def test_wait_first_raises_when_nothing_happens():
+    async def main():
+        await wait_first(_fail(0.01), _ok(1), timeout=50)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
+
+
+def test_idle_budget_separates_events_and_timeouts():
+    budget = IdleBudget()
+
+    async def main():
+        assert await budget.measure("event", _ok(0.02, "v")) == "v"
+        assert not await budget.wait("timeout", _fail(0.01))
+
+    asyncio.run(main())
+
+    assert budget.event_ms >= 30
+    assert budget.timeouts == 1
+    assert set(budget.breakdown) == {"event", "timeout"}
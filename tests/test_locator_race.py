@@ -0,0 +1,51 @@
+import asyncio
+
+from services.locator_race import race_locators
+
+
+class FakeLocator:
+    def __init__(self, delay):
+        self.delay = delay
+
+    @property
+    def first(self):
+        return self
+
+    async def wait_for(self, state="visible", timeout=None):
+        if self.delay is None:
+            await asyncio.Event().wait()
+        await asyncio.sleep(self.delay)
+
+
+class FakeContainer:
+    def __init__(self, delays):
+        self.delays = delays
+
+    def locator(self, selector):
+        return FakeLocator(self.delays.get(selector))
+
+
+def _race(containers, selectors, **kwargs):
+    return asyncio.run(race_locators(containers, selectors, require_enabled=False, **kwargs))
+
+
+def test_specific_text_in_iframe_beats_earlier_generic_match():
+    page = FakeContainer({"button[type='submit']": 0.01})
+    iframe = FakeContainer({'button:has-text("PLACE ORDER")': 0.05})
+    selectors = ['button:has-text("PLACE ORDER")', "button[type='submit']"]
+
+    winner = _race([("page", page), ("iframe", iframe)], selectors, timeout=2000)
+
+    assert winner.container_label == "iframe"
+    assert winner.selector == 'button:has-text("PLACE ORDER")'
+
+
+def test_generic_match_wins_once_grace_expires():
+    page = FakeContainer({"button[type='submit']": 0.01})
+    iframe = FakeContainer({'button:has-text("PLACE ORDER")': None})
+    selectors = ['button:has-text("PLACE ORDER")', "button[type='submit']"]
+
+    winner = _race([("page", page), ("iframe", iframe)], selectors, timeout=2000, grace=50)
+
+    assert winner.selector == "button[type='submit']"
+    assert _race([("page", FakeContainer({}))], selectors, timeout=50) is None
@@ -0,0 +1,93 @@
+import asyncio
+
+import httpx
+
+from services.epic_order_history_service import OrderHistoryClient, parse_order_history
+from services.owned_library_index import OwnedLibraryIndex
+
+NS_A = "a" * 32
+NS_B = "b" * 32
+
+PAGES = {
+    None: {
+        "orders": [
+            {
+                "orderType": "PURCHASE",
+                "orderId": "o-2",
+                "presentmentTotal": "$0.00",
+                "items": [{"namespace": NS_A, "offerId": "1", "description": "A", "price": {}}],
+            },
+            {"orderType": "REFUND", "orderId": "o-1", "items": [{"namespace": NS_B, "offerId": "2"}]},
+        ],
+        "nextPageToken": "t1",
+    },
+    "t1": {
+        "orders": [
+            {"orderType": "PURCHASE", "orderId": "o-0", "items": [{"namespace": NS_B, "offerId": "3"}]},
+            {"orderType": "PURCHASE", "orderId": "o-x", "items": [{"namespace": "short", "offerId": "4"}]},
+        ],
+        "nextPageToken": None,
+    },
+}
+
+
+def test_parse_order_history_prunes_unused_fields():
+    data = parse_order_history(httpx.Response(200, json=PAGES[None]).content)
+
+    assert data["orders"][0] == {
+        "orderType": "PURCHASE",
+        "orderId": "o-2",
+        "items": [{"namespace": NS_A, "offerId": "1", "description": "A"}],
+    }
+
+
+def test_order_history_client_follows_pagination_with_cookies():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=PAGES[request.url.params.get("nextPageToken")])
+
+    client = OrderHistoryClient(
+        [{"name": "EPIC_SSO", "value": "s3cr3t", "domain": ".epicgames.com", "path": "/"}],
+        user_agent="UA/1.0",
+        transport=httpx.MockTransport(handler),
+    )
+    items = asyncio.run(client.fetch_purchased_items())
+
+    assert [i.namespace for i in items] == [NS_A, NS_B]
+    assert len(requests) == 2
+    assert requests[0].headers["cookie"] == "EPIC_SSO=s3cr3t"
+    assert requests[0].headers["user-agent"] == "UA/1.0"
+
+
+def test_incremental_sync_stops_at_known_order(tmp_path):
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        return httpx.Response(200, json=PAGES[request.url.params.get("nextPageToken")])
+
+    index = OwnedLibraryIndex.for_account(tmp_path)
+    assert not index.is_synced
+
+    client = OrderHistoryClient([], transport=httpx.MockTransport(handler))
+    items = asyncio.run(client.fetch_purchased_items(stop_at_order_id="o-1"))
+    index.update((i.namespace for i in items), client.newest_order_id)
+
+    assert [i.namespace for i in items] == [NS_A]
+    assert len(requests) == 1
+
+    reloaded = OwnedLibraryIndex.for_account(tmp_path)
+    assert reloaded.is_synced
+    assert reloaded.newest_order_id == "o-2"
+    assert NS_A in reloaded and NS_B not in reloaded
+
+
+def test_partial_sync_does_not_mark_index_synced(tmp_path):
+    index = OwnedLibraryIndex.for_account(tmp_path)
+    index.update([NS_A], None, complete=False)
+
+    reloaded = OwnedLibraryIndex.for_account(tmp_path)
+    assert NS_A in reloaded
+    assert not reloaded.is_synced
@@ -0,0 +1,126 @@
+import asyncio
+import json
+import sqlite3
+import time
+
+from services.owned_library_index import OwnedLibraryIndex
+from services.preflight import (
+    LAUNCH_INDEX_NOT_SYNCED,
+    LAUNCH_UNOWNED,
+    PreflightStats,
+    SKIP_ALL_OWNED,
+    SKIP_NO_PROMOTIONS,
+    load_profile_cookies,
+    run_preflight,
+)
+
+NS_OWNED = "a" * 32
+NS_NEW = "b" * 32
+
+
+def _element(namespace: str, discount: int = 0) -> dict:
+    return {
+        "title": namespace[:4],
+        "id": namespace[::-1],
+        "namespace": namespace,
+        "description": "",
+        "offerType": "BASE_GAME",
+        "keyImages": [],
+        "offerMappings": [{"pageSlug": namespace[:6]}],
+        "promotions": {
+            "promotionalOffers": [
+                {"promotionalOffers": [{"discountSetting": {"discountPercentage": discount}}]}
+            ]
+        },
+    }
+
+
+def _catalog(*elements) -> dict:
+    return {"data": {"Catalog": {"searchStore": {"elements": list(elements)}}}}
+
+
+def test_skips_browser_when_index_owns_everything(tmp_path):
+    OwnedLibraryIndex.for_account(tmp_path).update([NS_OWNED], "o-1")
+
+    result = asyncio.run(run_preflight(tmp_path, data=_catalog(_element(NS_OWNED))))
+
+    assert not result.should_launch and result.reason == SKIP_ALL_OWNED
+
+
+def test_launches_for_unowned_or_unknown_library(tmp_path):
+    data = _catalog(_element(NS_OWNED), _element(NS_NEW))
+
+    result = asyncio.run(run_preflight(tmp_path, data=data))
+    assert result.should_launch and result.reason == LAUNCH_INDEX_NOT_SYNCED
+
+    OwnedLibraryIndex.for_account(tmp_path).update([NS_OWNED], "o-1")
+    result = asyncio.run(run_preflight(tmp_path, data=data))
+    assert result.should_launch and result.reason == LAUNCH_UNOWNED
+    assert [p.namespace for p in result.unowned] == [NS_NEW]
+
+
+def test_no_free_promotions_skips(tmp_path):
+    result = asyncio.run(run_preflight(tmp_path, data=_catalog(_element(NS_NEW, discount=50))))
+    assert not result.should_launch and result.reason == SKIP_NO_PROMOTIONS
+
+
+def test_load_profile_cookies_filters_host_and_expiry(tmp_path):
+    conn = sqlite3.connect(tmp_path.joinpath("cookies.sqlite"))
+    conn.execute("CREATE TABLE moz_cookies (name, value, host, path, expiry)")
+    future = int(time.time()) + 3600
+    conn.executemany(
+        "INSERT INTO moz_cookies VALUES (?, ?, ?, ?, ?)",
+        [
+            ("EPIC_SSO", "s", ".epicgames.com", "/", future),
+            ("old", "x", ".epicgames.com", "/", 1),
+            ("other", "y", ".example.com", "/", future),
+        ],
+    )
+    conn.commit()
+    conn.close()
+
+    assert load_profile_cookies(tmp_path) == [
+        {"name": "EPIC_SSO", "value": "s", "domain": ".epicgames.com", "path": "/"}
+    ]
+
+
+def test_stats_estimate_saved_time(tmp_path):
+    stats = PreflightStats(tmp_path.joinpath("stats.json"))
+    stats.record_launch(stats.avg_browser_seconds)
+    assert stats.record_skip(1.0) == stats.avg_browser_seconds - 1.0
+    assert PreflightStats(tmp_path.joinpath("stats.json")).skipped_runs == 1
+
+
+def test_load_profile_cookies_reads_wal_of_open_database(tmp_path):
+    # 瀏覽器仍開著資料庫：最近寫入的 Cookie 只存在 -wal 中
+    conn = sqlite3.connect(tmp_path.joinpath("cookies.sqlite"))
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA wal_autocheckpoint=0")
+    conn.execute("CREATE TABLE moz_cookies (name, value, host, path, expiry)")
+    conn.execute(
+        "INSERT INTO moz_cookies VALUES (?, ?, ?, ?, ?)",
+        ("EPIC_EG1", "fresh", ".epicgames.com", "/", int(time.time()) + 3600),
+    )
+    conn.commit()
+    try:
+        assert tmp_path.joinpath("cookies.sqlite-wal").stat().st_size > 0
+        assert [c["value"] for c in load_profile_cookies(tmp_path)] == ["fresh"]
+    finally:
+        conn.close()
+
+
+def test_load_profile_cookies_prefers_session_snapshot(tmp_path):
+    future = time.time() + 3600
+    tmp_path.joinpath("storage_state.json").write_text(
+        json.dumps(
+            {
+                "cookies": [
+                    {"name": "EPIC_EG1", "value": "s", "domain": ".epicgames.com", "path": "/", "expires": future},
+                    {"name": "old", "value": "x", "domain": ".epicgames.com", "path": "/", "expires": 1},
+                    {"name": "sess", "value": "y", "domain": "store.epicgames.com", "path": "/", "expires": -1},
+                ]
+            }
+        )
+    )
+
+    assert [c["name"] for c in load_profile_cookies(tmp_path)] == ["EPIC_EG1", "sess"]
@@ -0,0 +1,76 @@
+import asyncio
+
+from services.product_state_probe import ProductState, ProductStateProbe
+
+NS = "a" * 32
+OFFER = "b" * 32
+
+
+def _entitlement(entitled: bool, namespace=NS, offer_id=OFFER):
+    return {
+        "data": {
+            "Launcher": {
+                "entitledOfferItems": {
+                    "namespace": namespace,
+                    "offerId": offer_id,
+                    "entitledToAllItemsInOffer": entitled,
+                    "entitledToAnyItemInOffer": entitled,
+                }
+            }
+        }
+    }
+
+
+def _catalog_offer(discount_price: int, namespace=NS, offer_id=OFFER):
+    return {
+        "data": {
+            "Catalog": {
+                "catalogOffer": {
+                    "id": offer_id,
+                    "namespace": namespace,
+                    "price": {"totalPrice": {"discountPrice": discount_price, "originalPrice": 1999}},
+                }
+            }
+        }
+    }
+
+
+def test_owned_resolves_from_entitlement_alone():
+    probe = ProductStateProbe(NS, OFFER)
+    assert probe.feed(_entitlement(True)) == ProductState.OWNED
+
+
+def test_free_requires_entitlement_and_price():
+    probe = ProductStateProbe(NS, OFFER)
+    assert probe.feed(_catalog_offer(0)) is None
+    assert probe.feed(_entitlement(False)) == ProductState.FREE
+
+
+def test_other_offers_on_the_page_are_ignored():
+    probe = ProductStateProbe(NS, OFFER)
+    probe.feed(_entitlement(True, offer_id="dlc"))
+    probe.feed(_catalog_offer(999, offer_id="dlc"))
+    assert probe.state is None
+
+    assert probe.feed(_catalog_offer(1999)) == ProductState.UNAVAILABLE
+
+
+def test_untargeted_probe_never_decides():
+    probe = ProductStateProbe(None, None)
+    assert not probe.targeted
+    probe.feed(_entitlement(True, offer_id="dlc"))
+    probe.feed(_catalog_offer(999, offer_id="dlc"))
+    assert probe.state is None
+
+
+def test_nodes_without_offer_id_are_ignored():
+    probe = ProductStateProbe(NS, OFFER)
+    probe.feed({"namespace": NS, "price": {"totalPrice": {"discountPrice": 1999}}})
+    probe.feed({"namespace": NS, "entitledToAllItemsInOffer": True})
+    assert probe.state is None
+
+
+def test_wait_falls_back_to_partial_price_information():
+    probe = ProductStateProbe(NS, OFFER)
+    probe.feed(_catalog_offer(0))
+    assert asyncio.run(probe.wait(timeout=10)) == ProductState.FREE
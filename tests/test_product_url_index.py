@@ -0,0 +1,75 @@
+import time
+
+from bench_promotions_parser import make_catalog
+from services.epic_promotions_service import parse_promotions
+from services.product_url_index import ProductUrlIndex
+
+CANDIDATES = [
+    "https://store.epicgames.com/en-US/p/foo",
+    "https://store.epicgames.com/en-US/bundles/foo",
+]
+
+
+def test_index_falls_back_and_persists(tmp_path):
+    path = tmp_path.joinpath("product_urls.json")
+    index = ProductUrlIndex(path)
+
+    assert index.resolve("offer", "ns", CANDIDATES) == CANDIDATES[0]
+    assert index.mark_not_found(CANDIDATES[0]) == CANDIDATES[1]
+    index.mark_verified(CANDIDATES[1])
+
+    reloaded = ProductUrlIndex(path)
+    assert reloaded.resolve("offer", "ns", CANDIDATES) == CANDIDATES[1]
+    assert reloaded.is_verified(CANDIDATES[1])
+
+
+def test_index_exhausted_and_expired(tmp_path):
+    path = tmp_path.joinpath("product_urls.json")
+    index = ProductUrlIndex(path)
+
+    index.resolve("offer", "ns", CANDIDATES, expires_at=time.time() - 7 * 24 * 3600)
+    index.mark_not_found(CANDIDATES[0])
+    assert index.mark_not_found(CANDIDATES[1]) is None
+    # 全部 404 時仍回傳第一個候選，不讓促銷消失
+    assert index.resolve("offer", "ns", CANDIDATES) == CANDIDATES[0]
+
+    reloaded = ProductUrlIndex(path)
+    reloaded._load()
+    assert reloaded._offers == {}
+
+
+def test_parse_promotions_uses_verified_url(tmp_path):
+    data = make_catalog(1, free_ratio=1)
+    element = data["data"]["Catalog"]["searchStore"]["elements"][0]
+    element["offerType"] = "BASE_GAME"
+    index = ProductUrlIndex(tmp_path.joinpath("product_urls.json"))
+
+    (game,) = parse_promotions(data, url_index=index)
+    assert game.url == "https://store.epicgames.com/en-US/p/synthetic-game-0"
+
+    index.mark_not_found(game.url)
+    (game,) = parse_promotions(data, url_index=index)
+    assert game.url == "https://store.epicgames.com/en-US/bundles/synthetic-game-0"
+
+
+def test_new_promotion_window_forgets_not_found(tmp_path):
+    index = ProductUrlIndex(tmp_path.joinpath("product_urls.json"))
+
+    index.resolve("offer", "ns", CANDIDATES, expires_at=1000.0)
+    index.mark_not_found(CANDIDATES[0])
+    assert index.resolve("offer", "ns", CANDIDATES, expires_at=1000.0) == CANDIDATES[1]
+    assert index.resolve("offer", "ns", CANDIDATES, expires_at=2000.0) == CANDIDATES[0]
+
+
+def test_parse_promotions_keeps_offer_when_all_candidates_404(tmp_path):
+    data = make_catalog(1, free_ratio=1)
+    element = data["data"]["Catalog"]["searchStore"]["elements"][0]
+    element["offerType"] = "BASE_GAME"
+    index = ProductUrlIndex(tmp_path.joinpath("product_urls.json"))
+
+    (game,) = parse_promotions(data, url_index=index)
+    for url in index._offers[index.key(game.id, game.namespace)]["candidates"]:
+        index.mark_not_found(url)
+
+    (again,) = parse_promotions(data, url_index=index)
+    assert again.url == game.url
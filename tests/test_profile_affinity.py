@@ -0,0 +1,279 @@
+import asyncio
+import os
+from types import SimpleNamespace
+
+import pytest
+
+from pydantic import SecretStr
+
+from schedule import collect_epic_games_task as tasks
+from services.account_orchestrator import EpicAccount
+from services.preflight import LAUNCH_UNOWNED, SKIP_ALL_OWNED, PreflightResult
+from services.profile_affinity import (
+    ASSIGN_NEW,
+    ASSIGN_OWNER_LEFT,
+    ASSIGN_PINNED,
+    HashRing,
+    WorkerRegistry,
+    export_profile,
+    import_profile,
+    plan_assignments,
+)
+from settings import settings
+
+EMAILS = [f"user{i}@x.com" for i in range(200)]
+
+
+class FakeRedis:
+    def __init__(self):
+        self.hashes, self.values = {}, {}
+
+    def hset(self, key, field, value):
+        self.hashes.setdefault(key, {})[field.encode()] = str(value).encode()
+
+    def hdel(self, key, field):
+        self.hashes.get(key, {}).pop(field.encode(), None)
+
+    def hgetall(self, key):
+        return dict(self.hashes.get(key, {}))
+
+    def set(self, key, value, ex=None):
+        self.values[key] = value
+
+    def get(self, key):
+        return self.values.get(key)
+
+    def delete(self, key):
+        self.values.pop(key, None)
+
+
+def test_ring_removal_only_moves_keys_of_the_leaving_node():
+    ring = HashRing(["a", "b", "c"])
+    before = {e: ring.node_for(e) for e in EMAILS}
+    assert set(before.values()) == {"a", "b", "c"}
+
+    ring.remove("b")
+    after = {e: ring.node_for(e) for e in EMAILS}
+
+    moved = {e for e in EMAILS if before[e] != after[e]}
+    assert moved == {e for e in EMAILS if before[e] == "b"}
+    assert HashRing([]).node_for("x") is None
+
+
+def test_plan_pins_owners_and_only_reassigns_when_owner_left():
+    owners = {"pinned@x.com": "a", "orphan@x.com": "gone"}
+    emails = ["pinned@x.com", "orphan@x.com", "new@x.com"]
+
+    plan = plan_assignments(emails, ["a", "b"], owners)
+
+    assert plan["pinned@x.com"] == ("a", ASSIGN_PINNED)
+    assert plan["orphan@x.com"][1] == ASSIGN_OWNER_LEFT
+    assert plan["new@x.com"][1] == ASSIGN_NEW
+    # 新節點加入不會搬動已有擁有者的帳號
+    grown = plan_assignments(emails, ["a", "b", "c"], {**owners, "orphan@x.com": "b"})
+    assert grown["pinned@x.com"] == ("a", ASSIGN_PINNED)
+    assert grown["orphan@x.com"] == ("b", ASSIGN_PINNED)
+    assert plan_assignments(emails, [], owners) == {}
+
+
+def test_registry_expires_silent_workers_and_tracks_owners():
+    registry = WorkerRegistry(FakeRedis(), ttl=60)
+    registry.heartbeat("a", now=1000)
+    registry.heartbeat("b", now=970)
+    registry.heartbeat("c", now=1000)
+    registry.leave("c")
+
+    assert registry.alive_nodes(now=1020) == ["a", "b"]
+    assert registry.alive_nodes(now=1040) == ["a"]
+
+    registry.set_owner("u@x.com", "a")
+    assert registry.owners() == {"u@x.com": "a"}
+
+    registry.put_transfer("u@x.com", b"blob")
+    assert registry.pop_transfer("u@x.com") == b"blob"
+    assert registry.pop_transfer("u@x.com") is None
+
+
+def _profile(root):
+    for rel, size in {
+        "cookies.sqlite": 300,
+        "storage_state.json": 50,
+        "owned_library.json": 40,
+        "cache2/entries/a": 5000,
+        "storage/default/https+++store.epicgames.com/ls/data.sqlite": 20,
+        "storage/default/https+++www.youtube.com/ls/data.sqlite": 20,
+    }.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"x" * size)
+    return root
+
+
+def test_export_import_moves_only_login_state(tmp_path):
+    source = _profile(tmp_path / "source")
+
+    blob, exported = export_profile(source)
+    imported = import_profile(tmp_path / "target", blob)
+
+    target = tmp_path / "target"
+    assert (target / "cookies.sqlite").read_bytes() == b"x" * 300
+    assert (target / "storage/default/https+++store.epicgames.com/ls/data.sqlite").exists()
+    assert not (target / "cache2").exists()
+    assert not (target / "storage/default/https+++www.youtube.com").exists()
+    assert exported.files == imported.files == 4
+    assert exported.bytes == len(blob)
+
+
+def test_export_refuses_profile_in_use(tmp_path):
+    source = _profile(tmp_path / "source")
+    os.symlink(f"127.0.0.1:+{os.getpid()}", source / "lock")
+
+    with pytest.raises(RuntimeError):
+        export_profile(source)
+
+
+@pytest.fixture
+def affinity(monkeypatch):
+    client = FakeRedis()
+    monkeypatch.setattr(settings, "PROFILE_AFFINITY_ENABLED", True)
+    monkeypatch.setattr(tasks, "WorkerRegistry", lambda: WorkerRegistry(client, ttl=60))
+    return WorkerRegistry(client, ttl=60)
+
+
+def _accounts(monkeypatch, emails):
+    accounts = [EpicAccount(email, SecretStr("pw")) for email in emails]
+    monkeypatch.setattr(tasks, "all_accounts", lambda: accounts)
+
+
+def test_check_promotions_routes_claims_to_node_queues(affinity, monkeypatch):
+    affinity.heartbeat("node-a")
+    affinity.set_owner("pinned@x.com", "node-a")
+    _accounts(monkeypatch, ["pinned@x.com", "new@x.com"])
+
+    async def fake_check(plan=None):
+        return {"accounts": 2, "dispatched": ["pinned@x.com", "new@x.com"], "skipped": {}}
+
+    sent = []
+    monkeypatch.setattr(tasks, "check_promotions", fake_check)
+    monkeypatch.setattr(
+        tasks.claim_account_task, "apply_async", lambda args, **kw: sent.append((args, kw))
+    )
+
+    summary = tasks.check_promotions_task.run()
+
+    assert summary["assignments"] == {"pinned@x.com": "node-a", "new@x.com": "node-a"}
+    assert [(args[0], kw["queue"].name) for args, kw in sent] == [
+        ("pinned@x.com", "epic-claim.node-a"),
+        ("new@x.com", "epic-claim.node-a"),
+    ]
+    assert sent[0][1]["queue"].routing_key == "epic.claim.node-a"
+    assert all(kw["expires"] == settings.NODE_CLAIM_EXPIRES for _, kw in sent)
+
+
+def test_claims_fall_back_to_shared_queue_without_live_workers(affinity, monkeypatch):
+    _accounts(monkeypatch, ["u@x.com"])
+
+    async def fake_check(plan=None):
+        return {"accounts": 1, "dispatched": ["u@x.com"], "skipped": {}}
+
+    sent = []
+    monkeypatch.setattr(tasks, "check_promotions", fake_check)
+    monkeypatch.setattr(
+        tasks.claim_account_task, "apply_async", lambda args, **kw: sent.append((args, kw))
+    )
+
+    assert tasks.check_promotions_task.run()["assignments"] == {}
+    assert sent == [(["u@x.com"], {})]
+
+
+def test_relocation_exports_on_source_and_imports_on_target(affinity, monkeypatch, tmp_path):
+    _profile(tmp_path / "node-a")
+    affinity.set_owner("u@x.com", "node-a")
+
+    calls = []
+    monkeypatch.setattr(
+        tasks.export_profile_task, "apply_async", lambda args, **kw: calls.append((args, kw))
+    )
+    tasks.relocate_profile("u@x.com", "node-b")
+
+    ((args, kw),) = calls
+    assert args == ["u@x.com"] and kw["queue"].name == "epic-claim.node-a"
+    assert kw["link"].options["queue"].name == "epic-claim.node-b"
+
+    # 依序在來源與目標節點執行兩個任務
+    def on_node(node):
+        monkeypatch.setattr(tasks, "local_node", lambda: node)
+        monkeypatch.setattr(
+            tasks, "account_settings", lambda email: SimpleNamespace(user_data_dir=tmp_path / node)
+        )
+
+    on_node("node-a")
+    exported = tasks.export_profile_task.run("u@x.com")
+    assert affinity.owners()["u@x.com"] == "node-a"
+
+    on_node("node-b")
+    moved = tasks.import_profile_task.run(exported, "u@x.com")
+
+    assert (moved["source"], moved["target"]) == ("node-a", "node-b")
+    assert moved["bytes"] == exported["bytes"] and moved["total_seconds"] >= 0
+    assert affinity.owners()["u@x.com"] == "node-b"
+    assert (tmp_path / "node-b" / "cookies.sqlite").exists()
+
+    with pytest.raises(ValueError):
+        tasks.relocate_profile("u@x.com", "node-b")
+
+
+def test_preflight_runs_on_the_node_holding_the_profile(affinity, monkeypatch, tmp_path):
+    affinity.heartbeat("node-a")
+    affinity.heartbeat("node-b")
+    affinity.set_owner("here@x.com", "node-a")
+    affinity.set_owner("there@x.com", "node-b")
+    _accounts(monkeypatch, ["here@x.com", "there@x.com"])
+    monkeypatch.setattr("settings.USER_DATA_DIR", tmp_path)
+    monkeypatch.setattr(tasks, "local_node", lambda: "node-a")
+
+    async def fake_fetch(max_age=None):
+        return {"data": "promotions"}
+
+    preflighted = []
+
+    async def fake_preflight(user_data_dir, data=None, max_age=None):
+        preflighted.append(user_data_dir.name)
+        return PreflightResult(True, LAUNCH_UNOWNED, [], 0.01)
+
+    sent = []
+    monkeypatch.setattr(tasks.promotions_client, "fetch", fake_fetch)
+    monkeypatch.setattr(tasks, "parse_promotions", lambda data: ["promotion"])
+    monkeypatch.setattr(tasks, "run_preflight", fake_preflight)
+    monkeypatch.setattr(
+        tasks.claim_account_task, "apply_async", lambda args, **kw: sent.append((args, kw))
+    )
+
+    summary = tasks.check_promotions_task.run()
+
+    # node-b 的設定檔不在這台機器上：不在本機預檢，也不建立空的設定檔目錄
+    assert preflighted == ["here@x.com"]
+    assert not tmp_path.joinpath("there@x.com").exists()
+    assert summary["dispatched"] == ["here@x.com"] and summary["deferred"] == ["there@x.com"]
+    assert [(a[0], kw["queue"].name, kw["kwargs"]) for a, kw in sent] == [
+        ("here@x.com", "epic-claim.node-a", {}),
+        ("there@x.com", "epic-claim.node-b", {"preflight": True}),
+    ]
+
+
+def test_deferred_claim_skips_browser_when_owner_preflight_finds_nothing(monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        tasks, "account_settings", lambda email: SimpleNamespace(user_data_dir=tmp_path)
+    )
+
+    async def fake_preflight(user_data_dir, data=None, max_age=None):
+        return PreflightResult(False, SKIP_ALL_OWNED, [], 0.01)
+
+    monkeypatch.setattr(tasks, "run_preflight", fake_preflight)
+    monkeypatch.setattr(tasks.preflight_stats, "_save", lambda: None)
+    # 瀏覽器不應被啟動
+    monkeypatch.setattr(tasks, "AsyncCamoufox", None)
+
+    result = asyncio.run(tasks.claim_account("there@x.com", preflight=True))
+
+    assert result["skipped"] == SKIP_ALL_OWNED and result["result"] is None
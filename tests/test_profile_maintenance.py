@@ -0,0 +1,114 @@
+import os
+import threading
+
+from services.profile_maintenance import (
+    TIER_CACHE,
+    TIER_JUNK,
+    TIER_SITE_DATA,
+    ProfileMaintenance,
+    compact_profile,
+    profile_in_use,
+)
+
+
+def _write(path, size):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(b"x" * size)
+
+
+def _profile(root):
+    _write(root / "cookies.sqlite", 1000)
+    _write(root / "storage_state.json", 100)
+    _write(root / "owned_library.json", 100)
+    _write(root / "crashes" / "dump.dmp", 500)
+    _write(root / "cache2" / "entries" / "a", 5000)
+    _write(root / "storage" / "default" / "https+++store.epicgames.com" / "ls" / "data.sqlite", 200)
+    _write(root / "storage" / "default" / "https+++store.epicgames.com" / "cache" / "c", 300)
+    _write(root / "storage" / "default" / "https+++www.youtube.com" / "idb" / "x", 3000)
+    _write(root / "places.sqlite", 2000)
+    return root
+
+
+def test_junk_is_always_pruned_but_caches_stay_within_budget(tmp_path):
+    root = _profile(tmp_path / "profile")
+
+    result = compact_profile(root, budget_bytes=10**6)
+
+    assert set(result.removed) == {TIER_JUNK}
+    assert not (root / "crashes").exists()
+    assert (root / "cache2").exists()
+
+
+def test_over_budget_prunes_tiers_in_order_and_keeps_login_state(tmp_path):
+    root = _profile(tmp_path / "profile")
+
+    # 清掉 HTTP 快取與非 Epic 網站資料後就回到預算內，瀏覽紀錄保留
+    result = compact_profile(root, budget_bytes=4000)
+
+    assert set(result.removed) == {TIER_JUNK, TIER_CACHE, TIER_SITE_DATA}
+    assert result.size_after <= 4000
+    assert not (root / "storage" / "default" / "https+++www.youtube.com").exists()
+    assert (root / "storage" / "default" / "https+++store.epicgames.com" / "cache").exists()
+    assert (root / "places.sqlite").exists()
+    for name in ("cookies.sqlite", "storage_state.json", "owned_library.json"):
+        assert (root / name).exists()
+
+
+def test_last_resort_prunes_epic_cache_and_history_only(tmp_path):
+    root = _profile(tmp_path / "profile")
+
+    result = compact_profile(root, budget_bytes=0)
+
+    epic = root / "storage" / "default" / "https+++store.epicgames.com"
+    assert not (epic / "cache").exists()
+    assert (epic / "ls" / "data.sqlite").exists()
+    assert not (root / "places.sqlite").exists()
+    assert result.size_after == 1000 + 100 + 100 + 200
+
+
+def test_profile_in_use_is_skipped(tmp_path):
+    root = _profile(tmp_path / "profile")
+    os.symlink(f"127.0.0.1:+{os.getpid()}", root / "lock")
+
+    assert profile_in_use(root)
+    assert compact_profile(root, budget_bytes=0).skipped == "in_use"
+    assert (root / "cache2").exists()
+
+    # 程序已結束留下的 lock 不影響整理
+    (root / "lock").unlink()
+    os.symlink("127.0.0.1:+999999999", root / "lock")
+    assert not profile_in_use(root)
+
+
+def test_launch_time_is_compared_with_the_last_compaction(tmp_path):
+    root = _profile(tmp_path / "profile")
+    stats = ProfileMaintenance(tmp_path / "profile_stats.json")
+
+    stats.record_launch(10.0, root)
+    stats.compact(root, budget_mb=0.001)
+    stats.record_launch(4.0, root)
+
+    entry = ProfileMaintenance(tmp_path / "profile_stats.json").profiles["profile"]
+    assert entry["launch_before_seconds"] == 10.0
+    assert entry["avg_launch_seconds"] == 4.0
+    assert entry["launches_since"] == 1
+
+
+def test_concurrent_accounts_share_the_stats_file(tmp_path):
+    roots = [_profile(tmp_path / f"account-{i}") for i in range(8)]
+    stats = ProfileMaintenance(tmp_path / "profile_stats.json")
+
+    def run(root):
+        for _ in range(20):
+            stats.record_launch(5.0, root)
+        stats.compact(root, budget_mb=0.001)
+
+    threads = [threading.Thread(target=run, args=(root,)) for root in roots]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    saved = ProfileMaintenance(tmp_path / "profile_stats.json").profiles
+    assert sorted(saved) == sorted(root.name for root in roots)
+    assert all(entry["launches_since"] == 0 for entry in saved.values())
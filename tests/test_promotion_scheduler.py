@@ -0,0 +1,75 @@
+import random
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+
+from bench_promotions_parser import make_catalog
+from schedule.promotion_scheduler import (
+    PromotionScheduler,
+    REASON_BOUNDARY,
+    REASON_CATCH_UP,
+    REASON_DAILY,
+    REASON_FOLLOWUP,
+    REASON_STARTUP,
+)
+from services.epic_promotions_service import extract_promotion_boundaries
+
+TZ = ZoneInfo("Asia/Shanghai")
+
+
+def _planner(tmp_path, jitter_seconds=0):
+    return PromotionScheduler(
+        TZ,
+        state_path=tmp_path.joinpath("scheduler_state.json"),
+        daily_at="12:00",
+        jitter_seconds=jitter_seconds,
+        rng=random.Random(0),
+    )
+
+
+def test_plan_prefers_upcoming_boundary(tmp_path):
+    planner = _planner(tmp_path)
+    now = datetime(2026, 10, 22, 20, 0, tzinfo=TZ)
+    boundary = datetime(2026, 10, 22, 23, 0, tzinfo=TZ)
+
+    run_at, reason = planner.plan([boundary], now)
+
+    assert reason == REASON_BOUNDARY
+    assert run_at == boundary + timedelta(seconds=60)
+
+
+def test_plan_follows_up_after_boundary_then_falls_back_to_daily(tmp_path):
+    planner = _planner(tmp_path)
+    boundary = datetime(2026, 10, 22, 23, 0, tzinfo=TZ)
+
+    run_at, reason = planner.plan([boundary], boundary + timedelta(minutes=5))
+    assert reason == REASON_FOLLOWUP
+    assert run_at == boundary + timedelta(hours=1, minutes=5)
+
+    run_at, reason = planner.plan([boundary], boundary + timedelta(hours=5))
+    assert reason == REASON_DAILY
+    assert run_at == datetime(2026, 10, 23, 12, 0, tzinfo=TZ)
+
+
+def test_settled_fingerprint_and_catch_up_survive_restart(tmp_path):
+    planner = _planner(tmp_path)
+    now = datetime(2026, 10, 22, 20, 0, tzinfo=TZ)
+    planner.mark_settled("abc", now)
+    planner.persist_next(now + timedelta(hours=1), REASON_BOUNDARY)
+
+    restarted = _planner(tmp_path)
+    assert restarted.should_skip("abc")
+    assert not restarted.should_skip("def")
+    assert not restarted.should_skip(None)
+    assert restarted.startup_reason(now) == REASON_STARTUP
+    assert restarted.startup_reason(now + timedelta(hours=2)) == REASON_CATCH_UP
+
+
+def test_extract_promotion_boundaries():
+    data = make_catalog(50, free_ratio=0.5)
+
+    boundaries = extract_promotion_boundaries(data)
+
+    assert [b.isoformat() for b in boundaries] == [
+        "2026-10-15T15:00:00+00:00",
+        "2026-10-22T15:00:00+00:00",
+    ]
@@ -0,0 +1,58 @@
+import asyncio
+import json
+
+import httpx
+
+from services.epic_promotions_service import PromotionsClient
+
+PAYLOAD = {"data": {"Catalog": {"searchStore": {"elements": []}}}}
+
+
+def _run(coro):
+    return asyncio.run(coro)
+
+
+def test_promotions_client_revalidates_with_etag(tmp_path):
+    seen_headers = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen_headers.append(dict(request.headers))
+        if request.headers.get("if-none-match") == '"v1"':
+            return httpx.Response(304)
+        return httpx.Response(200, json=PAYLOAD, headers={"ETag": '"v1"'})
+
+    client = PromotionsClient(cache_dir=tmp_path, ttl=0, transport=httpx.MockTransport(handler))
+
+    assert _run(client.fetch("zh-CN")) == PAYLOAD
+    assert _run(client.fetch("zh-CN")) == PAYLOAD
+    assert "if-none-match" not in seen_headers[0]
+    assert seen_headers[1]["if-none-match"] == '"v1"'
+    assert json.loads(tmp_path.joinpath("zh-CN.json").read_bytes()) == PAYLOAD
+
+
+def test_promotions_client_reads_cache_within_ttl(tmp_path):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        return httpx.Response(200, json=PAYLOAD)
+
+    client = PromotionsClient(cache_dir=tmp_path, ttl=3600, transport=httpx.MockTransport(handler))
+
+    _run(client.fetch("zh-CN"))
+    _run(client.fetch("zh-CN"))
+    _run(client.fetch("en-US"))
+    assert len(calls) == 2
+
+
+def test_promotions_client_falls_back_to_stale_cache(tmp_path):
+    def ok(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=PAYLOAD)
+
+    def broken(request: httpx.Request) -> httpx.Response:
+        raise httpx.ConnectError("offline", request=request)
+
+    _run(PromotionsClient(cache_dir=tmp_path, ttl=0, transport=httpx.MockTransport(ok)).fetch())
+
+    client = PromotionsClient(cache_dir=tmp_path, ttl=0, transport=httpx.MockTransport(broken))
+    assert _run(client.fetch()) == PAYLOAD
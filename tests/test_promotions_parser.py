@@ -0,0 +1,34 @@
+from datetime import datetime, timezone
+
+from bench_promotions_parser import make_catalog
+from services.epic_promotions_service import parse_promotions
+
+
+def test_lean_parse_matches_validated_parse():
+    data = make_catalog(2_000, free_ratio=0.01)
+
+    lean = parse_promotions(data)
+    full = parse_promotions(data, validate=True)
+
+    assert lean
+    assert [p.model_dump() for p in lean] == [p.model_dump() for p in full]
+
+
+def test_parse_extracts_url_and_promotion_window():
+    data = make_catalog(1, free_ratio=1)
+    data["data"]["Catalog"]["searchStore"]["elements"][0]["offerType"] = "BASE_GAME"
+
+    (game,) = parse_promotions(data)
+
+    assert game.url == "https://store.epicgames.com/en-US/p/synthetic-game-0"
+    assert game.startDate == datetime(2026, 10, 15, 15, tzinfo=timezone.utc)
+    assert game.endDate == datetime(2026, 10, 22, 15, tzinfo=timezone.utc)
+
+
+def test_parse_skips_paid_and_malformed_elements():
+    data = make_catalog(3, free_ratio=0)
+    elements = data["data"]["Catalog"]["searchStore"]["elements"]
+    elements[0]["promotions"] = None
+
+    assert parse_promotions(data) == []
+    assert parse_promotions({"data": None}) == []
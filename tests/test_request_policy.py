@@ -0,0 +1,33 @@
+from services.request_policy import PAGE_CHECKOUT, PAGE_PRODUCT, RequestPolicy, page_type
+
+PRODUCT = "https://store.epicgames.com/en-US/p/some-game"
+PURCHASE = "https://store.epicgames.com/purchase?offers=1-abc-def"
+
+
+def test_page_type():
+    assert page_type(PRODUCT) == PAGE_PRODUCT
+    assert page_type(PURCHASE) == PAGE_CHECKOUT
+    assert page_type("https://store.epicgames.com/en-US/cart") == "cart"
+    assert page_type("https://www.epicgames.com/id/login") == "auth"
+    assert page_type("https://store.epicgames.com/en-US/free-games") == "store"
+
+
+def test_product_page_media_blocked_but_checkout_and_captcha_kept():
+    policy = RequestPolicy()
+
+    assert policy.decide("https://cdn1.epicgames.com/trailer.mp4", "media", PRODUCT) == "media"
+    assert policy.decide("https://cdn1.epicgames.com/hero.jpg", "image", PRODUCT) == "image"
+    assert policy.decide("https://www.googletagmanager.com/gtm.js", "script", PRODUCT) == "analytics"
+    assert policy.decide(PRODUCT, "document", PRODUCT) is None
+    assert policy.decide("https://store.epicgames.com/graphql", "fetch", PRODUCT) is None
+
+    assert policy.decide("https://cdn1.epicgames.com/logo.png", "image", PURCHASE) is None
+    assert policy.decide("https://newassets.hcaptcha.com/captcha/v1/x.png", "image", PRODUCT) is None
+
+
+def test_rules_are_configurable_and_bytes_estimated():
+    policy = RequestPolicy({"product": []})
+    assert policy.decide("https://cdn1.epicgames.com/hero.jpg", "image", PRODUCT) is None
+
+    policy.blocked.update({"media": 2, "image": 10})
+    assert policy.bytes_saved == 2 * 1_500_000 + 10 * 60_000
@@ -0,0 +1,90 @@
+import asyncio
+
+from services.response_bus import ResponseBus
+
+
+class FakeRequest:
+    def __init__(self, method):
+        self.method = method
+
+
+class FakeResponse:
+    def __init__(self, url, method="POST", payload=None):
+        self.url = url
+        self.status = 200
+        self.request = FakeRequest(method)
+        self.payload = payload or {}
+        self.reads = 0
+
+    async def json(self):
+        self.reads += 1
+        return self.payload
+
+
+class FakePage:
+    def __init__(self):
+        self.listeners = []
+
+    def on(self, event, fn):
+        self.listeners.append(fn)
+
+    def remove_listener(self, event, fn):
+        self.listeners.remove(fn)
+
+    async def emit(self, response):
+        for fn in list(self.listeners):
+            await fn(response)
+
+
+def test_bodies_read_only_for_matching_subscriptions():
+    page = FakePage()
+    bus = ResponseBus(page)
+    seen = []
+    bus.subscribe("/id/api/login", lambda r, p: seen.append(p), method="POST")
+    bus.subscribe("/id/api/login", lambda r, p: seen.append(p), method="POST")
+
+    unrelated = FakeResponse("https://talon-service.epicgames.com/v1/init")
+    wrong_method = FakeResponse("https://www.epicgames.com/id/api/login", method="GET")
+    login = FakeResponse("https://www.epicgames.com/id/api/login", payload={"errorCode": "x"})
+
+    async def main():
+        for r in (unrelated, wrong_method, login):
+            await page.emit(r)
+
+    asyncio.run(main())
+
+    assert unrelated.reads == wrong_method.reads == 0
+    assert login.reads == 1
+    assert seen == [{"errorCode": "x"}] * 2
+    assert bus.skipped == 2
+
+
+def test_handler_returning_true_detaches_listener():
+    page = FakePage()
+    bus = ResponseBus(page)
+    bus.subscribe("/refresh-csrf", lambda r, p: p.get("success") is True)
+
+    async def main():
+        await page.emit(FakeResponse("https://x/account/v2/refresh-csrf", payload={"success": False}))
+        assert page.listeners
+        await page.emit(FakeResponse("https://x/account/v2/refresh-csrf", payload={"success": True}))
+
+    asyncio.run(main())
+    assert page.listeners == []
+
+
+def test_wait_for_returns_first_matching_payload():
+    page = FakePage()
+    bus = ResponseBus(page)
+
+    async def main():
+        waiter = asyncio.ensure_future(
+            bus.wait_for("/id/api/analytics", lambda p: "accountId" in p, timeout=1000)
+        )
+        await asyncio.sleep(0)
+        await page.emit(FakeResponse("https://x/id/api/analytics", payload={}))
+        await page.emit(FakeResponse("https://x/id/api/analytics", payload={"accountId": "a"}))
+        return await waiter
+
+    assert asyncio.run(main()) == {"accountId": "a"}
+    assert page.listeners == []
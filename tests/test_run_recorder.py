@@ -0,0 +1,154 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+
+from services import run_recorder
+from services.browser_pool import process_tree_cpu_seconds
+from services.run_recorder import (
+    RECORDING_ALWAYS,
+    RECORDING_OFF,
+    RECORDING_ON_FAILURE,
+    RecordingStats,
+    RunRecorder,
+    recording_checkpoint,
+)
+
+
+class FakeTracing:
+    def __init__(self):
+        self.started = False
+        self.chunks = 0
+
+    async def start(self, **kwargs):
+        self.started = True
+
+    async def start_chunk(self):
+        pass
+
+    async def stop_chunk(self, path):
+        self.chunks += 1
+        path.write_bytes(b"x" * 100)
+
+    async def stop(self):
+        self.started = False
+
+
+class FakeContext:
+    def __init__(self):
+        self.tracing = FakeTracing()
+
+
+def _recorder(tmp_path, mode=RECORDING_ON_FAILURE, ring_size=2):
+    stats = RecordingStats(tmp_path / "stats.json")
+    return RunRecorder(mode=mode, root=tmp_path / "record", ring_size=ring_size, stats=stats)
+
+
+def test_failed_run_persists_only_the_last_chunks(tmp_path):
+    recorder = _recorder(tmp_path)
+    context = FakeContext()
+
+    async def main():
+        await recorder.start(context)
+        for _ in range(3):
+            await recording_checkpoint("product")
+        return await recorder.finish(succeeded=False, outcome="unknown_error")
+
+    saved = asyncio.run(main())
+
+    assert context.tracing.chunks == 4
+    assert not context.tracing.started
+    assert sorted(p.name for p in saved.iterdir()) == ["03-product.zip", "04-end.zip"]
+    assert recorder.stats.modes[RECORDING_ON_FAILURE]["avg_bytes"] == int(0.3 * 200)
+
+
+def test_successful_run_discards_the_trace(tmp_path):
+    recorder = _recorder(tmp_path)
+
+    async def main():
+        await recorder.start(FakeContext())
+        await recording_checkpoint("auth")
+        return await recorder.finish(succeeded=True, outcome="success")
+
+    assert asyncio.run(main()) is None
+    assert not (tmp_path / "record").exists()
+    assert recorder._discarded_bytes == 200
+    assert recorder.stats.modes[RECORDING_ON_FAILURE]["avg_bytes"] == 0
+
+
+def test_checkpoint_without_recording_is_noop(tmp_path):
+    recorder = _recorder(tmp_path, mode=RECORDING_OFF)
+    context = FakeContext()
+
+    async def main():
+        await recorder.start(context)
+        await recording_checkpoint("product")
+        await recorder.finish(succeeded=False, outcome="crashed")
+        # 已結束的錄製不再接收分段
+        await recording_checkpoint("product")
+
+    asyncio.run(main())
+    assert context.tracing.chunks == 0
+    assert not (tmp_path / "record").exists()
+
+
+def test_always_mode_measures_video_written(tmp_path):
+    recorder = _recorder(tmp_path, mode=RECORDING_ALWAYS)
+    video_dir = tmp_path / "record"
+
+    async def main():
+        await recorder.start(FakeContext())
+        video_dir.mkdir()
+        (video_dir / "page.webm").write_bytes(b"v" * 1000)
+        await recorder.finish(succeeded=True, outcome="success")
+
+    asyncio.run(main())
+    assert recorder.stats.baseline()["avg_bytes"] == 300
+
+
+def test_overlapping_runs_do_not_report_shared_cpu(tmp_path, monkeypatch):
+    clock = iter(range(100))
+    monkeypatch.setattr(run_recorder, "process_tree_cpu_seconds", lambda pid: next(clock))
+    alone, first, second = (_recorder(tmp_path / name) for name in ("alone", "first", "second"))
+
+    async def run(recorder, started, release):
+        await recorder.start(FakeContext())
+        started.set()
+        await release.wait()
+        await recorder.finish(succeeded=True, outcome="success")
+
+    async def main():
+        done = asyncio.Event()
+        done.set()
+        await run(alone, asyncio.Event(), done)
+
+        # 兩個帳號的執行重疊：程序樹 CPU 無法歸屬到任一帳號
+        release, first_started = asyncio.Event(), asyncio.Event()
+        task = asyncio.create_task(run(first, first_started, release))
+        await first_started.wait()
+        await run(second, asyncio.Event(), done)
+        release.set()
+        await task
+
+    asyncio.run(main())
+    assert alone.stats.modes[RECORDING_ON_FAILURE]["avg_cpu_seconds"] == 1
+    for recorder in (first, second):
+        assert recorder.stats.modes[RECORDING_ON_FAILURE]["avg_cpu_seconds"] is None
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc"), reason="requires /proc")
+def test_process_tree_cpu_seconds():
+    before = process_tree_cpu_seconds(os.getpid())
+
+    # 子程序持續忙碌，量測時應已耗用數百毫秒 CPU
+    busy = "import time\nend = time.time() + 5\nwhile time.time() < end: pass"
+    child = subprocess.Popen([sys.executable, "-c", busy])
+    try:
+        time.sleep(0.8)
+        assert process_tree_cpu_seconds(os.getpid()) - before >= 0.2
+    finally:
+        child.kill()
+        child.wait()
@@ -0,0 +1,73 @@
+import asyncio
+import json
+import time
+
+from services.session_store import SessionStore, auth_cookies_alive, compact_storage_state
+
+STATE = {
+    "cookies": [
+        {"name": "EPIC_SSO", "value": "s", "domain": ".epicgames.com", "expires": time.time() + 3600},
+        {"name": "_ga", "value": "x", "domain": ".google.com", "expires": -1},
+    ],
+    "origins": [
+        {"origin": "https://store.epicgames.com", "localStorage": [{"name": "k", "value": "v"}]},
+        {"origin": "https://www.youtube.com", "localStorage": []},
+    ],
+}
+
+
+class FakeResponse:
+    def __init__(self, payload, ok=True):
+        self.payload = payload
+        self.ok = ok
+
+    async def json(self):
+        return self.payload
+
+
+class FakeRequest:
+    def __init__(self, payload):
+        self.payload = payload
+        self.calls = 0
+
+    async def get(self, url, timeout=None):
+        self.calls += 1
+        return FakeResponse(self.payload)
+
+
+class FakeContext:
+    def __init__(self, payload=None):
+        self.request = FakeRequest(payload or {})
+
+    async def storage_state(self):
+        return STATE
+
+
+def test_compact_state_keeps_epic_only():
+    state = compact_storage_state(STATE)
+    assert [c["name"] for c in state["cookies"]] == ["EPIC_SSO"]
+    assert [o["origin"] for o in state["origins"]] == ["https://store.epicgames.com"]
+
+
+def test_auth_cookie_expiry():
+    assert auth_cookies_alive(STATE)
+    assert not auth_cookies_alive(STATE, now=time.time() + 7200)
+
+
+def test_probe_uses_one_request_and_skips_when_snapshot_expired(tmp_path):
+    store = SessionStore.for_account(tmp_path)
+    logged_in = FakeContext({"sid": "abc"})
+
+    async def main():
+        assert await store.probe(logged_in)
+        await store.save(logged_in)
+        assert await store.probe(FakeContext({"sid": None})) is False
+
+    asyncio.run(main())
+    assert logged_in.request.calls == 1
+
+    expired = {"cookies": [{"name": "EPIC_SSO", "domain": ".epicgames.com", "expires": 1}]}
+    store.path.write_text(json.dumps(expired))
+    ctx = FakeContext({"sid": "abc"})
+    assert asyncio.run(store.probe(ctx)) is False
+    assert ctx.request.calls == 0